@@ -1,5 +1,8 @@
 from langchain_core.tools import tool
 import subprocess
+import shlex
+
+from ceph.remote import remote_command
 
 # Here I am reusing all of the tools again that I used earlier
 # but with a more better orientation.
@@ -17,9 +20,9 @@ def execute_ceph_command(command: str) -> str:
         else:
             full_command = command
 
-        full_command = "ssh root@130.198.19.212 -i /Users/kritiksachdeva/Downloads/sdf-ssh-key_rsa.prv -- " + full_command
+        full_command = remote_command(full_command)
         result = subprocess.run(
-            full_command.split(),
+            shlex.split(full_command),
             capture_output=True,
             text=True,
             check=True,
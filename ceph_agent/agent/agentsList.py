@@ -1,5 +1,16 @@
-from ceph.executor import execute_command
+from ceph.executor import get_executor_backend, commandStream, bufferedStream, DEFAULT_MAX_OUTPUT_BYTES
+from ceph.result_cache import commandResultCache, cachingStream
 from core.agent_logic import analysePrompt
+from core.output_reducer import outputReducer
+from utils.tracing import trace_span
+from collections import deque
+import re
+
+# Colour/cursor escape sequences some Ceph tools emit even when piped
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+
+# How many recent streamed analyses the generation averages are taken over
+GENERATION_STATS_WINDOW = 100
 
 
 # Definition of different Agents
@@ -10,11 +21,13 @@ class RetrieverAgent:
     def __init__(self, ceph_search_instance):
         self.ceph_search = ceph_search_instance
 
-    def find_command(self, query: str, model_choice: str) -> (str, list):
+    # UPDATED: `candidates` are search results computed ahead of time (speculatively)
+    def find_command(self, query: str, model_choice: str, candidates: list = None) -> (str, list):
         print("➡️ RetrieverAgent: Searching for command...")
         vect_results, selected_command = self.ceph_search.search_and_select(
             query=query,
-            model_choice=model_choice
+            model_choice=model_choice,
+            candidates=candidates
         )
         if not selected_command:
             print("🔴 RetrieverAgent: Could not find a suitable command.")
@@ -26,21 +39,103 @@ class RetrieverAgent:
 
 class ExecutorAgent:
     """Executes a command on the Ceph cluster."""
+    # UPDATED: Commands go through a pluggable backend (ceph CLI or librados)
+    # and read-only results can be served from a shared TTL cache.
+    def __init__(self, max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES, backend=None, result_cache: commandResultCache = None):
+        self.max_output_bytes = max_output_bytes
+        self.backend = backend if backend is not None else get_executor_backend()
+        self.result_cache = result_cache
+
     def run(self, command: str) -> (str, str, int):
+        stdout, stderr, retcode, _ = self.run_with_age(command)
+        return stdout, stderr, retcode
+
+    # NEW: Same as run, plus the age in seconds of a cached result (None if it ran now)
+    def run_with_age(self, command: str) -> (str, str, int, float):
+        with trace_span("execute", command=command, backend=self.backend.name) as span:
+            stdout, stderr, retcode, age = self._run_with_age(command)
+            span.set(cached=age is not None, returncode=retcode, output_bytes=len(stdout))
+        return stdout, stderr, retcode, age
+
+    def _run_with_age(self, command: str) -> (str, str, int, float):
+        if self.result_cache is not None:
+            cached = self.result_cache.get(command)
+            if cached is not None:
+                print(f"♻️ ExecutorAgent: Using cached result for '{command}' ({cached[3]:.1f}s old)")
+                return cached
+            self.result_cache.note_executed(command)
+
         print(f"➡️ ExecutorAgent: Running command: '{command}'")
-        stdout, stderr, retcode = execute_command(command)
+        stdout, stderr, retcode = self.backend.execute(command)
         if retcode != 0:
             print(f"🔴 ExecutorAgent: Command failed with return code {retcode}.")
         else:
             print("✅ ExecutorAgent: Command executed successfully.")
-        return stdout, stderr, retcode
+            if self.result_cache is not None:
+                self.result_cache.put(command, stdout, stderr, retcode)
+        return stdout, stderr, retcode, None
+
+    # NEW: Hands output over line by line while the command is still running
+    def run_stream(self, command: str) -> commandStream:
+        with trace_span("execute.start", command=command, backend=self.backend.name) as span:
+            stream = self._run_stream(command)
+            span.set(cached=stream.cache_age is not None)
+        return stream
+
+    def _run_stream(self, command: str) -> commandStream:
+        if self.result_cache is not None:
+            cached = self.result_cache.get(command)
+            if cached is not None:
+                stdout, stderr, retcode, age = cached
+                print(f"♻️ ExecutorAgent: Using cached result for '{command}' ({age:.1f}s old)")
+                stream = bufferedStream(stdout, stderr, retcode, max_bytes=self.max_output_bytes)
+                stream.cache_age = age
+                return stream
+            self.result_cache.note_executed(command)
+
+        print(f"➡️ ExecutorAgent: Streaming command: '{command}'")
+        stream = self.backend.stream(command, max_bytes=self.max_output_bytes)
+        if self.result_cache is not None and self.result_cache.is_cacheable(command):
+            return cachingStream(stream, self.result_cache, command)
+        return stream
 
 
 class AnalyzerAgent:
     """Analyzes command output to generate a final response."""
-    def analyze(self, query: str, command: str, command_out: str, vect_results: list, model_choice: str) -> str:
+    # NEW: An optional outputReducer trims the output before it is put in the prompt
+    def __init__(self, reducer: outputReducer = None):
+        self.reducer = reducer
+        # TTFT and tokens/sec of the most recent streamed analyses; the
+        # server runs for weeks, so only a window is kept
+        self.generation_stats = deque(maxlen=GENERATION_STATS_WINDOW)
+        self.analyses = 0
+
+    def prepare_command(self, command: str) -> str:
+        """The command to run so its output can be reduced (JSON output where supported)."""
+        return self.reducer.prepare_command(command) if self.reducer is not None else command
+
+    def analyze(
+        self,
+        query: str,
+        command: str,
+        command_out: str,
+        vect_results: list,
+        model_choice: str,
+        output_age: float = None,
+        on_token=None
+    ) -> str:
         print("➡️ AnalyzerAgent: Analyzing command output...")
 
+        with trace_span("analyze", output_chars=len(command_out)) as span:
+            if self.reducer is not None:
+                with trace_span("reduce"):
+                    command_out = self.reducer.reduce(query, command, command_out)
+                span.set(reduced_chars=len(command_out))
+            agent_response = self._analyze(query, command, command_out, vect_results, model_choice, output_age, on_token)
+            span.set(response_chars=len(agent_response))
+        return agent_response
+
+    def _analyze(self, query, command, command_out, vect_results, model_choice, output_age, on_token) -> str:
         description = next((item['description'] for item in vect_results if item['command'] == command), 'Description not found.')
 
         agent = analysePrompt(
@@ -48,13 +143,65 @@ class AnalyzerAgent:
             selected_command=command,
             command_out=command_out,
             command_description=description,
-            model_choice=model_choice
+            model_choice=model_choice,
+            output_age=output_age
         )
 
-        agent_response = agent._analyze_response()
+        # UPDATED: Tokens are forwarded to on_token as they are generated
+        agent_response = agent._analyze_response(on_token=on_token)
+        if agent.generation_stats is not None:
+            self.generation_stats.append(agent.generation_stats.as_dict())
+            self.analyses += 1
 
         if not agent_response:
             agent_response = "I executed the command, but could not extract a clear answer from its output."
 
         print("✅ AnalyzerAgent: Analysis complete.")
         return agent_response
+
+    def generation_summary(self) -> dict:
+        """Mean TTFT and tokens/sec over the recent streamed analyses."""
+        recent = list(self.generation_stats)
+        ttfts = [entry["ttft_s"] for entry in recent if entry["ttft_s"] is not None]
+        return {
+            "analyses": self.analyses,
+            "window": len(recent),
+            "ttft_s_mean": round(sum(ttfts) / len(ttfts), 3) if ttfts else None,
+            "tokens_per_sec_mean": round(sum(e["tokens_per_sec"] for e in recent) / len(recent), 1) if recent else 0.0,
+            "last": recent[-1] if recent else None,
+        }
+
+    # NEW: Pre-processes streamed output while the command is still running
+    def collect_output(self, stream: commandStream) -> str:
+        """
+        Consumes a command stream, stripping escape sequences, trailing
+        whitespace and repeated blank lines as each line arrives.
+
+        Returns:
+            str: The cleaned (and possibly truncated) command output.
+        """
+        print("➡️ AnalyzerAgent: Collecting command output...")
+        lines = []
+        pieces = []  # A long line arrives in several pieces
+        previous_blank = False
+        with trace_span("execute.output") as span:
+            for piece in stream:
+                pieces.append(piece)
+                if not piece.endswith("\n"):
+                    continue
+                line = ANSI_ESCAPE.sub("", "".join(pieces)).rstrip()
+                pieces = []
+                blank = not line
+                if blank and previous_blank:
+                    continue
+                previous_blank = blank
+                lines.append(line)
+            if pieces:
+                lines.append(ANSI_ESCAPE.sub("", "".join(pieces)).rstrip())
+            span.set(returncode=stream.returncode, output_bytes=stream.bytes_read, truncated=stream.truncated)
+
+        if stream.returncode != 0:
+            print(f"🔴 AnalyzerAgent: Command exited with return code {stream.returncode}.")
+        else:
+            print(f"✅ AnalyzerAgent: Collected {stream.bytes_read} bytes of command output.")
+        return "\n".join(lines).strip()
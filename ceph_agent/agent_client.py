@@ -0,0 +1,143 @@
+# --------------------
+# Ceph Agent Client
+# --------------------
+#
+# Usage (from the ceph_agent directory):
+#   python agent_client.py                              # interactive session
+#   python agent_client.py -q "check cluster health"    # one-shot / batch, repeat -q
+#   python agent_client.py --json -q "..." -q "..."     # machine readable results
+#   CEPH_AGENT_SERVER_TOKEN=... python agent_client.py --host 127.0.0.1
+#
+# Talks to agent_server.py, so no model or index is loaded here.
+
+import argparse
+import json
+import os
+import socket
+import sys
+
+# Same default as agent_server.py; not imported from there so the client stays light
+DEFAULT_SOCKET_PATH = "./ceph_agent.sock"
+
+
+class agentClient:
+    """
+    A connection to the agent server; one connection is one session. The
+    token defaults to CEPH_AGENT_SERVER_TOKEN and is sent with every request.
+    """
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, host: str = None, port: int = 8765, session: str = None, token: str = None) -> None:
+        if host is not None:
+            self._sock = socket.create_connection((host, port))
+        else:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.connect(socket_path)
+        self._file = self._sock.makefile("rwb")
+        self.session = session
+        self.token = token or os.environ.get("CEPH_AGENT_SERVER_TOKEN") or None
+
+    def _send(self, message: dict) -> None:
+        if self.token:
+            message["token"] = self.token
+        if self.session:
+            message["session"] = self.session
+        self._file.write((json.dumps(message) + "\n").encode("utf-8"))
+        self._file.flush()
+
+    def _read(self) -> dict:
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("The agent server closed the connection")
+        message = json.loads(line)
+        if message["type"] == "session":
+            self.session = message["session"]
+        return message
+
+    def query(self, query: str, model_choice: str = "o", on_token=None) -> dict:
+        """Sends a query and returns its result, passing streamed tokens to on_token."""
+        self._send({"type": "query", "query": query, "model_choice": model_choice})
+        while True:
+            message = self._read()
+            if message["type"] == "token" and on_token is not None:
+                on_token(message["text"])
+            elif message["type"] == "result":
+                return message["result"]
+            elif message["type"] == "error":
+                raise RuntimeError(message["error"])
+
+    def stats(self) -> dict:
+        self._send({"type": "stats"})
+        while True:
+            message = self._read()
+            if message["type"] == "stats":
+                return message["stats"]
+
+    def close(self) -> None:
+        self._file.close()
+        self._sock.close()
+
+
+def _print_result(result: dict, streamed: bool) -> None:
+    if streamed:
+        print()
+    elif result.get("answer"):
+        print(f"💡 Agent Response: {result['answer']}")
+    if result.get("warning"):
+        print(f"⚠️ {result['warning']}")
+    if result.get("error"):
+        print(f"🔴 {result['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query a running Ceph agent server.")
+    parser.add_argument("-q", "--query", action="append", help="Query to run; repeat for a batch")
+    parser.add_argument("-m", "--model-choice", default="o", choices=["o", "l"], help="Ollama or LM Studio")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH)
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--session", help="Resume an earlier session's context")
+    parser.add_argument("--json", action="store_true", help="Print each result as a JSON line")
+    parser.add_argument("--stats", action="store_true", help="Print server statistics and exit")
+    args = parser.parse_args()
+
+    client = agentClient(args.socket, args.host, args.port, session=args.session)
+    try:
+        if args.stats:
+            print(json.dumps(client.stats(), indent=2))
+            return
+
+        if args.query:
+            failed = False
+            for query in args.query:
+                if args.json:
+                    result = client.query(query, args.model_choice)
+                    print(json.dumps(result))
+                else:
+                    print(f"\nYour Ceph Query: {query}")
+                    streamed = []
+                    result = client.query(
+                        query, args.model_choice,
+                        on_token=lambda t: (streamed.append(t), print(t, end="", flush=True))
+                    )
+                    _print_result(result, bool(streamed))
+                failed = failed or not result.get("success")
+            sys.exit(1 if failed else 0)
+
+        while True:
+            query = input("\nYour Ceph Query (e.g., 'check cluster health'): ").strip()
+            if query.lower() in ["exit", "quit"]:
+                break
+            if not query:
+                continue
+            streamed = []
+            result = client.query(
+                query, args.model_choice,
+                on_token=lambda t: (streamed.append(t), print(t, end="", flush=True))
+            )
+            _print_result(result, bool(streamed))
+        print(f"Session {client.session} closed. Goodbye!")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
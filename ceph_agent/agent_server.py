@@ -0,0 +1,189 @@
+# --------------------
+# Ceph Agent Server
+# --------------------
+#
+# Usage (from the ceph_agent directory):
+#   python agent_server.py                        # Unix socket ./ceph_agent.sock
+#   CEPH_AGENT_SERVER_TOKEN=... python agent_server.py --host 127.0.0.1 --port 8765
+#
+# Anyone who can talk to the server can run cluster commands through it. The
+# Unix socket is only accessible to its owner (mode 0600); a TCP listener is
+# open to every user on the host (or the network), so --host refuses to start
+# without CEPH_AGENT_SERVER_TOKEN, and every request must then carry
+# "token": "<the same value>" (agent_client.py reads the same variable).
+#
+# Keeps one warm agentController (encoder, FAISS index, LLM clients, result
+# cache) for all clients and serves concurrent sessions over newline
+# delimited JSON. Each connection is a session; a client can also name a
+# session id to pick up its planning context from an earlier connection.
+#
+# Requests:   {"type": "query", "query": "...", "model_choice": "o", "token": "..."}
+#             {"type": "stats", "token": "..."}
+# Responses:  {"type": "session", "session": "<id>"}       (on connect)
+#             {"type": "token", "text": "..."}               (while answering)
+#             {"type": "result", "result": {...}}            (per query)
+#             {"type": "stats", "stats": {...}}
+#             {"type": "error", "error": "..."}
+
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.controller import agentController, agentSession
+
+DEFAULT_SOCKET_PATH = "./ceph_agent.sock"
+
+
+class agentServer:
+    """
+    Asyncio front end over a shared controller.
+
+    Args:
+        controller (agentController): The warm controller shared by all sessions.
+        max_concurrent_queries (int): Queries running at once; the rest wait.
+        session_ttl (int): Seconds an idle session is kept for reconnects.
+        token (str): Shared secret every request must carry; required for TCP.
+    """
+    def __init__(self, controller: agentController, max_concurrent_queries: int = 4, session_ttl: int = 3600, token: str = None) -> None:
+        self.controller = controller
+        self.session_ttl = session_ttl
+        self.token = token
+        self._sessions = {}   # id -> (agentSession, last used)
+        # The controller blocks on subprocesses and LLM calls, so queries run on threads
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrent_queries, thread_name_prefix="agent-query")
+
+    def _get_session(self, session_id: str = None) -> agentSession:
+        now = time.monotonic()
+        for sid, (_, last_used) in list(self._sessions.items()):
+            if now - last_used > self.session_ttl:
+                del self._sessions[sid]
+        if session_id in self._sessions:
+            session = self._sessions[session_id][0]
+        else:
+            session = agentSession(session_id)
+        self._sessions[session.session_id] = (session, now)
+        return session
+
+    def _authorized(self, request: dict) -> bool:
+        if not self.token:
+            return True
+        supplied = request.get("token")
+        return isinstance(supplied, str) and hmac.compare_digest(supplied.encode("utf-8"), self.token.encode("utf-8"))
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, message: dict) -> None:
+        writer.write((json.dumps(message, default=str) + "\n").encode("utf-8"))
+        await writer.drain()
+
+    async def _run_query(self, session: agentSession, request: dict, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        tokens = asyncio.Queue()
+
+        def on_token(token):
+            # Called on the worker thread
+            loop.call_soon_threadsafe(tokens.put_nowait, token)
+
+        future = loop.run_in_executor(
+            self._pool,
+            lambda: self.controller.handle_query(
+                request["query"],
+                request.get("model_choice"),
+                session=session,
+                on_token=on_token
+            )
+        )
+
+        # Forward tokens while the query runs
+        while not (future.done() and tokens.empty()):
+            getter = asyncio.ensure_future(tokens.get())
+            done, _ = await asyncio.wait({getter, future}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                await self._send(writer, {"type": "token", "text": getter.result()})
+            else:
+                getter.cancel()
+
+        self._sessions[session.session_id] = (session, time.monotonic())
+        await self._send(writer, {"type": "result", "result": future.result()})
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        session = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as e:
+                    await self._send(writer, {"type": "error", "error": f"Invalid JSON: {e}"})
+                    continue
+
+                if not self._authorized(request):
+                    print("⚠️ Server: Rejected a request without a valid token")
+                    await self._send(writer, {"type": "error", "error": "Unauthorized"})
+                    break
+
+                if session is None or (request.get("session") and request["session"] != session.session_id):
+                    session = self._get_session(request.get("session"))
+                    await self._send(writer, {"type": "session", "session": session.session_id})
+
+                if request.get("type") == "query" and request.get("query"):
+                    try:
+                        await self._run_query(session, request, writer)
+                    except Exception as e:
+                        print(f"🔴 Server: Query failed: {e!r}")
+                        await self._send(writer, {"type": "error", "error": str(e)})
+                elif request.get("type") == "stats":
+                    await self._send(writer, {"type": "stats", "stats": self.controller.stats()})
+                else:
+                    await self._send(writer, {"type": "error", "error": "Expected {'type': 'query', 'query': ...} or {'type': 'stats'}"})
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path: str = None, host: str = None, port: int = None) -> None:
+        if host is not None:
+            if not self.token:
+                raise ValueError("A TCP listener needs a token (CEPH_AGENT_SERVER_TOKEN)")
+            server = await asyncio.start_server(self.handle_connection, host, port)
+            print(f"✅ Ceph Agent server listening on {host}:{port}")
+        else:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            server = await asyncio.start_unix_server(self.handle_connection, socket_path)
+            os.chmod(socket_path, 0o600)
+            print(f"✅ Ceph Agent server listening on {socket_path}")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Ceph agent to concurrent clients.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH, help="Unix socket path (default)")
+    parser.add_argument("--host", help="Listen on TCP instead of a Unix socket")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-concurrent", type=int, default=int(os.environ.get("CEPH_AGENT_SERVER_CONCURRENCY", 4)))
+    args = parser.parse_args()
+    token = os.environ.get("CEPH_AGENT_SERVER_TOKEN") or None
+    if args.host and not token:
+        parser.error("--host needs CEPH_AGENT_SERVER_TOKEN to be set; requests are otherwise unauthenticated")
+
+    print("Initializing Ceph Agent Controller...")
+    controller = agentController()
+    # Pay the model and index load once, before the first client connects
+    controller.warm_up()
+
+    server = agentServer(controller, max_concurrent_queries=args.max_concurrent, token=token)
+    try:
+        asyncio.run(server.serve(socket_path=args.socket, host=args.host, port=args.port))
+    except KeyboardInterrupt:
+        print("Shutting down Ceph Agent server.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# --------------------
+# Prompt Prefix Benchmark
+# --------------------
+#
+# Usage (from the ceph_agent directory, with Ollama running):
+#   python -m benchmark.prompt_cache_benchmark --labels benchmark/labeled_queries.json
+#   python -m benchmark.prompt_cache_benchmark --model granite3.3:8b --limit 10
+#
+# Sends the agent's prompts (planner, structured selection, analyzer) for
+# every labeled query twice: once in the old layout, with the variable data
+# ahead of the static instructions (and the planner's system message after
+# the user message), and once as built by llm/prompts.py, static prefix
+# first. Ollama reports how many prompt tokens it had to evaluate and how
+# long that took; tokens served from the KV cache of a shared prefix are
+# not counted. Generation is capped at a few tokens so the numbers are
+# about prompt processing.
+#
+# Each prompt kind is measured on its own. In the running agent the kinds
+# interleave, and Ollama keeps one cached prompt per parallel slot, so their
+# prefixes only stay cached side by side with OLLAMA_NUM_PARALLEL >= 3.
+
+import argparse
+import json
+import time
+
+from llm.llm_response import llmClientPool
+from llm.prompts import (
+    planner_messages, structured_selection_messages, analysis_messages, estimate_prompt_tokens
+)
+
+SAMPLE_COMMANDS = [
+    {"command": "ceph -s", "description": "Shows the overall status and health of the cluster."},
+    {"command": "ceph osd tree", "description": "Shows OSDs in the CRUSH hierarchy with their up/down state."},
+    {"command": "ceph df", "description": "Shows raw and per-pool storage usage."},
+]
+
+SAMPLE_OUTPUT = json.dumps({
+    "health": {"status": "HEALTH_WARN", "checks": {"OSD_DOWN": {"summary": {"message": "1 osds down"}}}},
+    "osdmap": {"num_osds": 12, "num_up_osds": 11, "num_in_osds": 12},
+    "pgmap": {"num_pgs": 256, "bytes_used": 1203948574720, "bytes_total": 4398046511104},
+}, indent=2)
+
+
+def legacy_layout(messages: list) -> list:
+    """The layout before llm/prompts.py: variable data first, instructions after."""
+    system, user = messages[0]["content"], messages[1]["content"]
+    if system.startswith("You are an expert assistant for a Ceph Command AI agent"):
+        # The planner used to send the user message before the system message
+        return [{"role": "user", "content": user}, {"role": "system", "content": system}]
+    return [{"role": "user", "content": f"{user}\n\n{system}"}]
+
+
+def build_prompt(query: str, kind: str) -> list:
+    if kind == "planner":
+        return planner_messages(query)
+    if kind == "structured_selection":
+        return structured_selection_messages(query, SAMPLE_COMMANDS)
+    return analysis_messages(query, "ceph -s", SAMPLE_OUTPUT, SAMPLE_COMMANDS[0]["description"])
+
+
+def run_layout(pool: llmClientPool, model: str, queries: list, kind: str, legacy: bool) -> dict:
+    """Sends one prompt kind for every query and returns Ollama's averaged prompt-eval numbers."""
+    pool.prompt_stats.reset()
+    wall = []
+    for query in queries:
+        messages = build_prompt(query, kind)
+        if legacy:
+            messages = legacy_layout(messages)
+        start = time.perf_counter()
+        pool.chat("ollama", model, messages, num_predict=4, temperature=0.0)
+        wall.append(time.perf_counter() - start)
+    # Legacy calls do not lead with a known system message and are counted as "other"
+    (entry,) = pool.prompt_stats.as_dict().values()
+    return dict(entry, wall_ms_mean=round(sum(wall) / len(wall) * 1000, 1))
+
+
+def print_report(results: list) -> None:
+    print(f"\n{'prompt':<22} {'layout':<8} {'calls':>6} {'eval tok':>9} {'eval ms':>9} {'wall ms':>9}")
+    for kind, label, entry in results:
+        print(
+            f"{kind:<22} {label:<8} {entry['calls']:>6} {entry['prompt_tokens_mean']:>9} "
+            f"{entry['prompt_eval_ms_mean']:>9} {entry['wall_ms_mean']:>9}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure prompt-eval cost before/after the stable prompt prefix layout.")
+    parser.add_argument("--labels", default="benchmark/labeled_queries.json")
+    parser.add_argument("--model", default="granite3.3:8b")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N labeled queries")
+    parser.add_argument("--kind", action="append", choices=["planner", "structured_selection", "analyzer"],
+                        help="Prompt kinds to measure (default: all three)")
+    parser.add_argument("--keep-alive", default="30m")
+    args = parser.parse_args()
+
+    with open(args.labels, "r", encoding="utf-8") as f:
+        queries = [item["query"] for item in json.load(f)][:args.limit]
+    kinds = args.kind or ["planner", "structured_selection", "analyzer"]
+
+    sizes = {kind: estimate_prompt_tokens(build_prompt(queries[0], kind)) for kind in kinds}
+    print(f"Sending {len(queries)} queries per prompt; estimated prompt sizes: {sizes}")
+
+    pool = llmClientPool(keep_alive=args.keep_alive)
+    results = []
+    try:
+        # Load the model first so neither layout pays for it
+        pool.chat("ollama", args.model, [{"role": "user", "content": "ok"}], num_predict=1)
+        for kind in kinds:
+            results.append((kind, "before", run_layout(pool, args.model, queries, kind, legacy=True)))
+            results.append((kind, "after", run_layout(pool, args.model, queries, kind, legacy=False)))
+    finally:
+        pool.close()
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
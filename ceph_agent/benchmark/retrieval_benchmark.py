@@ -0,0 +1,259 @@
+# --------------------
+# Retrieval Benchmark
+# --------------------
+#
+# Usage (from the ceph_agent directory):
+#   python -m benchmark.retrieval_benchmark --labels benchmark/labeled_queries.json
+#   python -m benchmark.retrieval_benchmark --hybrid    # dense + BM25 fusion
+#
+# Runs every labeled query through vectorBuilder + semanticCephSearch and
+# reports recall@k, MRR, encode/search latency percentiles and peak memory.
+# Selection goes through search_and_select with a stubbed LLM that always
+# picks the first candidate it is shown, so the numbers measure retrieval
+# only and never wait on a model server.
+
+import argparse
+import json
+import os
+import re
+import resource
+import time
+import tracemalloc
+
+from rag.semantic_search import semanticCephSearch
+from utils.file_ops import vectorBuilder
+from utils.index_spec import parse_index_spec, format_index_spec
+
+
+class stubLLMClient:
+    """Stands in for llmClientPool and selects the first `<name>` in the prompt."""
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def chat(self, backend: str, model: str, messages: list, **options) -> str:
+        self.calls += 1
+        names = re.findall(r"<name>(.*?)</name>", messages[-1]["content"])
+        if not names:
+            return json.dumps({"relevant": False, "command": "NO_MATCH", "confidence": 0.0})
+        return json.dumps({"relevant": True, "command": names[0], "confidence": 1.0})
+
+    async def achat(self, backend: str, model: str, messages: list, **options) -> str:
+        return self.chat(backend, model, messages, **options)
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile, `pct` in [0, 100]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered) + 0.5 - 1e-9)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def recall_at_k(ranks: list, k: int) -> float:
+    """Share of queries whose expected command appears within the first k results.
+    `ranks` holds 1-based ranks, or None when the command was not retrieved."""
+    if not ranks:
+        return 0.0
+    return sum(1 for r in ranks if r is not None and r <= k) / len(ranks)
+
+
+def mean_reciprocal_rank(ranks: list) -> float:
+    if not ranks:
+        return 0.0
+    return sum(1.0 / r for r in ranks if r is not None) / len(ranks)
+
+
+def ann_recall(reference_ids: list, ids: list, k: int) -> float:
+    """Average overlap between each query's top-k ids and the exact (flat) top-k."""
+    if not reference_ids:
+        return 0.0
+    total = 0.0
+    for ref, got in zip(reference_ids, ids):
+        ref_k = set(i for i in ref[:k] if i >= 0)
+        if not ref_k:
+            total += 1.0
+            continue
+        total += len(ref_k & set(got[:k])) / len(ref_k)
+    return total / len(reference_ids)
+
+
+def latency_summary(seconds: list) -> dict:
+    return {
+        "p50_ms": percentile(seconds, 50) * 1000,
+        "p95_ms": percentile(seconds, 95) * 1000,
+        "p99_ms": percentile(seconds, 99) * 1000,
+        "mean_ms": (sum(seconds) / len(seconds) * 1000) if seconds else 0.0,
+    }
+
+
+def run_benchmark(cephSearch: semanticCephSearch, labels: list, repeat: int = 1) -> dict:
+    """
+    Measures retrieval quality and latency for a labeled query set.
+
+    Args:
+        cephSearch (semanticCephSearch): A search instance wired to a stub client.
+        labels (list): {"query": ..., "command": ...} pairs.
+        repeat (int): How many times to run the whole set for latency samples.
+
+    Returns:
+        dict: Quality metrics, latency summaries and memory figures.
+    """
+    vector_store = cephSearch.vector_store
+    # Load the model and index up front so they do not skew the first sample
+    vector_store.warm_up()
+
+    encode_times = []
+    search_times = []
+    ranks = []
+    retrieved_ids = []
+    selected_correct = 0
+
+    tracemalloc.start()
+    for round_no in range(repeat):
+        for item in labels:
+            start = time.perf_counter()
+            embedding = vector_store.encode_queries([item["query"]])
+            encode_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            results = cephSearch._search_embeddings(embedding, queries=[item["query"]])[0]
+            search_times.append(time.perf_counter() - start)
+
+            if round_no > 0:
+                continue
+            _, ids = vector_store.search(embedding, cephSearch.top_k)
+            retrieved_ids.append([int(i) for i in ids[0]])
+            commands = [r["command"] for r in results]
+            ranks.append(commands.index(item["command"]) + 1 if item["command"] in commands else None)
+
+            _, selected = cephSearch.search_and_select(item["query"], model_choice="o")
+            if selected == item["command"]:
+                selected_correct += 1
+    _, peak_python = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    report = {
+        "queries": len(labels),
+        "top_k": cephSearch.top_k,
+        "threshold": cephSearch.threshold,
+        "hybrid": cephSearch.hybrid,
+        "mrr": mean_reciprocal_rank(ranks),
+        "selection_accuracy": selected_correct / len(labels) if labels else 0.0,
+        "encode": latency_summary(encode_times),
+        "search": latency_summary(search_times),
+        "peak_python_mb": peak_python / (1024 * 1024),
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "index_spec": format_index_spec(vector_store.index_spec),
+        "retrieved_ids": retrieved_ids,
+    }
+    for k in range(1, cephSearch.top_k + 1):
+        report[f"recall@{k}"] = recall_at_k(ranks, k)
+    return report
+
+
+def print_report(report: dict) -> None:
+    print(f"\n--- Retrieval Benchmark [{report['index_spec']}] ---")
+    print(f"Queries: {report['queries']}  top_k: {report['top_k']}  threshold: {report['threshold']}")
+    for k in range(1, report["top_k"] + 1):
+        print(f"recall@{k}: {report[f'recall@{k}']:.3f}")
+    print(f"MRR: {report['mrr']:.3f}")
+    print(f"Selection accuracy (stub LLM): {report['selection_accuracy']:.3f}")
+    for stage in ("encode", "search"):
+        s = report[stage]
+        print(
+            f"{stage:<7} p50={s['p50_ms']:.2f}ms  p95={s['p95_ms']:.2f}ms  "
+            f"p99={s['p99_ms']:.2f}ms  mean={s['mean_ms']:.2f}ms"
+        )
+    print(f"Peak Python allocations: {report['peak_python_mb']:.1f} MB  Peak RSS: {report['peak_rss_mb']:.1f} MB")
+
+
+def print_comparison(reports: list) -> None:
+    """Prints recall against the flat index next to search latency for each spec."""
+    reference = reports[0]["retrieved_ids"]
+    k = reports[0]["top_k"]
+    print(f"\n--- Index comparison (reference: {reports[0]['index_spec']}) ---")
+    print(f"{'index':<36} {'ann_recall@' + str(k):>14} {'recall@' + str(k):>10} {'search p50':>11} {'search p95':>11}")
+    for report in reports:
+        report[f"ann_recall@{k}"] = ann_recall(reference, report["retrieved_ids"], k)
+        print(
+            f"{report['index_spec']:<36} {report[f'ann_recall@{k}']:>14.3f} {report[f'recall@{k}']:>10.3f} "
+            f"{report['search']['p50_ms']:>9.3f}ms {report['search']['p95_ms']:>9.3f}ms"
+        )
+
+
+def _spec_index_path(index_path: str, spec: dict) -> str:
+    # Each non-flat spec gets its own files next to the default index
+    if spec["type"] == "flat":
+        return index_path
+    slug = format_index_spec(spec).replace(":", "_").replace(",", "_").replace("=", "")
+    root, ext = os.path.splitext(index_path)
+    return f"{root}.{slug}{ext}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark command retrieval against a labeled query set.")
+    parser.add_argument("--labels", default="./benchmark/labeled_queries.json")
+    parser.add_argument("--json-path", default="./database/basic_commands.json")
+    parser.add_argument("--model-name", default="all-MiniLM-L6-v2")
+    parser.add_argument("--index-path", default="./faiss_index_store/ceph_faiss.index")
+    parser.add_argument("--metadata-path", default="./faiss_index_store/ceph_faiss_metadata.json")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=0.35)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warm-cache", action="store_true",
+                        help="Keep the embedding cache on, so repeats measure cache hits")
+    parser.add_argument("--index-spec", action="append",
+                        help="Index spec to benchmark, e.g. 'hnsw:M=32'. Repeat to compare; flat is always the reference")
+    parser.add_argument("--ef-search", type=int, help="HNSW efSearch")
+    parser.add_argument("--nprobe", type=int, help="IVF nprobe")
+    parser.add_argument("--json-out", help="Also write the report to this file")
+    parser.add_argument("--hybrid", action="store_true", help="Fuse BM25 keyword hits with the dense hits")
+    args = parser.parse_args()
+
+    with open(args.labels) as f:
+        labels = json.load(f)
+
+    specs = [parse_index_spec(spec) for spec in (args.index_spec or ["flat"])]
+    if len(specs) > 1 or specs[0]["type"] != "flat":
+        specs = [parse_index_spec("flat")] + [spec for spec in specs if spec["type"] != "flat"]
+
+    reports = []
+    for spec in specs:
+        index_path = _spec_index_path(args.index_path, spec)
+        vector_store = vectorBuilder(
+            json_path=args.json_path,
+            model_name=args.model_name,
+            index_path=index_path,
+            metadata_path=os.path.splitext(index_path)[0] + "_metadata.json" if spec["type"] != "flat" else args.metadata_path,
+            cache_size=1024 if args.warm_cache else 0,
+            lazy=True,
+            index_spec=spec,
+            ef_search=args.ef_search,
+            nprobe=args.nprobe
+        )
+        cephSearch = semanticCephSearch(
+            vector_store=vector_store,
+            top_k=args.top_k,
+            threshold=args.threshold,
+            selection_mode="single",
+            client=stubLLMClient(),
+            hybrid=args.hybrid
+        )
+
+        report = run_benchmark(cephSearch, labels, repeat=args.repeat)
+        print_report(report)
+        reports.append(report)
+
+    if len(reports) > 1:
+        print_comparison(reports)
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(reports if len(reports) > 1 else reports[0], f, indent=2)
+        print(f"✅ Report written to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
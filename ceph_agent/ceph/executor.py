@@ -1,7 +1,14 @@
 #from ast import main
+import errno
+import json
+import os
+import shlex
 import subprocess
 #import paramiko  # Import the Paramiko library
 import sys
+import threading
+
+from ceph.remote import remote_command
 
 CEPH_CONF_PATH = '/etc/ceph/ceph.conf'
 
@@ -185,6 +192,29 @@ def execute_command(
 '''
 
 
+# Default cap on how much command output is kept in memory (8 MiB)
+DEFAULT_MAX_OUTPUT_BYTES = 8 * 1024 * 1024
+# Longest piece of stdout read at once; longer lines arrive in several pieces
+STREAM_CHUNK_CHARS = 64 * 1024
+
+
+def _build_command(cmd, conf=CEPH_CONF_PATH, username="client.admin", keyring=None):
+    try:
+        if keyring is None:
+            print("Taking the default admin keyring listed under /etc/ceph/ directory")
+            cmd = cmd + f" --conf {conf}"
+        else:
+            print("Taking the specified keyring, & username")
+            cmd = cmd + f" --conf {conf} --keyring={keyring} --name={username}" 
+
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        sys.exit(1)
+    
+    # UPDATED: Runs over the pooled SSH connection to the configured admin node
+    return remote_command(cmd)
+
+
 def execute_command(cmd, conf=CEPH_CONF_PATH, username="client.admin", keyring=None):
     """
     Short description of what the function does.
@@ -201,20 +231,373 @@ def execute_command(cmd, conf=CEPH_CONF_PATH, username="client.admin", keyring=N
     Raises:
         ExceptionType: If the command execution failed then an exception is raised.
     """
+    cmd = _build_command(cmd, conf, username, keyring)
 
-    try:
-        if keyring is None:
-            print("Taking the default admin keyring listed under /etc/ceph/ directory")
-            cmd = cmd + f" --conf {conf}"
-        else:
-            print("Taking the specified keyring, & username")
-            cmd = cmd + f" --conf {conf} --keyring={keyring} --name={username}" 
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True, shell=True)
+    return result.stdout, result.stderr, result.returncode
 
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        sys.exit(1)
-    
-    cmd = "ssh root@130.198.19.212 -i /Users/kritiksachdeva/Downloads/sdf-ssh-key_rsa.prv -- " + cmd
 
-    result = subprocess.run(cmd, capture_output=True, text=True, check=True, shell=True)
-    return result.stdout, result.stderr, result.returncode
\ No newline at end of file
+class commandStream:
+    """
+    Iterates over a running command's stdout line by line.
+
+    Lines longer than STREAM_CHUNK_CHARS (e.g. a `--format json` reply, which
+    is a single line) are handed out in pieces, so a piece does not always
+    end with a newline and memory stays bounded. At most `max_bytes` of
+    stdout are handed out, cut mid-line if need be; after that a single
+    truncation marker is yielded and the rest is read and discarded so the
+    command can finish and report its real exit code. `returncode`,
+    `stderr` and `truncated` are available once iteration is over.
+    """
+    # Seconds since the output was produced, set when it comes from a result cache
+    cache_age = None
+
+    def __init__(self, full_cmd: str, max_bytes: int = DEFAULT_MAX_OUTPUT_BYTES, stderr_max_bytes: int = 64 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+        self.truncated = False
+        self.returncode = None
+        self._stderr_parts = []
+        self._stderr_max_bytes = stderr_max_bytes
+        self._proc = subprocess.Popen(
+            full_cmd,
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            errors="replace",
+            bufsize=1
+        )
+        # Drain stderr in the background so a chatty command can never block
+        # on a full pipe while we are reading stdout.
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, daemon=True)
+        self._stderr_thread.start()
+
+    def _drain_stderr(self) -> None:
+        kept = 0
+        for line in self._proc.stderr:
+            if kept < self._stderr_max_bytes:
+                self._stderr_parts.append(line)
+                kept += len(line)
+
+    def _lines(self):
+        return iter(lambda: self._proc.stdout.readline(STREAM_CHUNK_CHARS), "")
+
+    def _finish(self) -> None:
+        self.returncode = self._proc.wait()
+        self._stderr_thread.join()
+
+    def __iter__(self):
+        kept = 0
+        for line in self._lines():
+            size = len(line.encode("utf-8", errors="replace"))
+            self.bytes_read += size
+            if self.truncated:
+                continue
+            if kept + size > self.max_bytes:
+                self.truncated = True
+                # Keep what still fits, so one oversized line is cut, not dropped
+                head = line.encode("utf-8", errors="replace")[:self.max_bytes - kept].decode("utf-8", errors="ignore")
+                kept += len(head.encode("utf-8"))
+                yield f"{head}\n[... output truncated after {kept} bytes ...]\n"
+                continue
+            kept += size
+            yield line
+        self._finish()
+        if self.truncated:
+            print(f"WARNING: Command output truncated: kept {kept} of {self.bytes_read} bytes.")
+
+    @property
+    def stderr(self) -> str:
+        return "".join(self._stderr_parts)
+
+    def read_all(self) -> str:
+        """Consumes the rest of the stream and returns it as one string."""
+        return "".join(self)
+
+
+def stream_command(cmd, conf=CEPH_CONF_PATH, username="client.admin", keyring=None, max_bytes=DEFAULT_MAX_OUTPUT_BYTES):
+    """
+    Starts a Ceph command and returns its output as it is produced.
+
+    Args:
+        cmd (string): Ceph command to execute on the running cluster admin node.
+        conf (string): Configuration path if the default PATH is not available.
+        username (string): Username which will perform the execution of the ceph command
+        keyring (string): PATH to the keyring path
+        max_bytes (int): Cap on the stdout bytes handed to the caller.
+
+    Returns:
+        commandStream: Iterable of output lines (long lines in pieces); exposes returncode and stderr
+                       once fully consumed. Unlike execute_command a non-zero
+                       exit code does not raise.
+    """
+    return commandStream(_build_command(cmd, conf, username, keyring), max_bytes=max_bytes)
+
+
+class bufferedStream(commandStream):
+    """The commandStream interface over output that has already been fully received."""
+    def __init__(self, stdout: str, stderr: str = "", returncode: int = 0, max_bytes: int = DEFAULT_MAX_OUTPUT_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+        self.truncated = False
+        self.returncode = None
+        self._stdout = stdout
+        self._stderr_parts = [stderr] if stderr else []
+        self._final_returncode = returncode
+
+    def _lines(self):
+        for line in self._stdout.splitlines(keepends=True):
+            for start in range(0, len(line), STREAM_CHUNK_CHARS):
+                yield line[start:start + STREAM_CHUNK_CHARS]
+
+    def _finish(self) -> None:
+        self.returncode = self._final_returncode
+
+
+# --------------------
+# Execution Backends
+# --------------------
+
+class cliBackend:
+    """Runs commands through the `ceph` CLI (over SSH when a remote target is configured)."""
+    name = "cli"
+
+    def __init__(self, conf=CEPH_CONF_PATH, username="client.admin", keyring=None) -> None:
+        self.conf = conf
+        self.username = username
+        self.keyring = keyring
+
+    def execute(self, cmd: str) -> (str, str, int):
+        return execute_command(cmd, self.conf, self.username, self.keyring)
+
+    def stream(self, cmd: str, max_bytes: int = DEFAULT_MAX_OUTPUT_BYTES):
+        return stream_command(cmd, self.conf, self.username, self.keyring, max_bytes=max_bytes)
+
+
+# Global CLI options that only select how output is printed
+_STATUS_FLAGS = {"-s": "status", "--status": "status"}
+_FORMAT_FLAGS = ("-f", "--format")
+
+
+def _sig_items(sig: list) -> list:
+    """Normalizes a command signature into dicts, as the ceph CLI's argparse does."""
+    items = []
+    for desc in sig:
+        if isinstance(desc, str):
+            desc = {"type": "CephPrefix", "name": "prefix", "prefix": desc}
+        items.append(desc)
+    return items
+
+
+def _is_true(value) -> bool:
+    return value is True or str(value).lower() == "true"
+
+
+def _convert(desc: dict, word: str):
+    if desc.get("type") == "CephInt":
+        return int(word)
+    if desc.get("type") == "CephFloat":
+        return float(word)
+    return word
+
+
+def _match_signature(sig: list, words: list):
+    """
+    Matches positional words against one command signature.
+
+    Returns:
+        dict: The mon_command arguments, or None if the words do not fit.
+    """
+    args = {}
+    prefix = []
+    pos = 0
+    for desc in _sig_items(sig):
+        if desc.get("type") == "CephPrefix":
+            if pos >= len(words) or words[pos] != desc["prefix"]:
+                return None
+            prefix.append(desc["prefix"])
+            pos += 1
+            continue
+        if pos >= len(words):
+            if _is_true(desc.get("req", True)):
+                return None
+            continue
+        try:
+            if desc.get("n") == "N":
+                args[desc["name"]] = [_convert(desc, w) for w in words[pos:]]
+                pos = len(words)
+            else:
+                args[desc["name"]] = _convert(desc, words[pos])
+                pos += 1
+        except ValueError:
+            return None
+    if pos != len(words):
+        return None
+    args["prefix"] = " ".join(prefix)
+    return args
+
+
+class radosBackend:
+    """
+    Sends commands to the monitors over one persistent librados connection.
+
+    Commands are translated into `mon_command` JSON using the signatures the
+    monitors publish, so no `ceph` process, interpreter start-up or fresh
+    auth handshake is paid per command. Anything that cannot be translated
+    (non-ceph commands, watch mode, unknown flags) or reached (no librados,
+    no connection) runs through `fallback` instead.
+
+    Note that librados connects from this host, so it needs a local
+    ceph.conf and keyring rather than the SSH target.
+    """
+    name = "rados"
+
+    def __init__(
+        self,
+        conf=CEPH_CONF_PATH,
+        username="client.admin",
+        keyring=None,
+        cluster=None,
+        timeout: int = 10,
+        output_format: str = "json",
+        fallback=None
+    ) -> None:
+        self.conf = conf
+        self.username = username
+        self.keyring = keyring
+        self.timeout = timeout
+        self.output_format = output_format
+        self.fallback = fallback if fallback is not None else cliBackend(conf, username, keyring)
+
+        self._cluster = cluster
+        self._signatures = None
+        self._lock = threading.Lock()
+        self._unavailable = False
+
+    def _connect(self):
+        with self._lock:
+            if self._cluster is None and not self._unavailable:
+                try:
+                    import rados
+                    extra = {"keyring": self.keyring} if self.keyring else {}
+                    cluster = rados.Rados(conffile=self.conf, name=self.username, conf=extra)
+                    cluster.connect(timeout=self.timeout)
+                    self._cluster = cluster
+                    print("✅ Connected to the Ceph monitors over librados")
+                except Exception as e:
+                    # Do not retry on every command, the CLI takes over from here
+                    self._unavailable = True
+                    print(f"WARNING: librados connection failed ({e}). Falling back to the {self.fallback.name} backend.")
+            return self._cluster
+
+    def _command_signatures(self, cluster) -> list:
+        if self._signatures is None:
+            ret, outbuf, outs = cluster.mon_command(
+                json.dumps({"prefix": "get_command_descriptions"}), b"", timeout=self.timeout
+            )
+            if ret != 0:
+                print(f"WARNING: Could not fetch command descriptions: {outs}")
+                return []
+            descriptions = json.loads(outbuf)
+            self._signatures = [entry["sig"] for entry in descriptions.values()]
+        return self._signatures
+
+    def to_mon_command(self, cmd: str, cluster) -> dict:
+        """
+        Translates a `ceph ...` command line into mon_command arguments.
+
+        Returns:
+            dict: e.g. {"prefix": "osd pool get", "pool": "rbd", "var": "size", "format": "json"},
+                  or None if the command has to go through the CLI.
+        """
+        try:
+            words = shlex.split(cmd)
+        except ValueError:
+            return None
+        if not words or words[0] != "ceph":
+            return None
+        words = words[1:]
+
+        output_format = self.output_format
+        positional = []
+        i = 0
+        while i < len(words):
+            word = words[i]
+            if word in _STATUS_FLAGS:
+                positional.append(_STATUS_FLAGS[word])
+            elif word in _FORMAT_FLAGS and i + 1 < len(words):
+                output_format = words[i + 1]
+                i += 1
+            elif word.startswith("--format="):
+                output_format = word.split("=", 1)[1]
+            elif word.startswith("-"):
+                # -w, --cluster, --name etc. change how the CLI itself behaves
+                return None
+            else:
+                positional.append(word)
+            i += 1
+
+        best = None
+        for sig in self._command_signatures(cluster):
+            args = _match_signature(sig, positional)
+            if args is not None and (best is None or len(args["prefix"]) > len(best["prefix"])):
+                best = args
+        if best is None:
+            return None
+        best["format"] = output_format
+        return best
+
+    def execute(self, cmd: str) -> (str, str, int):
+        cluster = self._connect()
+        if cluster is None:
+            return self.fallback.execute(cmd)
+
+        mon_cmd = self.to_mon_command(cmd, cluster)
+        if mon_cmd is None:
+            print(f"INFO: '{cmd}' has no mon_command form, running it through the {self.fallback.name} backend.")
+            return self.fallback.execute(cmd)
+
+        ret, outbuf, outs = cluster.mon_command(json.dumps(mon_cmd), b"", timeout=self.timeout)
+        if ret == -errno.EINVAL and hasattr(cluster, "mgr_command"):
+            # Manager module commands (orch, crash, balancer ...) are served by the mgr
+            ret, outbuf, outs = cluster.mgr_command(json.dumps(mon_cmd), b"", timeout=self.timeout)
+
+        stdout = outbuf.decode("utf-8", errors="replace") if isinstance(outbuf, bytes) else outbuf
+        # librados reports errors as negative errno values, the CLI as positive exit codes
+        return stdout, outs, abs(ret)
+
+    def stream(self, cmd: str, max_bytes: int = DEFAULT_MAX_OUTPUT_BYTES):
+        # mon_command replies arrive whole, so there is nothing to stream
+        if self._connect() is None:
+            return self.fallback.stream(cmd, max_bytes=max_bytes)
+        stdout, stderr, returncode = self.execute(cmd)
+        return bufferedStream(stdout, stderr, returncode, max_bytes=max_bytes)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._cluster is not None and hasattr(self._cluster, "shutdown"):
+                self._cluster.shutdown()
+            self._cluster = None
+
+
+EXECUTOR_BACKENDS = ("cli", "rados", "fake")
+
+
+def get_executor_backend(name: str = None):
+    """
+    Builds the execution backend for this deployment.
+
+    Args:
+        name (str): "cli", "rados" or "fake". Defaults to the CEPH_AGENT_EXECUTOR
+                    environment variable, or "cli".
+    """
+    name = (name or os.environ.get("CEPH_AGENT_EXECUTOR", "cli")).lower()
+    if name == "cli":
+        return cliBackend()
+    if name == "rados":
+        return radosBackend()
+    if name == "fake":
+        from ceph.fake_cluster import fakeRadosCluster
+        return radosBackend(cluster=fakeRadosCluster())
+    raise ValueError(f"Unknown executor backend '{name}'. Expected one of {EXECUTOR_BACKENDS}")
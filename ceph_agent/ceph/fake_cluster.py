@@ -0,0 +1,87 @@
+# --------------------
+# In-process Fake Cluster
+# --------------------
+#
+# Stands in for a `rados.Rados` handle so radosBackend can be exercised
+# without a live Ceph cluster: `get_executor_backend("fake")`, or
+# `radosBackend(cluster=fakeRadosCluster(...))` in tests.
+
+import errno
+import json
+
+# A small slice of what the monitors publish through get_command_descriptions
+DEFAULT_DESCRIPTIONS = {
+    "cmd000": {"sig": ["status"], "help": "show cluster status"},
+    "cmd001": {"sig": ["health", {"name": "detail", "type": "CephChoices", "strings": "detail", "req": "false"}],
+               "help": "show cluster health"},
+    "cmd002": {"sig": ["df", {"name": "detail", "type": "CephChoices", "strings": "detail", "req": "false"}],
+               "help": "show cluster free space stats"},
+    "cmd003": {"sig": ["osd", "tree"], "help": "print OSD tree"},
+    "cmd004": {"sig": ["osd", "stat"], "help": "print summary of OSD map"},
+    "cmd005": {"sig": ["osd", "pool", "ls", {"name": "detail", "type": "CephChoices", "strings": "detail", "req": "false"}],
+               "help": "list pools"},
+    "cmd006": {"sig": ["osd", "pool", "get",
+                       {"name": "pool", "type": "CephPoolname"},
+                       {"name": "var", "type": "CephChoices", "strings": "size|min_size|pg_num|pgp_num|crush_rule"}],
+               "help": "get pool parameter <var>"},
+    "cmd007": {"sig": ["osd", "pool", "set",
+                       {"name": "pool", "type": "CephPoolname"},
+                       {"name": "var", "type": "CephChoices", "strings": "size|min_size|pg_num|pgp_num|crush_rule"},
+                       {"name": "val", "type": "CephString"}],
+               "help": "set pool parameter <var> to <val>"},
+    "cmd008": {"sig": ["mon", "stat"], "help": "summarize monitor status"},
+    "cmd009": {"sig": ["pg", "stat"], "help": "show placement group status"},
+}
+
+DEFAULT_RESPONSES = {
+    "status": {"fsid": "00000000-0000-0000-0000-000000000000",
+               "health": {"status": "HEALTH_OK", "checks": {}},
+               "osdmap": {"num_osds": 3, "num_up_osds": 3, "num_in_osds": 3},
+               "pgmap": {"num_pgs": 64, "num_pools": 2}},
+    "health": {"status": "HEALTH_OK", "checks": {}},
+    "df": {"stats": {"total_bytes": 322122547200, "total_used_bytes": 3221225472, "total_avail_bytes": 318901321728},
+           "pools": [{"name": "rbd", "id": 1}, {"name": ".mgr", "id": 2}]},
+    "osd tree": {"nodes": [{"id": -1, "name": "default", "type": "root", "children": [0, 1, 2]},
+                           {"id": 0, "name": "osd.0", "type": "osd", "status": "up"},
+                           {"id": 1, "name": "osd.1", "type": "osd", "status": "up"},
+                           {"id": 2, "name": "osd.2", "type": "osd", "status": "up"}]},
+    "osd stat": {"num_osds": 3, "num_up_osds": 3, "num_in_osds": 3},
+    "osd pool ls": ["rbd", ".mgr"],
+    "osd pool get": {"pool": "rbd", "size": 3},
+    "mon stat": {"epoch": 1, "quorum_names": ["a", "b", "c"]},
+    "pg stat": {"num_pgs": 64, "num_pg_by_state": [{"name": "active+clean", "num": 64}]},
+}
+
+
+class fakeRadosCluster:
+    """
+    Answers mon_command with canned JSON, keyed by command prefix.
+
+    Every command that was sent is kept in `sent`, so tests can assert on
+    the exact mon_command arguments.
+    """
+    def __init__(self, responses: dict = None, descriptions: dict = None) -> None:
+        self.responses = dict(DEFAULT_RESPONSES if responses is None else responses)
+        self.descriptions = DEFAULT_DESCRIPTIONS if descriptions is None else descriptions
+        self.sent = []
+        self.connected = True
+
+    def mon_command(self, cmd: str, inbuf: bytes, timeout: int = 0) -> (int, bytes, str):
+        args = json.loads(cmd)
+        prefix = args["prefix"]
+        if prefix == "get_command_descriptions":
+            return 0, json.dumps(self.descriptions).encode("utf-8"), ""
+
+        self.sent.append(args)
+        if prefix not in self.responses:
+            return -errno.EINVAL, b"", f"unrecognized command '{prefix}'"
+
+        response = self.responses[prefix]
+        if callable(response):
+            return response(args)
+        if args.get("format", "json") in ("json", "json-pretty"):
+            return 0, json.dumps(response).encode("utf-8"), ""
+        return 0, str(response).encode("utf-8"), ""
+
+    def shutdown(self) -> None:
+        self.connected = False
@@ -0,0 +1,236 @@
+# --------------------
+# Remote Execution over pooled SSH connections
+# --------------------
+#
+# Every remote Ceph command used to spawn a fresh `ssh ... -- ceph ...` and
+# pay a full TCP + key exchange per command. Here one OpenSSH ControlMaster
+# is kept per target host and every command runs as a multiplexed session
+# over it, so only the first command pays the handshake.
+#
+# The target comes from CEPH_AGENT_SSH_HOST / _USER / _PORT / _KEY. With no
+# host configured, commands run on this machine.
+
+import atexit
+import os
+import shlex
+import subprocess
+import tempfile
+import threading
+import time
+
+from utils.tracing import trace_span
+
+DEFAULT_SSH_USER = "root"
+DEFAULT_SSH_PORT = 22
+
+
+class sshTarget:
+    """The admin node that Ceph commands are run on."""
+    def __init__(self, host: str, user: str = DEFAULT_SSH_USER, port: int = DEFAULT_SSH_PORT, key_path: str = None) -> None:
+        self.host = host
+        self.user = user
+        self.port = int(port)
+        self.key_path = key_path
+
+    @classmethod
+    def from_env(cls):
+        """
+        Reads CEPH_AGENT_SSH_HOST, CEPH_AGENT_SSH_USER, CEPH_AGENT_SSH_PORT
+        and CEPH_AGENT_SSH_KEY. An unset or empty host (or 'local') means
+        commands run on this machine, in which case None is returned. Without
+        a key, ssh falls back to the user's own keys and agent.
+        """
+        host = os.environ.get("CEPH_AGENT_SSH_HOST", "").strip()
+        if host in ("", "local", "localhost"):
+            return None
+        return cls(
+            host=host,
+            user=os.environ.get("CEPH_AGENT_SSH_USER", DEFAULT_SSH_USER),
+            port=os.environ.get("CEPH_AGENT_SSH_PORT", DEFAULT_SSH_PORT),
+            key_path=os.environ.get("CEPH_AGENT_SSH_KEY") or None
+        )
+
+    @property
+    def key(self) -> str:
+        return f"{self.user}@{self.host}:{self.port}"
+
+    def ssh_args(self) -> list:
+        args = ["-p", str(self.port)]
+        if self.key_path:
+            args += ["-i", self.key_path]
+        return args + [f"{self.user}@{self.host}"]
+
+
+class sshConnectionPool:
+    """
+    Keeps one persistent, multiplexed SSH connection per target host.
+
+    The master connection is health checked with `ssh -O check` at most
+    every `health_interval` seconds, restarted when it is gone, and closed
+    after `idle_timeout` seconds without commands (OpenSSH's ControlPersist
+    enforces the same limit should this process die first).
+
+    The pool lock only guards the bookkeeping. Checking and starting a
+    master (a blocking ssh handshake) happens under a per-target lock, so a
+    slow or unreachable host never holds up commands to the other hosts.
+    """
+    def __init__(
+        self,
+        control_dir: str = None,
+        idle_timeout: int = 300,
+        health_interval: int = 30,
+        connect_timeout: int = 10
+    ) -> None:
+        self.control_dir = control_dir or os.path.join(tempfile.gettempdir(), f"ceph-agent-ssh-{os.getuid()}")
+        os.makedirs(self.control_dir, mode=0o700, exist_ok=True)
+        self.idle_timeout = idle_timeout
+        self.health_interval = health_interval
+        self.connect_timeout = connect_timeout
+
+        self._lock = threading.Lock()
+        self._targets = {}      # key -> sshTarget
+        self._last_used = {}    # key -> monotonic time
+        self._last_checked = {}  # key -> monotonic time
+        self._target_locks = {}  # key -> threading.Lock, held while a master starts
+
+    @property
+    def _control_path(self) -> str:
+        # %C is a hash of host, port and user, which keeps the socket path
+        # short enough for the unix socket limit.
+        return os.path.join(self.control_dir, "%C")
+
+    def _control_opts(self) -> list:
+        return ["-o", f"ControlPath={self._control_path}"]
+
+    def _is_alive(self, target: sshTarget) -> bool:
+        result = subprocess.run(
+            ["ssh", *self._control_opts(), "-O", "check", *target.ssh_args()],
+            capture_output=True,
+            text=True
+        )
+        return result.returncode == 0
+
+    def _start_master(self, target: sshTarget) -> bool:
+        print(f"INFO: Opening persistent SSH connection to {target.key}")
+        try:
+            result = subprocess.run(
+                [
+                    "ssh", "-M", "-N", "-f",
+                    *self._control_opts(),
+                    "-o", "ControlMaster=yes",
+                    "-o", f"ControlPersist={self.idle_timeout}",
+                    "-o", f"ConnectTimeout={self.connect_timeout}",
+                    "-o", "ServerAliveInterval=30",
+                    *target.ssh_args()
+                ],
+                capture_output=True,
+                text=True,
+                timeout=self.connect_timeout + 5
+            )
+        except subprocess.TimeoutExpired:
+            print(f"WARNING: Timed out opening SSH connection to {target.key}")
+            return False
+        if result.returncode != 0:
+            print(f"WARNING: Could not open SSH connection to {target.key}: {result.stderr.strip()}")
+            return False
+        return True
+
+    def _ensure_master(self, target: sshTarget) -> bool:
+        now = time.monotonic()
+        last_checked = self._last_checked.get(target.key)
+        if last_checked is not None and now - last_checked < self.health_interval:
+            return True
+        alive = self._is_alive(target) or self._start_master(target)
+        if alive:
+            self._last_checked[target.key] = now
+        else:
+            self._last_checked.pop(target.key, None)
+        return alive
+
+    def _close(self, target: sshTarget) -> None:
+        with self._target_lock(target):
+            subprocess.run(
+                ["ssh", *self._control_opts(), "-O", "exit", *target.ssh_args()],
+                capture_output=True
+            )
+            self._last_checked.pop(target.key, None)
+
+    def _target_lock(self, target: sshTarget) -> threading.Lock:
+        with self._lock:
+            return self._target_locks.setdefault(target.key, threading.Lock())
+
+    def _pop_idle(self) -> list:
+        # Caller holds self._lock
+        now = time.monotonic()
+        idle = []
+        for key, last_used in list(self._last_used.items()):
+            if now - last_used > self.idle_timeout:
+                del self._last_used[key]
+                idle.append(self._targets.pop(key))
+        return idle
+
+    def evict_idle(self) -> None:
+        with self._lock:
+            idle = self._pop_idle()
+        for target in idle:
+            print(f"INFO: Closing idle SSH connection to {target.key}")
+            self._close(target)
+
+    def command_args(self, target: sshTarget, remote_cmd: str) -> list:
+        """
+        Returns the argv that runs `remote_cmd` on `target` over the pooled
+        connection. If the master cannot be opened, the argv still works
+        and simply makes its own connection.
+        """
+        with trace_span("ssh.pool", target=target.key) as span:
+            self.evict_idle()
+            with self._lock:
+                self._targets[target.key] = target
+                self._last_used[target.key] = time.monotonic()
+                target_lock = self._target_locks.setdefault(target.key, threading.Lock())
+            # UPDATED: the handshake runs outside the pool lock
+            with target_lock:
+                multiplexed = self._ensure_master(target)
+            span.set(multiplexed=multiplexed)
+
+        opts = self._control_opts() + ["-o", "ControlMaster=no"] if multiplexed else []
+        return ["ssh", *opts, *target.ssh_args(), "--", remote_cmd]
+
+    def wrap(self, target: sshTarget, remote_cmd: str) -> str:
+        """Shell-string form of `command_args`, for subprocess calls with shell=True."""
+        args = self.command_args(target, remote_cmd)
+        # The remote command is passed through verbatim, as ssh joins it for the remote shell
+        return " ".join(shlex.quote(a) for a in args[:-1]) + " " + remote_cmd
+
+    def close_all(self) -> None:
+        with self._lock:
+            targets = list(self._targets.values())
+            self._targets.clear()
+            self._last_used.clear()
+        for target in targets:
+            self._close(target)
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_ssh_pool() -> sshConnectionPool:
+    """Returns the process-wide SSH pool; masters are closed on interpreter exit."""
+    global _shared_pool
+    if _shared_pool is None:
+        with _shared_pool_lock:
+            if _shared_pool is None:
+                _shared_pool = sshConnectionPool(
+                    idle_timeout=int(os.environ.get("CEPH_AGENT_SSH_IDLE_TIMEOUT", 300))
+                )
+                atexit.register(_shared_pool.close_all)
+    return _shared_pool
+
+
+def remote_command(cmd: str) -> str:
+    """Wraps a command for the configured target, or returns it as-is when running locally."""
+    target = sshTarget.from_env()
+    if target is None:
+        return cmd
+    return get_ssh_pool().wrap(target, cmd)
@@ -0,0 +1,236 @@
+# --------------------
+# Command Result Cache
+# --------------------
+#
+# Read-only commands such as `ceph status` or `ceph osd tree` tend to be run
+# again for the next query or plan step seconds later. Their results are
+# kept for a short, per-command TTL and shared by every query in the
+# process. Only allowlisted, side-effect-free commands are cached; running
+# anything else is treated as a possible change to the cluster and clears
+# the cache.
+#
+# The allowlist matches whole subcommands, not prefixes: `ceph health` is
+# read-only, `ceph health mute OSD_DOWN` is not.
+
+import shlex
+import threading
+import time
+from collections import OrderedDict
+
+# Allowlisted subcommands (without the leading "ceph") and their TTL in seconds.
+# A command is only allowlisted when its words are exactly one of these,
+# plus at most ARGUMENT_LIMITS[subcommand] trailing arguments.
+DEFAULT_TTLS = {
+    "status": 10,
+    "health": 10,
+    "health detail": 10,
+    "pg stat": 10,
+    "osd stat": 15,
+    "fs status": 15,
+    "df": 30,
+    "osd df": 30,
+    "mon stat": 30,
+    "mgr stat": 30,
+    "quorum_status": 30,
+    "osd tree": 60,
+    "osd dump": 60,
+    "mon dump": 60,
+    "osd pool autoscale-status": 60,
+    "osd pool ls": 120,
+    "osd pool ls detail": 120,
+    "osd pool get": 120,
+    "fs ls": 120,
+    "osd crush rule ls": 300,
+    "versions": 300,
+    "rados df": 30,
+    "rados lspools": 120,
+    "rbd ls": 60,
+}
+
+# Subcommands whose trailing words are names, not further subcommands
+ARGUMENT_LIMITS = {
+    "osd pool get": 2,  # <pool> <var>
+    "rbd ls": 1,        # [<pool>]
+}
+
+_STATUS_FLAGS = {"-s": "status", "--status": "status"}
+_FORMAT_FLAGS = ("-f", "--format")
+
+
+def normalize_command(cmd: str):
+    """
+    Canonical form of a ceph command line, so that `ceph -s`, `ceph  status`
+    and `status` share a cache entry.
+
+    Returns:
+        tuple: (positional words, output format or None), or None when the
+               command carries flags other than the output format.
+    """
+    try:
+        words = shlex.split(cmd)
+    except ValueError:
+        return None
+    if words and words[0] == "ceph":
+        words = words[1:]
+
+    positional = []
+    output_format = None
+    i = 0
+    while i < len(words):
+        word = words[i]
+        if word in _STATUS_FLAGS:
+            positional.append(_STATUS_FLAGS[word])
+        elif word in _FORMAT_FLAGS and i + 1 < len(words):
+            output_format = words[i + 1]
+            i += 1
+        elif word.startswith("--format="):
+            output_format = word.split("=", 1)[1]
+        elif word.startswith("-"):
+            return None
+        else:
+            positional.append(word)
+        i += 1
+    return positional, output_format
+
+
+class commandResultCache:
+    """
+    TTL cache of (stdout, stderr, returncode) keyed by normalized command.
+
+    Args:
+        ttls (dict): Allowlisted subcommand -> TTL in seconds.
+        argument_limits (dict): Allowlisted subcommand -> how many trailing arguments it may take.
+        max_entries (int): Least recently used entries are dropped beyond this.
+        clock (callable): Monotonic time source; tests pass a fake one.
+    """
+    def __init__(self, ttls: dict = None, argument_limits: dict = None, max_entries: int = 256,
+                 clock=time.monotonic) -> None:
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.argument_limits = dict(ARGUMENT_LIMITS if argument_limits is None else argument_limits)
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (stored_at, ttl, result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def key_for(self, cmd: str):
+        """
+        Returns:
+            tuple: (cache key, TTL) for allowlisted commands, else (None, None).
+        """
+        normalized = normalize_command(cmd)
+        if normalized is None:
+            return None, None
+        positional, output_format = normalized
+        # The whole command must be an allowlisted subcommand; only the few
+        # that take names (`osd pool get <pool> <var>`) may have more words
+        for n in range(len(positional), 0, -1):
+            subcommand = " ".join(positional[:n])
+            if subcommand in self.ttls:
+                if len(positional) - n > self.argument_limits.get(subcommand, 0):
+                    return None, None
+                key = " ".join(positional)
+                if output_format:
+                    key += f" --format={output_format}"
+                return key, self.ttls[subcommand]
+        return None, None
+
+    def is_cacheable(self, cmd: str) -> bool:
+        return self.key_for(cmd)[0] is not None
+
+    def get(self, cmd: str):
+        """
+        Returns:
+            tuple: (stdout, stderr, returncode, age in seconds), or None on a miss.
+        """
+        key, _ = self.key_for(cmd)
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, ttl, result = entry
+                age = self.clock() - stored_at
+                if age <= ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return (*result, age)
+                del self._entries[key]
+            self.misses += 1
+        return None
+
+    def put(self, cmd: str, stdout: str, stderr: str, returncode: int) -> None:
+        """Stores a successful result of an allowlisted command; anything else is ignored."""
+        key, ttl = self.key_for(cmd)
+        if key is None or returncode != 0:
+            return
+        with self._lock:
+            self._entries[key] = (self.clock(), ttl, (stdout, stderr, returncode))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def note_executed(self, cmd: str) -> None:
+        """Call for every command that runs; commands outside the allowlist may change the cluster."""
+        if not self.is_cacheable(cmd):
+            self.invalidate(reason=cmd)
+
+    def invalidate(self, reason: str = None) -> None:
+        with self._lock:
+            if not self._entries:
+                return
+            self._entries.clear()
+            self.invalidations += 1
+        if reason:
+            print(f"♻️ Result cache cleared after '{reason}'")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+
+class cachingStream:
+    """
+    Passes a command stream through unchanged and stores the complete
+    output in the result cache once it has been fully read.
+    """
+    cache_age = None
+
+    def __init__(self, stream, cache: commandResultCache, cmd: str) -> None:
+        self._stream = stream
+        self._cache = cache
+        self._cmd = cmd
+
+    def __iter__(self):
+        lines = []
+        for line in self._stream:
+            lines.append(line)
+            yield line
+        if not self._stream.truncated:
+            self._cache.put(self._cmd, "".join(lines), self._stream.stderr, self._stream.returncode)
+
+    def read_all(self) -> str:
+        return "".join(self)
+
+    @property
+    def returncode(self):
+        return self._stream.returncode
+
+    @property
+    def stderr(self) -> str:
+        return self._stream.stderr
+
+    @property
+    def truncated(self) -> bool:
+        return self._stream.truncated
+
+    @property
+    def bytes_read(self) -> int:
+        return self._stream.bytes_read
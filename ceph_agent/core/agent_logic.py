@@ -6,7 +6,9 @@
 # Here define the function to analyse the output of the command against 
 # the user query.
 
-from llm.llm_response import llmResponse
+from llm.llm_response import llmResponse, generationStats
+from llm.prompts import analysis_messages, estimate_prompt_tokens
+from utils.tracing import trace_span
 
 
 class analysePrompt(llmResponse):
@@ -18,7 +20,8 @@ class analysePrompt(llmResponse):
         command_description: str,
         model_choice: str,
         model_name: str = "granite3.3:8b",
-        temperature: float = float(0.2)
+        temperature: float = float(0.2),
+        output_age: float = None
     ) -> None:
         if model_name and temperature:
             super().__init__(model_name, temperature)
@@ -27,43 +30,44 @@ class analysePrompt(llmResponse):
         self.command_out = command_out
         self.command_description = command_description
         self.model_choice = model_choice
+        # NEW: Age in seconds of a cached command output, None if it was just run
+        self.output_age = output_age
+        # NEW: Set after a streamed analysis
+        self.generation_stats = None
 
-    def _generate_prompt(self) -> str:
-        system_prompt = """
-        You are an expert Ceph administrator assistant. Your ONLY task is to 
-        extract and summarize information from the provided 'COMMAND OUTPUT' 
-        to answer the 'USER QUERY'. DO NOT use any external knowledge. 
-        DO NOT invent information. If the information is not directly available 
-        or cannot be clearly inferred from the 'COMMAND OUTPUT', state that the
-        information is not found in the provided output or that you cannot answer. 
-        Be concise, clear, and directly answer the question based *only* on the 
-        provided text.
-        """
-        # Craft the user-specific prompt
-        user_prompt_parts = [
-            f"User Query: {self.query}",
-            f"Command Executed: {self.selected_command}"
-        ]
-
-        if self.command_description:
-            user_prompt_parts.append(
-                f"The executed command's relevance is: {self.command_description}"
-            )
-
-        user_prompt_parts.append(
-            f"COMMAND OUTPUT:\n```\n{self.command_out}\n```\n\n"
-            "Please extract the relevant information from the COMMAND OUTPUT to answer "
-            "the USER QUERY. Provide a concise, human-readable answer."
+    def _generate_prompt(self) -> list:
+        # UPDATED: Static instructions go first as a system message and the
+        # query and command output last, so the backend reuses the prefix
+        return analysis_messages(
+            self.query,
+            self.selected_command,
+            self.command_out,
+            self.command_description,
+            self.output_age
         )
 
-        prompt = "\n\n".join(user_prompt_parts)
-        prompt = f"{system_prompt}\n\n{prompt}"
-        return prompt
-
-    def _analyze_response(self):
+    def _analyze_response(self, on_token=None):
+        """
+        Args:
+            on_token (callable, optional): If given, the response is streamed
+                and every piece is passed to it as soon as it arrives.
+        """
         print("Agent Action: Analyzing command output and generating response...")
         prompt = self._generate_prompt()
         try:
+            # NEW: Stream the answer so the operator sees it being written
+            if on_token is not None:
+                stats = generationStats()
+                pieces = []
+                with trace_span("llm.stream", model=self.model, prompt_tokens_est=estimate_prompt_tokens(prompt)) as span:
+                    for token in self._stream_llm_query(prompt, self.model_choice, stats=stats):
+                        pieces.append(token)
+                        on_token(token)
+                    span.set(**stats.as_dict())
+                self.generation_stats = stats
+                print(f"\n{stats.summary()}")
+                return "".join(pieces).strip()
+
             # Call your Ollama-backed LLM function
             # A slightly higher temperature might allow for more natural phrasing,
             # but keep it low for factual extraction
@@ -0,0 +1,415 @@
+# --------------------
+# Agent Controller
+# --------------------
+#
+# The workflow that used to live inside the `agent.py` REPL loop: classify
+# the query, then run it in direct or planning mode. The controller owns the
+# warm, shared pieces (vector store, encoder, LLM client, agents, caches)
+# and is safe to call from several threads, so the REPL and the server
+# (`agent_server.py`) drive the same code.
+
+import functools
+import json
+import os
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from rag.semantic_search import semanticCephSearch
+from rag.response_cache import semanticResponseCache
+from utils.file_ops import vectorBuilder
+from agent.agentsList import RetrieverAgent, ExecutorAgent, AnalyzerAgent
+from ceph.result_cache import commandResultCache
+from core.plan_scheduler import planScheduler, normalize_plan
+from core.output_reducer import outputReducer
+from core.mode_classifier import modeClassifier, detect_destructive, detect_mutating
+from core.speculation import speculativeRun, SPECULATION_MODES
+from utils.utilities import extract_json
+from llm.prompts import planner_messages, synthesis_messages, estimate_prompt_tokens
+from llm.llm_response import get_llm_client, generationStats
+from utils.tracing import trace_span
+
+
+class agentSession:
+    """
+    Per-user conversation state. Planning steps see the answers of the last
+    few queries in the same session, and `model_choice` is remembered.
+    """
+    def __init__(self, session_id: str = None, model_choice: str = "o", history_size: int = 5) -> None:
+        self.session_id = session_id or uuid.uuid4().hex[:12]
+        self.model_choice = model_choice
+        self.history = deque(maxlen=history_size)
+        self.last_execution_context = {}
+        self.lock = threading.Lock()  # One query at a time per session
+
+    def remember(self, result: dict) -> None:
+        self.history.append({"query": result["query"], "mode": result["mode"], "answer": result["answer"]})
+        if result.get("steps"):
+            self.last_execution_context = result["steps"]
+
+    def context_summary(self) -> list:
+        return list(self.history)
+
+
+class agentController:
+    """
+    The Controller.
+    Orchestrates the workflow by managing agents and state.
+    """
+    def __init__(
+        self,
+        json_path: str = "./database/basic_commands.json",
+        index_path: str = "./faiss_index_store/ceph_faiss.index",
+        metadata_path: str = "./faiss_index_store/ceph_faiss_metadata.json",
+        cache_dir: str = "./faiss_index_store/embedding_cache",
+        llm_model: str = "granite3.3:8b",
+        speculation: str = None
+    ) -> None:
+        os.environ["TOKENIZERS_PARALLELISM"] = "false"
+        self.llm_model = llm_model
+        # Work started before the mode is known: 'off', 'retrieve' or 'execute'.
+        # 'execute' runs a command before the safety verdict, so it is opt-in.
+        self.speculation = speculation or os.environ.get("CEPH_AGENT_SPECULATION", "retrieve")
+        if self.speculation not in SPECULATION_MODES:
+            raise ValueError(f"speculation must be one of {SPECULATION_MODES}, got '{self.speculation}'")
+
+        # --- Vector Store and Agents ---
+        # The encoder and index load lazily (see warm_up); the first search
+        # waits for them if they are still loading.
+        self.vector_store = vectorBuilder(
+            json_path=json_path,
+            model_name="all-MiniLM-L6-v2",
+            index_path=index_path,
+            metadata_path=metadata_path,
+            cache_dir=cache_dir,
+            lazy=True
+        )
+        self.cephSearch = semanticCephSearch(
+            vector_store=self.vector_store,
+            llm_model=llm_model,
+            top_k=3,
+            threshold=0.35,
+            selection_mode="single",
+            fast_path_min_score=0.75,
+            fast_path_min_margin=0.15,
+            # Exact tokens (pg, rbd, osd.12) are also matched with BM25
+            hybrid=os.environ.get("CEPH_AGENT_HYBRID_SEARCH", "1").lower() in ("1", "true", "yes")
+        )
+
+        # Instantiate our specialized agents
+        self.retriever = RetrieverAgent(self.cephSearch)
+        # Read-only command results are shared across queries, plan steps and sessions
+        self.executor = ExecutorAgent(result_cache=commandResultCache())
+        # Repeated direct-mode questions are answered without the full pipeline
+        self.response_cache = semanticResponseCache(
+            encoder=self.vector_store.encode,
+            threshold=float(os.environ.get("CEPH_AGENT_RESPONSE_CACHE_THRESHOLD", 0.9)),
+            result_cache=self.executor.result_cache
+        )
+        # Command output is reduced to the query-relevant fields before analysis
+        self.analyzer = AnalyzerAgent(
+            reducer=outputReducer(encoder=functools.partial(self.vector_store.encode, use_cache=False))
+        )
+        self.plan_scheduler = planScheduler(max_workers=int(os.environ.get("CEPH_AGENT_PLAN_CONCURRENCY", 3)))
+        # Shared, pooled LLM client also used by the agents above
+        self.llm_client = get_llm_client()
+        # Direct vs. planning and safety are decided locally when the examples agree
+        self.mode_classifier = modeClassifier(
+            encoder=self.vector_store.encode,
+            llm_fallback=self._classify_with_llm,
+            min_confidence=float(os.environ.get("CEPH_AGENT_CLASSIFIER_MIN_CONFIDENCE", 0.8))
+        )
+        self._speculation_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="speculate")
+        self.speculation_stats = {"started": 0, "used": 0, "discarded": 0}
+        # Queries from different sessions run on the server's threads at once
+        self._stats_lock = threading.Lock()
+
+    def warm_up(self, background: bool = False):
+        """Loads the encoder and index now instead of on the first query."""
+        return self.vector_store.warm_up(background=background)
+
+    def stats(self) -> dict:
+        return {
+            "embedding_cache": self.vector_store.embedding_cache.stats(),
+            "load_times": self.vector_store.load_times,
+            "fast_path": self.cephSearch.fast_path_stats,
+            "result_cache": self.executor.result_cache.stats(),
+            "response_cache": self.response_cache.stats(),
+            "mode_classifier": self.mode_classifier.stats(),
+            "prompt_eval": self.llm_client.prompt_stats.as_dict(),
+            "speculation": self._speculation_summary(),
+            "output_reduction": self.analyzer.reducer.stats(),
+            "streamed_analysis": self.analyzer.generation_summary(),
+        }
+
+    def _speculation_summary(self) -> dict:
+        with self._stats_lock:
+            return dict(self.speculation_stats)
+
+    def _count_speculation(self, outcome: str) -> None:
+        with self._stats_lock:
+            self.speculation_stats[outcome] += 1
+
+    def run_command(self, command: str):
+        """Runs a command (as JSON where possible) and collects its cleaned output."""
+        prepared = self.analyzer.prepare_command(command)
+        stream = self.executor.run_stream(prepared)
+        stdout = self.analyzer.collect_output(stream)
+        # Truncated JSON cannot be parsed or reduced; plain output can still be cut by lines
+        if (stream.returncode != 0 or stream.truncated) and prepared != command:
+            print("INFO: Retrying without --format json")
+            stream = self.executor.run_stream(command)
+            stdout = self.analyzer.collect_output(stream)
+        return stream, stdout
+
+    def classify(self, user_query: str) -> dict:
+        with trace_span("classify") as classify_span:
+            modeResponse = self.mode_classifier.classify(user_query)
+            classify_span.set(
+                mode=modeResponse.get("mode"),
+                safety=modeResponse.get("safety"),
+                source=modeResponse.get("source")
+            )
+        return modeResponse
+
+    def _classify_with_llm(self, user_query: str) -> dict:
+        # The planner instructions come first so their KV cache is reused across queries
+        with trace_span("classify.llm"):
+            return extract_json(
+                self.llm_client.chat("ollama", self.llm_model, planner_messages(user_query)).strip()
+            )
+
+    def handle_query(self, user_query: str, model_choice: str = None, session: agentSession = None, on_token=None) -> dict:
+        """
+        Answers one query end to end.
+
+        Args:
+            user_query (str): The operator's question or task.
+            model_choice (str): 'o' (Ollama) or 'l' (LM Studio); defaults to the session's.
+            session (agentSession): Conversation state; a throwaway one if None.
+            on_token (callable): Receives the answer's tokens as they are generated.
+
+        Returns:
+            dict: {"query", "mode", "answer", "success", plus "command" (direct),
+                   "steps" (planning), "cached" (answered from the response
+                   cache), "warning" or "error" when relevant}.
+        """
+        session = session or agentSession()
+        model_choice = model_choice or session.model_choice
+        session.model_choice = model_choice
+
+        with session.lock, trace_span("query", query=user_query, model_choice=model_choice, session=session.session_id):
+            print("\n--- Processing Query ---")
+            result = {"query": user_query, "mode": None, "answer": "", "success": False}
+
+            # --- Answered Recently? (Semantic Response Cache) ---
+            if self._run_cached(user_query, model_choice, result, on_token):
+                session.remember(result)
+                return result
+
+            # --- Retrieve (and run) speculatively while classifying ---
+            speculation = self._speculate(user_query)
+
+            # --- Classify the Task (Controller Logic) ---
+            try:
+                modeResponse = self.classify(user_query)
+            except (ValueError, json.JSONDecodeError) as e:
+                print(f"🔴 Controller: Could not parse LLM response for classification. Error: {e}")
+                result["error"] = f"Could not classify the query: {e}"
+                self._discard_speculation(speculation)
+                return result
+
+            result["mode"] = modeResponse.get("mode")
+            if modeResponse.get("safety") == "unsafe":
+                print(f"⚠️ Controller: Unsafe operation detected. {modeResponse.get('warning', '')}")
+                result["warning"] = modeResponse.get("warning", "") or "Unsafe operation detected."
+                self._discard_speculation(speculation)
+                return result
+
+            # --- Orchestrate Agent Workflow ---
+            if result["mode"] == "direct":
+                self._run_direct(user_query, model_choice, result, on_token, speculation)
+            elif result["mode"] == "planning":
+                self._discard_speculation(speculation)
+                self._run_plan(user_query, model_choice, modeResponse, session, result, on_token)
+            else:
+                self._discard_speculation(speculation)
+                result["error"] = f"Unknown mode '{result['mode']}'"
+
+            session.remember(result)
+            return result
+
+    def _speculate(self, user_query: str):
+        """Starts retrieval (and a read-only run of the top candidate) before the mode is known."""
+        if self.speculation == "off" or detect_destructive(user_query) or detect_mutating(user_query):
+            return None
+        self._count_speculation("started")
+        execute = None
+        if self.speculation == "execute":
+            execute = self.executor.run_with_age
+        return speculativeRun(
+            user_query,
+            self._speculation_pool,
+            search=self.cephSearch.search,
+            execute=execute,
+            prepare_command=self.analyzer.prepare_command,
+            is_cacheable=self._speculatable
+        )
+
+    def _speculatable(self, command: str) -> bool:
+        """A command may run before classification only if it is allowlisted read-only and names no mutating verb."""
+        return (
+            self.executor.result_cache.is_cacheable(command)
+            and detect_destructive(command) is None
+            and detect_mutating(command) is None
+        )
+
+    def _discard_speculation(self, speculation) -> None:
+        if speculation is not None:
+            speculation.discard()
+            self._count_speculation("discarded")
+
+    def _run_direct(self, user_query: str, model_choice: str, result: dict, on_token, speculation=None) -> None:
+        print(f"🕹️ Controller: Direct Mode. Executing single task for '{user_query}'")
+        candidates = speculation.candidates() if speculation is not None else None
+        if candidates is not None:
+            self._count_speculation("used")
+        command, vect_results = self.retriever.find_command(user_query, model_choice, candidates=candidates)
+        if not command:
+            result["error"] = "Could not find a suitable command."
+            return
+
+        self._execute_and_analyze(user_query, command, vect_results, model_choice, result, on_token, speculation)
+
+    def _execute_and_analyze(self, user_query: str, command: str, vect_results: list, model_choice: str, result: dict, on_token, speculation=None) -> None:
+        result["command"] = command
+        if speculation is not None:
+            # A speculative run of this same command fills the result cache
+            speculation.wait_for(self.analyzer.prepare_command(command))
+        # Output is cleaned up while the command is still running
+        stream, stdout = self.run_command(command)
+        if stream.returncode != 0:
+            result["answer"] = f"I executed '{command}', but it failed. Error: {stream.stderr}"
+            return
+
+        # The answer is handed out token by token as it is generated
+        result["answer"] = self.analyzer.analyze(
+            user_query, command, stdout, vect_results, model_choice,
+            output_age=stream.cache_age, on_token=on_token
+        )
+        result["success"] = True
+        self.response_cache.put(
+            user_query, command, vect_results, result["answer"],
+            epoch=self.executor.result_cache.invalidations, output_age=stream.cache_age
+        )
+
+    def _run_cached(self, user_query: str, model_choice: str, result: dict, on_token) -> bool:
+        """
+        Answers a repeat of a recent direct-mode query. A fresh match is
+        returned as is; an older one skips classification and retrieval, but
+        its command is run again and the output re-analyzed.
+
+        Returns:
+            bool: True if the query was handled here.
+        """
+        # A state-changing request must be classified (and warned about), never
+        # answered with the output of a similar read-only query
+        if detect_destructive(user_query) or detect_mutating(user_query):
+            return False
+        with trace_span("response_cache") as cache_span:
+            entry, similarity, fresh = self.response_cache.lookup(
+                user_query, epoch=self.executor.result_cache.invalidations
+            )
+            cache_span.set(similarity=round(similarity, 3), hit=entry is not None, fresh=fresh)
+        if entry is None:
+            return False
+
+        result["mode"] = "direct"
+        result["cached"] = {"query": entry.query, "similarity": round(similarity, 3), "fresh": fresh}
+        if fresh:
+            print(f"♻️ Controller: Answering from cache (matched '{entry.query}', similarity {similarity:.2f})")
+            result["command"] = entry.command
+            result["answer"] = entry.answer
+            result["success"] = True
+            if on_token is not None:
+                on_token(entry.answer)
+            return True
+
+        print(f"♻️ Controller: Re-analyzing '{entry.command}' for a repeat of '{entry.query}'")
+        self._execute_and_analyze(user_query, entry.command, entry.vect_results, model_choice, result, on_token)
+        return True
+
+    def _run_plan(self, user_query: str, model_choice: str, modeResponse: dict, session: agentSession, result: dict, on_token) -> None:
+        print(f"🗺️ Controller: Planning Mode. Executing plan for '{user_query}'")
+        # Steps declare their dependencies and independent ones run concurrently
+        steps = normalize_plan(modeResponse.get("steps", []))
+        for step in steps:
+            after = f" (after {', '.join(str(d) for d in step['depends_on'])})" if step["depends_on"] else ""
+            print(f"  {step['id']}. {step['goal']}{after}")
+
+        session_context = session.context_summary()
+
+        def run_step(step, dependency_results):
+            print(f"\n--------- Executing Step {step['id']}: {step['goal']} --------")
+
+            # Only the results this step depends on are passed along
+            contextual_query = f"""
+            Original User Goal: "{user_query}"
+            Earlier in this Session: {json.dumps(session_context, indent=2)}
+            Previous Steps and Summarized Outputs: {json.dumps(dependency_results, indent=2)}
+            Current Goal: "{step['goal']}"
+            """
+
+            command, vect_results = self.retriever.find_command(contextual_query, model_choice)
+            if not command:
+                print(f"🔴 Could not find a command for step '{step['goal']}'. Aborting plan.")
+                return False, {"goal": step["goal"], "error": "No suitable command found"}
+
+            stream, stdout = self.run_command(command)
+            if stream.returncode != 0:
+                print(f"🔴 Step {step['id']} failed. Aborting plan.")
+                return False, {"goal": step["goal"], "command": command, "error": stream.stderr}
+
+            # Analyze the output and store the SUMMARY in the context.
+            step_response = self.analyzer.analyze(
+                step["goal"], command, stdout, vect_results, model_choice, output_age=stream.cache_age
+            )
+            print(f"✅ Step {step['id']} Summary: {step_response}")
+            return True, {
+                "goal": step["goal"],
+                "command": command,
+                "summary": step_response  # Store the concise summary
+            }
+
+        results, plan_successful = self.plan_scheduler.run(steps, run_step)
+        # Results are merged in plan order, whatever order the steps finished in
+        execution_context = {f"step_{step['id']}": record for step, record in results}
+        result["steps"] = execution_context
+        print("\n--- Plan Execution Finished ---")
+
+        if not plan_successful:
+            print("Plan failed. Final context log:")
+            print(json.dumps(execution_context, indent=2))
+            result["error"] = "Plan failed."
+            return
+
+        # --- Final synthesis step ---
+        print("➡️ Synthesizing final answer from plan results...")
+        messages = synthesis_messages(user_query, execution_context)
+        # Stream the final answer instead of waiting for all of it
+        synthesis_stats = generationStats()
+        pieces = []
+        with trace_span("synthesize", prompt_tokens_est=estimate_prompt_tokens(messages)) as synthesis_span:
+            for token in self.llm_client.stream_chat(
+                "ollama",
+                self.llm_model,
+                messages,
+                stats=synthesis_stats):
+                pieces.append(token)
+                if on_token is not None:
+                    on_token(token)
+            synthesis_span.set(**synthesis_stats.as_dict())
+        print(f"\n{synthesis_stats.summary()}")
+        result["answer"] = "".join(pieces).strip()
+        result["success"] = True
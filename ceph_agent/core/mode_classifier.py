@@ -0,0 +1,215 @@
+# --------------------
+# Mode Classifier
+# --------------------
+#
+# Every query used to start with an LLM call on the large planner prompt,
+# only to learn "direct or planning" and "safe or unsafe" before retrieval
+# could begin. Most queries are plain look-ups whose answer is obvious from
+# a handful of labeled examples, so this stage decides locally first:
+#
+#   1. destructive keywords (delete, purge, zap, ...) mark the query unsafe;
+#      other verbs that change the cluster (restart, set, out, mute, ...)
+#      send it to the LLM, which judges safety in context;
+#   2. the query embedding is compared with the labeled examples in
+#      `mode_examples.json` (same MiniLM encoder as retrieval) and the
+#      nearest neighbours vote on the mode;
+#   3. the LLM is only called when that vote is not confident, or when the
+#      query needs a plan (the steps still come from the LLM).
+#
+# Decisions are cached by normalized query text.
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.tracing import trace_span
+
+DEFAULT_EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mode_examples.json")
+
+# Actions that destroy data or stop daemons; matched as whole words, so
+# "why was osd.3 removed" stays a safe question
+DESTRUCTIVE_PATTERNS = [
+    r"delete", r"remove", r"rm", r"purge", r"destroy", r"zap", r"wipe", r"erase",
+    r"truncate", r"shut\s*down", r"power\s*off", r"reboot", r"kill",
+    r"mark\s+\S+\s+(?:as\s+)?lost",
+]
+_DESTRUCTIVE_RE = re.compile(r"\b(" + "|".join(DESTRUCTIVE_PATTERNS) + r")\b", re.IGNORECASE)
+
+# Actions that change cluster state without destroying anything. A query
+# using one is never decided locally ("is osd.5 out?" is a question, "mark
+# osd.5 out" is not), and a command containing one is never run speculatively
+MUTATING_PATTERNS = [
+    r"restart", r"stop", r"start", r"mark", r"out", r"set", r"unset", r"reweight",
+    r"disable", r"enable", r"mute", r"unmute", r"create", r"rename", r"resize",
+    r"repair", r"pause", r"unpause", r"drain", r"evict", r"flush", r"rollback",
+    r"upgrade", r"redeploy", r"map", r"unmap",
+]
+_MUTATING_RE = re.compile(r"\b(" + "|".join(MUTATING_PATTERNS) + r")\b", re.IGNORECASE)
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split()).rstrip("?.! ")
+
+
+def detect_destructive(query: str):
+    """Returns the first destructive keyword in the query, or None."""
+    match = _DESTRUCTIVE_RE.search(query)
+    return " ".join(match.group(1).split()).lower() if match else None
+
+
+def detect_mutating(text: str):
+    """Returns the first state-changing (but not destructive) keyword in the text, or None."""
+    match = _MUTATING_RE.search(text)
+    return match.group(1).lower() if match else None
+
+
+class modeClassifier:
+    """
+    Local direct/planning and safe/unsafe classifier with an LLM fallback.
+
+    Args:
+        encoder (callable): encoder(texts, normalize_embeddings=True) -> matrix, e.g. `vectorBuilder.encode`.
+        llm_fallback (callable): llm_fallback(query) -> the planner's JSON decision
+                                 ({"mode", "safety", "steps", ...}).
+        examples_path (str): JSON list of {"query": ..., "mode": "direct" | "planning"}.
+        k (int): Number of nearest examples that vote.
+        min_confidence (float): Share of the (similarity weighted) vote the winning mode needs.
+        min_similarity (float): The nearest example must be at least this close, so
+                                out-of-domain queries go to the LLM.
+        cache_size (int): Decisions kept in the LRU decision cache.
+    """
+    def __init__(
+        self,
+        encoder,
+        llm_fallback,
+        examples_path: str = DEFAULT_EXAMPLES_PATH,
+        k: int = 5,
+        min_confidence: float = 0.8,
+        min_similarity: float = 0.55,
+        cache_size: int = 512
+    ) -> None:
+        self.encoder = encoder
+        self.llm_fallback = llm_fallback
+        self.examples_path = examples_path
+        self.k = k
+        self.min_confidence = min_confidence
+        self.min_similarity = min_similarity
+        self.cache_size = cache_size
+
+        self._labels = None
+        self._vectors = None
+        self._fit_lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.counts = {"cache": 0, "keyword": 0, "local": 0, "llm": 0}
+
+    def _embed(self, texts: list) -> np.ndarray:
+        vectors = np.asarray(self.encoder(texts, normalize_embeddings=True), dtype="float32")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def fit(self) -> None:
+        """Embeds the labeled examples. Called on first use."""
+        with self._fit_lock:
+            if self._vectors is not None:
+                return
+            with open(self.examples_path, "r", encoding="utf-8") as f:
+                examples = json.load(f)
+            self._labels = np.array([example["mode"] for example in examples])
+            self._vectors = self._embed([example["query"] for example in examples])
+            print(f"✅ Mode classifier fitted on {len(examples)} labeled examples")
+
+    def vote(self, query: str):
+        """
+        Nearest-neighbour vote over the labeled examples.
+
+        Returns:
+            tuple: (mode, confidence, similarity of the nearest example)
+        """
+        self.fit()
+        similarities = self._vectors @ self._embed([query])[0]
+        nearest = np.argsort(-similarities)[:self.k]
+        weights = {}
+        for i in nearest:
+            weights[self._labels[i]] = weights.get(self._labels[i], 0.0) + max(float(similarities[i]), 0.0)
+        total = sum(weights.values())
+        if total == 0:
+            return None, 0.0, float(similarities[nearest[0]])
+        mode = max(weights, key=weights.get)
+        return str(mode), weights[mode] / total, float(similarities[nearest[0]])
+
+    def _cache_get(self, key: str):
+        with self._cache_lock:
+            decision = self._cache.get(key)
+            if decision is not None:
+                self._cache.move_to_end(key)
+            return decision
+
+    def _cache_put(self, key: str, decision: dict) -> None:
+        with self._cache_lock:
+            self._cache[key] = decision
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def classify(self, query: str) -> dict:
+        """
+        Classifies a query.
+
+        Returns:
+            dict: The planner's schema ({"mode", "safety", "reasoning", "steps",
+                  "warning"}) plus "source": "cache", "keyword", "local" or "llm".
+        """
+        key = normalize_query(query)
+        cached = self._cache_get(key)
+        if cached is not None:
+            self.counts["cache"] += 1
+            return dict(cached, source="cache")
+
+        with trace_span("classify.local") as local_span:
+            keyword = detect_destructive(query)
+            mutating = None if keyword else detect_mutating(query)
+            if keyword or mutating:
+                mode, confidence, nearest = None, 1.0, None
+            else:
+                mode, confidence, nearest = self.vote(query)
+            local_span.set(mode=mode, confidence=round(confidence, 3), keyword=keyword or mutating)
+
+        if keyword:
+            source = "keyword"
+            decision = {
+                "mode": "direct",
+                "safety": "unsafe",
+                "reasoning": f"The query asks to '{keyword}', which is a destructive action.",
+                "steps": [],
+                "warning": f"The request involves a destructive action ('{keyword}'). Run it manually if intended.",
+            }
+        elif mode == "direct" and confidence >= self.min_confidence and nearest >= self.min_similarity:
+            source = "local"
+            decision = {
+                "mode": "direct",
+                "safety": "safe",
+                "reasoning": f"Closest to labeled direct queries (confidence {confidence:.2f}).",
+                "steps": [],
+                "warning": "",
+            }
+        else:
+            # A state-changing verb, low confidence, or a plan is needed and
+            # only the LLM writes steps
+            source = "llm"
+            decision = self.llm_fallback(query)
+
+        self.counts[source] += 1
+        print(f"INFO: Mode '{decision.get('mode')}' ({decision.get('safety')}) decided by {source}")
+        self._cache_put(key, decision)
+        return dict(decision, source=source)
+
+    def stats(self) -> dict:
+        with self._cache_lock:
+            entries = len(self._cache)
+        return dict(self.counts, cache_entries=entries)
@@ -0,0 +1,297 @@
+# --------------------
+# Command Output Reduction
+# --------------------
+#
+# Prompt evaluation time grows with prompt length and is the largest part of
+# an analyzer call, yet most of a `ceph ... --format json` reply is never
+# needed to answer the question. Before the output reaches the analyzer it
+# is cut down to the fields that matter:
+#
+#   1. Commands are run with `--format json` where the CLI supports it.
+#   2. Known commands go through a per-command extractor that keeps only
+#      the fields an operator asks about.
+#   3. Anything still over the token budget (or not JSON at all) is split
+#      into chunks, and only the chunks closest to the query are kept.
+#      Overlong lines (e.g. JSON cut off by the output cap) are split first,
+#      so no single chunk can blow the budget.
+
+import json
+import re
+import shlex
+
+import numpy as np
+
+# Commands whose output is a stream or has no JSON form
+_NO_JSON_FLAGS = ("-w", "--watch", "--watch-debug", "--watch-info")
+_FORMAT_FLAGS = ("-f", "--format")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English and JSON)."""
+    return (len(text) + 3) // 4
+
+
+def _command_words(command: str) -> list:
+    try:
+        words = shlex.split(command)
+    except ValueError:
+        return []
+    if words and words[0] == "ceph":
+        words = ["status" if w in ("-s", "--status") else w for w in words[1:]]
+        return [w for w in words if not w.startswith("-")]
+    return []
+
+
+# --------------------
+# Per-command extractors
+# --------------------
+
+def _health_checks(health: dict) -> dict:
+    checks = {}
+    for name, check in (health.get("checks") or {}).items():
+        entry = {
+            "severity": check.get("severity"),
+            "summary": (check.get("summary") or {}).get("message"),
+        }
+        details = [d.get("message") for d in check.get("detail", []) if d.get("message")]
+        if details:
+            entry["detail"] = details
+        checks[name] = entry
+    return checks
+
+
+def _extract_status(data: dict) -> dict:
+    health = data.get("health", {})
+    osdmap = data.get("osdmap", {})
+    # Older releases nest the counters one level deeper
+    osdmap = osdmap.get("osdmap", osdmap)
+    pgmap = data.get("pgmap", {})
+    return {
+        "health": health.get("status"),
+        "checks": _health_checks(health),
+        "mons": {"quorum": data.get("quorum_names"), "num_mons": (data.get("monmap") or {}).get("num_mons")},
+        "osds": {k: osdmap.get(k) for k in ("num_osds", "num_up_osds", "num_in_osds") if k in osdmap},
+        "pgs": {
+            "num_pgs": pgmap.get("num_pgs"),
+            "num_pools": pgmap.get("num_pools"),
+            "by_state": {s.get("state_name"): s.get("count") for s in pgmap.get("pgs_by_state", [])},
+        },
+        "usage": {k: pgmap.get(k) for k in ("bytes_used", "bytes_avail", "bytes_total") if k in pgmap},
+        "mgr_available": (data.get("mgrmap") or {}).get("available"),
+    }
+
+
+def _extract_health(data: dict) -> dict:
+    return {"status": data.get("status"), "checks": _health_checks(data)}
+
+
+def _extract_osd_tree(data: dict) -> dict:
+    nodes = []
+    for node in data.get("nodes", []):
+        row = {"id": node.get("id"), "name": node.get("name"), "type": node.get("type")}
+        if node.get("type") == "osd":
+            row.update({"status": node.get("status"), "reweight": node.get("reweight")})
+        else:
+            row["children"] = node.get("children", [])
+        nodes.append(row)
+    return {"nodes": nodes, "stray": [n.get("name") for n in data.get("stray", [])]}
+
+
+def _extract_df(data: dict) -> dict:
+    pools = []
+    for pool in data.get("pools", []):
+        stats = pool.get("stats", {})
+        pools.append({
+            "name": pool.get("name"),
+            "stored": stats.get("stored", stats.get("bytes_used")),
+            "percent_used": stats.get("percent_used"),
+            "max_avail": stats.get("max_avail"),
+            "objects": stats.get("objects"),
+        })
+    stats = data.get("stats", {})
+    return {
+        "total": {k: stats.get(k) for k in ("total_bytes", "total_used_bytes", "total_avail_bytes") if k in stats},
+        "pools": pools,
+    }
+
+
+def _extract_osd_df(data: dict) -> dict:
+    keys = ("id", "name", "utilization", "var", "pgs", "kb", "kb_avail", "status", "reweight")
+    return {
+        "osds": [{k: node.get(k) for k in keys if k in node} for node in data.get("nodes", [])],
+        "summary": data.get("summary"),
+    }
+
+
+def _extract_pool_ls_detail(data) -> list:
+    keys = ("pool_name", "size", "min_size", "pg_num", "pg_placement_num", "crush_rule", "pg_autoscale_mode")
+    pools = []
+    for pool in data if isinstance(data, list) else []:
+        row = {k: pool.get(k) for k in keys if k in pool}
+        row["applications"] = sorted((pool.get("application_metadata") or {}).keys())
+        pools.append(row)
+    return pools
+
+
+def _extract_osd_dump(data: dict) -> dict:
+    return {
+        "epoch": data.get("epoch"),
+        "flags": data.get("flags"),
+        "pools": _extract_pool_ls_detail(data.get("pools", [])),
+        "osds": [{"osd": o.get("osd"), "up": o.get("up"), "in": o.get("in")} for o in data.get("osds", [])],
+    }
+
+
+# Command prefix (without "ceph") -> extractor
+EXTRACTORS = {
+    "status": _extract_status,
+    "health": _extract_health,
+    "osd tree": _extract_osd_tree,
+    "df": _extract_df,
+    "osd df": _extract_osd_df,
+    "osd pool ls detail": _extract_pool_ls_detail,
+    "osd dump": _extract_osd_dump,
+}
+
+
+def _prune(value):
+    """Drops empty containers and None values, which are noise in a prompt."""
+    if isinstance(value, dict):
+        pruned = {k: _prune(v) for k, v in value.items()}
+        return {k: v for k, v in pruned.items() if v not in (None, {}, [], "")}
+    if isinstance(value, list):
+        return [v for v in (_prune(v) for v in value) if v not in (None, {}, [], "")]
+    return value
+
+
+def _flatten(value, path: str = "", max_line: int = 240) -> list:
+    """
+    JSON -> "path: value" lines for chunk ranking. Small objects (a single
+    OSD or pool record) stay on one line so a chunk never splits a record.
+    """
+    compact = json.dumps(value, separators=(",", ":"))
+    if path and len(compact) <= max_line:
+        return [f"{path}: {compact}"]
+    if isinstance(value, dict):
+        lines = []
+        for k, v in value.items():
+            lines += _flatten(v, f"{path}.{k}" if path else str(k), max_line)
+        return lines
+    if isinstance(value, list):
+        lines = []
+        for i, v in enumerate(value):
+            lines += _flatten(v, f"{path}[{i}]", max_line)
+        return lines
+    return [f"{path}: {compact}"]
+
+
+def _split_long_lines(lines: list, max_line: int = 240) -> list:
+    """Cuts lines longer than max_line characters into max_line pieces."""
+    split = []
+    for line in lines:
+        split += [line[i:i + max_line] for i in range(0, len(line), max_line)] or [line]
+    return split
+
+
+class outputReducer:
+    """
+    Shrinks command output to what the analyzer needs for a query.
+
+    Args:
+        encoder (callable): encoder(texts, normalize_embeddings=True) -> embeddings,
+                            e.g. vectorBuilder.encode. Without one, chunks are
+                            ranked by word overlap with the query.
+        max_tokens (int): Budget for the output passed to the analyzer.
+        chunk_lines (int): Lines per chunk when ranking.
+    """
+    def __init__(self, encoder=None, max_tokens: int = 1500, chunk_lines: int = 8) -> None:
+        self.encoder = encoder
+        self.max_tokens = max_tokens
+        self.chunk_lines = chunk_lines
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def prepare_command(self, command: str) -> str:
+        """Adds `--format json` to ceph commands that do not pick a format already."""
+        try:
+            words = shlex.split(command)
+        except ValueError:
+            return command
+        if not words or words[0] != "ceph":
+            return command
+        if any(w in _NO_JSON_FLAGS or w in _FORMAT_FLAGS or w.startswith("--format=") for w in words):
+            return command
+        return f"{command} --format json"
+
+    def _extract(self, command: str, data):
+        words = _command_words(command)
+        for n in range(len(words), 0, -1):
+            extractor = EXTRACTORS.get(" ".join(words[:n]))
+            if extractor is not None:
+                try:
+                    return extractor(data)
+                except (AttributeError, TypeError) as e:
+                    print(f"WARNING: Extractor for '{' '.join(words[:n])}' failed ({e}); keeping the full JSON.")
+                    break
+        return data
+
+    def _rank(self, query: str, chunks: list) -> list:
+        if self.encoder is not None:
+            embeddings = np.asarray(self.encoder([query] + chunks, normalize_embeddings=True), dtype="float32")
+            return list(embeddings[1:] @ embeddings[0])
+        query_words = set(re.findall(r"\w+", query.lower()))
+        return [len(query_words & set(re.findall(r"\w+", c.lower()))) for c in chunks]
+
+    def _select_chunks(self, query: str, lines: list) -> str:
+        chunks = ["\n".join(lines[i:i + self.chunk_lines]) for i in range(0, len(lines), self.chunk_lines)]
+        scores = self._rank(query, chunks)
+        keep = []
+        used = 0
+        for i in sorted(range(len(chunks)), key=lambda i: scores[i], reverse=True):
+            cost = estimate_tokens(chunks[i])
+            if used + cost > self.max_tokens and keep:
+                continue
+            keep.append(i)
+            used += cost
+        omitted = len(chunks) - len(keep)
+        text = "\n".join(chunks[i] for i in sorted(keep))
+        if omitted:
+            text += f"\n[... {omitted} less relevant sections omitted ...]"
+        return text
+
+    def reduce(self, query: str, command: str, output: str) -> str:
+        """
+        Returns the part of `output` worth showing the analyzer for `query`.
+        """
+        before = estimate_tokens(output)
+        try:
+            data = json.loads(output)
+        except ValueError:
+            data = None
+
+        if data is not None:
+            data = _prune(self._extract(command, data))
+            reduced = json.dumps(data, separators=(",", ":"))
+            if estimate_tokens(reduced) > self.max_tokens:
+                reduced = self._select_chunks(query, _flatten(data))
+        elif before > self.max_tokens:
+            # A chunk of split lines must still fit the budget (~4 characters per token)
+            max_line = min(240, 4 * self.max_tokens // self.chunk_lines)
+            reduced = self._select_chunks(query, _split_long_lines(output.splitlines(), max_line))
+        else:
+            reduced = output
+
+        after = estimate_tokens(reduced)
+        self.tokens_before += before
+        self.tokens_after += after
+        if before:
+            print(f"✂️ Output reduced from ~{before} to ~{after} tokens ({100 * (1 - after / before):.0f}% saved)")
+        return reduced
+
+    def stats(self) -> dict:
+        saved = self.tokens_before - self.tokens_after
+        return {
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "saved_pct": round(100 * saved / self.tokens_before, 1) if self.tokens_before else 0.0,
+        }
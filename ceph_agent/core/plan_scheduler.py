@@ -0,0 +1,122 @@
+# --------------------
+# Plan Scheduler
+# --------------------
+#
+# Runs the steps of a plan as soon as the steps they depend on have
+# finished, so independent diagnostics (OSD status, pool usage, PG states)
+# retrieve, execute and get analyzed side by side instead of one after the
+# other. Wall time becomes roughly that of the longest dependency chain.
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from utils.tracing import trace_span
+
+
+def normalize_plan(steps: list) -> list:
+    """
+    Turns the planner's "steps" into step dicts with explicit dependencies.
+
+    Steps may be plain strings (the original schema) or objects of the form
+    {"id": 1, "goal": "...", "depends_on": [..]}. Strings, and objects
+    without "depends_on", depend on the step before them, which keeps the
+    old sequential behaviour. Unknown or forward references are dropped,
+    so the result is always acyclic.
+
+    Returns:
+        list: [{"id": ..., "goal": ..., "depends_on": [...]}, ...] in plan order.
+    """
+    plan = []
+    seen = []
+    for position, step in enumerate(steps, start=1):
+        if isinstance(step, dict):
+            step_id = step.get("id", position)
+            goal = step.get("goal") or step.get("step") or ""
+            depends_on = step.get("depends_on")
+        else:
+            step_id = position
+            goal = str(step)
+            depends_on = None
+
+        if step_id in seen:
+            step_id = position
+        if depends_on is None:
+            depends_on = [seen[-1]] if seen else []
+        elif not isinstance(depends_on, list):
+            depends_on = [depends_on]
+
+        valid = [dep for dep in depends_on if dep in seen]
+        if len(valid) != len(depends_on):
+            print(f"WARNING: Step {step_id} refers to unknown or later steps {depends_on}; keeping {valid}.")
+        plan.append({"id": step_id, "goal": goal, "depends_on": valid})
+        seen.append(step_id)
+    return plan
+
+
+class planScheduler:
+    """
+    Dependency-aware executor for plan steps.
+
+    Args:
+        max_workers (int): Upper bound on steps running at the same time.
+    """
+    def __init__(self, max_workers: int = 3) -> None:
+        self.max_workers = max(1, max_workers)
+
+    @staticmethod
+    def _run_traced(run_step, step: dict, dependency_results: dict):
+        with trace_span("plan_step", step_id=step["id"], depends_on=step["depends_on"]) as span:
+            ok, record = run_step(step, dependency_results)
+            span.set(ok=ok)
+        return ok, record
+
+    def run(self, plan: list, run_step) -> (list, bool):
+        """
+        Runs every step of a normalized plan.
+
+        Args:
+            plan (list): Output of `normalize_plan`.
+            run_step (callable): run_step(step, dependency_results) -> (ok, record),
+                where dependency_results maps each dependency's id to its record.
+
+        Returns:
+            tuple: ([(step, record), ...] in plan order for the steps that ran,
+                    True if every step succeeded). After the first failure no
+                    new steps are started; steps already running are allowed
+                    to finish.
+        """
+        pending = list(plan)
+        results = {}
+        failed = False
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="plan-step") as pool:
+            while pending or running:
+                if not failed:
+                    for step in list(pending):
+                        if len(running) >= self.max_workers:
+                            break
+                        if all(dep in results for dep in step["depends_on"]):
+                            pending.remove(step)
+                            dependency_results = {dep: results[dep] for dep in step["depends_on"]}
+                            # Each step runs in a copy of this context, so its spans nest under the caller's
+                            running[pool.submit(
+                                contextvars.copy_context().run, self._run_traced, run_step, step, dependency_results
+                            )] = step
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step = running.pop(future)
+                    try:
+                        ok, record = future.result()
+                    except Exception as e:
+                        ok, record = False, {"goal": step["goal"], "error": str(e)}
+                    results[step["id"]] = record
+                    if not ok:
+                        failed = True
+
+        ordered = [(step, results[step["id"]]) for step in plan if step["id"] in results]
+        return ordered, not failed and len(ordered) == len(plan)
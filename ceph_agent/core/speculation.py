@@ -0,0 +1,95 @@
+# --------------------
+# Speculative Retrieval
+# --------------------
+#
+# Classification used to gate everything: only once the classifier said
+# "direct" did retrieval start, and only after selection did the command
+# run. Most traffic is direct mode, so the controller now starts the vector
+# search for the raw query while the classifier is still working. In
+# "execute" mode (opt-in) it also runs the top candidate when that is an
+# allowlisted read-only command, matched on the whole subcommand; the
+# output lands in the command result cache, where the real run picks it up.
+# When the classifier chooses planning mode or flags the query as unsafe,
+# the candidates are simply dropped; a read-only command that already ran
+# changed nothing on the cluster.
+
+import contextvars
+import threading
+
+from utils.tracing import trace_span
+
+SPECULATION_MODES = ("off", "retrieve", "execute")
+
+
+class speculativeRun:
+    """
+    Retrieval, and optionally execution of the top candidate, for one query
+    whose mode is not known yet. Runs on the given thread pool.
+
+    Args:
+        query (str): The user's query, as it will be passed to retrieval.
+        pool (ThreadPoolExecutor): Where the work runs.
+        search (callable): search(query) -> candidates, without any LLM call.
+        execute (callable): execute(command) runs a command and caches its result;
+                            None to only retrieve.
+        prepare_command (callable): Maps a candidate to the exact command line the
+                                    real run will use (e.g. with --format json).
+        is_cacheable (callable): Only commands for which this is True are run;
+                                 without it nothing is run.
+    """
+    def __init__(self, query: str, pool, search, execute=None, prepare_command=None, is_cacheable=None) -> None:
+        self.query = query
+        self.command = None  # The prepared command run speculatively, if any
+        self.error = None
+        self._candidates = None
+        self._searched = threading.Event()
+        self._discarded = False
+        # Spans opened on the pool thread nest under the caller's query span
+        self._future = pool.submit(
+            contextvars.copy_context().run, self._run, search, execute, prepare_command, is_cacheable
+        )
+
+    def _run(self, search, execute, prepare_command, is_cacheable) -> None:
+        with trace_span("speculate") as span:
+            try:
+                self._candidates = search(self.query)
+                # Decided before the candidates are handed out, so `wait_for`
+                # always knows whether this command is being run
+                if execute is not None and self._candidates and not self._discarded:
+                    top = max(self._candidates, key=lambda r: r["score"])["command"]
+                    prepared = prepare_command(top) if prepare_command is not None else top
+                    if is_cacheable is not None and is_cacheable(prepared):
+                        self.command = prepared
+            except Exception as e:
+                self.error = e
+                print(f"WARNING: Speculative retrieval failed: {e!r}")
+                return
+            finally:
+                self._searched.set()
+            span.set(candidates=len(self._candidates), command=self.command)
+
+            if self.command is not None and not self._discarded:
+                print(f"🔮 Speculation: Running '{self.command}' while the query is classified")
+                execute(self.command)
+
+    def candidates(self, timeout: float = None):
+        """Waits for the search; returns its results, or None if it failed."""
+        if self._future.cancelled() or not self._searched.wait(timeout):
+            return None
+        return self._candidates if self.error is None else None
+
+    def wait_for(self, command: str) -> None:
+        """
+        Before running `command` (already prepared), waits for the speculative
+        execution if it is running the same command, so it is not run twice.
+        """
+        if self.command is not None and self.command == command:
+            try:
+                self._future.result()
+            except Exception as e:
+                print(f"WARNING: Speculative execution failed: {e!r}")
+
+    def discard(self) -> None:
+        """Drops the speculation; execution that has not started yet is skipped."""
+        self._discarded = True
+        self._future.cancel()
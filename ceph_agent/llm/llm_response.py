@@ -1,11 +1,427 @@
-import ollama
-import openai
+import asyncio
+import functools
+import os
+import queue
+import threading
+import time
+
+from utils.tracing import trace_span
+from llm.prompts import prompt_kind, estimate_prompt_tokens
+
+
+# --- Streaming Statistics ---
+
+class generationStats:
+    """Time-to-first-token and throughput of one streamed generation."""
+    def __init__(self) -> None:
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self.chunks = 0
+        # Exact token count when the backend reports one (Ollama's eval_count)
+        self.eval_count = None
+
+    def record_token(self) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.chunks += 1
+
+    def finish(self) -> None:
+        self.finished_at = time.perf_counter()
+
+    @property
+    def tokens(self) -> int:
+        # OpenAI-style streams send about one token per chunk
+        return self.eval_count if self.eval_count is not None else self.chunks
+
+    @property
+    def ttft(self) -> float:
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def tokens_per_sec(self) -> float:
+        if self.first_token_at is None or self.finished_at is None:
+            return 0.0
+        generation_time = self.finished_at - self.first_token_at
+        return self.tokens / generation_time if generation_time > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "ttft_s": round(self.ttft, 3) if self.ttft is not None else None,
+            "tokens": self.tokens,
+            "tokens_per_sec": round(self.tokens_per_sec, 1),
+            "total_s": round((self.finished_at or time.perf_counter()) - self.started_at, 3),
+        }
+
+    def summary(self) -> str:
+        ttft = f"{self.ttft:.2f}s" if self.ttft is not None else "n/a"
+        return f"⏱️ TTFT {ttft}, {self.tokens} tokens at {self.tokens_per_sec:.1f} tok/s"
+
+
+# --- Prompt Processing Statistics ---
+
+class promptEvalStats:
+    """
+    Prompt processing cost as reported by the backend, per prompt kind
+    (planner, selector, analyzer, ...). With a stable prompt prefix Ollama
+    only evaluates the tokens after the part it still has in its KV cache,
+    which shows up here as fewer prompt tokens and less prompt-eval time.
+    """
+    def __init__(self) -> None:
+        self._kinds = {}
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, prompt_tokens: int = None, prompt_eval_ns: int = None, load_ns: int = None) -> None:
+        with self._lock:
+            entry = self._kinds.setdefault(kind, {"calls": 0, "prompt_tokens": 0, "prompt_eval_ms": 0.0, "load_ms": 0.0})
+            entry["calls"] += 1
+            entry["prompt_tokens"] += prompt_tokens or 0
+            entry["prompt_eval_ms"] += (prompt_eval_ns or 0) / 1e6
+            entry["load_ms"] += (load_ns or 0) / 1e6
+
+    def record_ollama(self, kind: str, response) -> None:
+        self.record(
+            kind,
+            response.get("prompt_eval_count"),
+            response.get("prompt_eval_duration"),
+            response.get("load_duration")
+        )
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                kind: {
+                    "calls": entry["calls"],
+                    "prompt_tokens_mean": round(entry["prompt_tokens"] / entry["calls"], 1),
+                    "prompt_eval_ms_mean": round(entry["prompt_eval_ms"] / entry["calls"], 1),
+                    "load_ms_total": round(entry["load_ms"], 1),
+                }
+                for kind, entry in self._kinds.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._kinds.clear()
+
+
+# Marks the end of a token stream handed across threads
+_STREAM_END = object()
+
+
+# --- Shared LLM Client Pool ---
+
+@functools.lru_cache(maxsize=None)
+def _transient_errors() -> tuple:
+    """Exception types meaning the request got no reply: timeouts and transport failures."""
+    errors = [asyncio.TimeoutError, ConnectionError]
+    try:
+        import httpx
+        errors.append(httpx.TransportError)
+    except ImportError:
+        pass
+    try:
+        import openai
+        errors += [openai.APIConnectionError, openai.APITimeoutError]
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+DEFAULT_LMSTUDIO_URL = "http://localhost:1234/v1"
+
+# Maps the operator's model choice to a backend name
+MODEL_CHOICE_BACKENDS = {"o": "ollama", "l": "lmstudio"}
+
+
+class llmClientPool:
+    """
+    Asyncio LLM clients with one keep-alive connection pool per backend.
+
+    The pool owns an event loop running in a daemon thread, so the same
+    pooled connections are shared by sync callers (`chat`) and by async
+    callers running on any other loop (`achat`).
+
+    Ollama requests carry `keep_alive`, so the model (and the KV cache of
+    the shared prompt prefix) stays loaded between queries.
+    """
+    def __init__(
+        self,
+        ollama_host: str = None,
+        lmstudio_base_url: str = DEFAULT_LMSTUDIO_URL,
+        max_concurrency: int = 4,
+        timeout: float = 120.0,
+        retries: int = 2,
+        retry_backoff: float = 1.0,
+        keep_alive: str = "30m"
+    ) -> None:
+        self.ollama_host = ollama_host
+        self.keep_alive = keep_alive
+        self.prompt_stats = promptEvalStats()
+        self.lmstudio_base_url = lmstudio_base_url
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+
+        self._clients = {}
+        self._semaphores = {}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever,
+            name="llm-client-loop",
+            daemon=True
+        )
+        self._thread.start()
+
+    # Only called from inside the pool's loop, so no locking is needed
+    def _get_client(self, backend: str):
+        if backend not in self._clients:
+            if backend == "ollama":
+                import ollama
+                self._clients[backend] = ollama.AsyncClient(
+                    host=self.ollama_host,
+                    timeout=self.timeout
+                )
+            elif backend == "lmstudio":
+                from openai import AsyncOpenAI
+                self._clients[backend] = AsyncOpenAI(
+                    base_url=self.lmstudio_base_url,
+                    api_key="not-needed",
+                    timeout=self.timeout,
+                    max_retries=0  # Retries are handled by the pool
+                )
+            else:
+                raise ValueError(f"Unknown LLM backend: {backend}")
+            self._semaphores[backend] = asyncio.Semaphore(self.max_concurrency)
+        return self._clients[backend], self._semaphores[backend]
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """Timeouts, dropped connections, 429 and 5xx; anything else is a bug or a bad request."""
+        if isinstance(error, _transient_errors()):
+            return True
+        status = getattr(error, "status_code", None)
+        return isinstance(status, int) and (status == 429 or status >= 500)
+
+    async def _request(self, backend: str, client, model: str, messages: list, options: dict) -> str:
+        if backend == "ollama":
+            response = await client.chat(
+                model=model, messages=messages, options=options or None, keep_alive=self.keep_alive
+            )
+            self.prompt_stats.record_ollama(prompt_kind(messages), response)
+            return response["message"]["content"]
+
+        response = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            **(options or {})
+        )
+        usage = getattr(response, "usage", None)
+        self.prompt_stats.record(prompt_kind(messages), getattr(usage, "prompt_tokens", None))
+        return response.choices[0].message.content
+
+    async def _chat(self, backend: str, model: str, messages: list, options: dict) -> str:
+        client, semaphore = self._get_client(backend)
+        attempt = 0
+        while True:
+            try:
+                async with semaphore:
+                    return await asyncio.wait_for(
+                        self._request(backend, client, model, messages, options),
+                        self.timeout
+                    )
+            except Exception as e:
+                if attempt >= self.retries or not self._is_retryable(e):
+                    raise
+                attempt += 1
+                delay = self.retry_backoff * (2 ** (attempt - 1))
+                print(f"WARNING: {backend} request failed ({e!r}). Retry {attempt}/{self.retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def _stream_request(self, backend: str, client, model: str, messages: list, options: dict, emit, stats) -> None:
+        if backend == "ollama":
+            stream = await client.chat(
+                model=model, messages=messages, options=options or None, stream=True, keep_alive=self.keep_alive
+            )
+            async for part in stream:
+                content = part["message"]["content"]
+                if content:
+                    stats.record_token()
+                    emit(content)
+                if part.get("done"):
+                    if part.get("eval_count"):
+                        stats.eval_count = part["eval_count"]
+                    self.prompt_stats.record_ollama(prompt_kind(messages), part)
+            return
+
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            **(options or {})
+        )
+        async for chunk in stream:
+            content = chunk.choices[0].delta.content if chunk.choices else None
+            if content:
+                stats.record_token()
+                emit(content)
+
+    async def _stream(self, backend: str, model: str, messages: list, options: dict, emit, stats) -> None:
+        client, semaphore = self._get_client(backend)
+        attempt = 0
+        while True:
+            try:
+                async with semaphore:
+                    await asyncio.wait_for(
+                        self._stream_request(backend, client, model, messages, options, emit, stats),
+                        self.timeout
+                    )
+                stats.finish()
+                return
+            except Exception as e:
+                # Once tokens have been handed out a retry would repeat them
+                if stats.chunks or attempt >= self.retries or not self._is_retryable(e):
+                    stats.finish()
+                    raise
+                attempt += 1
+                delay = self.retry_backoff * (2 ** (attempt - 1))
+                print(f"WARNING: {backend} stream failed ({e!r}). Retry {attempt}/{self.retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def stream_chat(self, backend: str, model: str, messages: list, stats: generationStats = None, **options):
+        """
+        Sends a chat request and yields the reply as it is generated.
+
+        Args:
+            backend (str): 'ollama' or 'lmstudio'.
+            model (str): The model name known to the backend.
+            messages (list): Chat messages as role/content dicts.
+            stats (generationStats): Filled in with TTFT and throughput, if given.
+            **options: Backend options (e.g. temperature, max_tokens).
+
+        Yields:
+            str: Pieces of the reply, in order.
+        """
+        stats = stats if stats is not None else generationStats()
+        tokens = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            self._stream(backend, model, messages, options, tokens.put, stats),
+            self._loop
+        )
+        future.add_done_callback(lambda _: tokens.put(_STREAM_END))
+        while True:
+            token = tokens.get()
+            if token is _STREAM_END:
+                break
+            yield token
+        # Re-raises anything that went wrong on the pool's loop
+        future.result()
+
+    async def astream_chat(self, backend: str, model: str, messages: list, stats: generationStats = None, **options):
+        """Async counterpart of `stream_chat`, usable from any event loop."""
+        stats = stats if stats is not None else generationStats()
+        loop = asyncio.get_running_loop()
+        tokens = asyncio.Queue()
+
+        def emit(token):
+            loop.call_soon_threadsafe(tokens.put_nowait, token)
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._stream(backend, model, messages, options, emit, stats),
+            self._loop
+        )
+        future.add_done_callback(lambda _: emit(_STREAM_END))
+        while True:
+            token = await tokens.get()
+            if token is _STREAM_END:
+                break
+            yield token
+        await asyncio.wrap_future(future)
+
+    async def achat(self, backend: str, model: str, messages: list, **options) -> str:
+        """
+        Sends a chat request from any event loop.
+
+        Args:
+            backend (str): 'ollama' or 'lmstudio'.
+            model (str): The model name known to the backend.
+            messages (list): Chat messages as role/content dicts.
+            **options: Backend options (e.g. temperature, max_tokens).
+
+        Returns:
+            str: The content of the model's reply.
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self._chat(backend, model, messages, options),
+            self._loop
+        )
+        return await asyncio.wrap_future(future)
+
+    def chat(self, backend: str, model: str, messages: list, **options) -> str:
+        """Blocking wrapper around `achat` for synchronous callers."""
+        future = asyncio.run_coroutine_threadsafe(
+            self._chat(backend, model, messages, options),
+            self._loop
+        )
+        return future.result()
+
+    def close(self) -> None:
+        async def _close_clients():
+            for backend, client in self._clients.items():
+                closer = getattr(client, "close", None) or getattr(getattr(client, "_client", None), "aclose", None)
+                if closer is None:
+                    continue
+                try:
+                    result = closer()
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception as e:
+                    print(f"WARNING: Could not close {backend} client: {e}")
+            self._clients.clear()
+
+        asyncio.run_coroutine_threadsafe(_close_clients(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+
+def get_llm_client() -> llmClientPool:
+    """
+    Returns the process-wide client pool, creating it on first use.
+    Settings can be overridden with CEPH_AGENT_LMSTUDIO_URL,
+    CEPH_AGENT_LLM_CONCURRENCY, CEPH_AGENT_LLM_TIMEOUT,
+    CEPH_AGENT_LLM_RETRIES and CEPH_AGENT_OLLAMA_KEEP_ALIVE. Ollama
+    honours the usual OLLAMA_HOST.
+    """
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                _shared_client = llmClientPool(
+                    lmstudio_base_url=os.environ.get("CEPH_AGENT_LMSTUDIO_URL", DEFAULT_LMSTUDIO_URL),
+                    max_concurrency=int(os.environ.get("CEPH_AGENT_LLM_CONCURRENCY", 4)),
+                    timeout=float(os.environ.get("CEPH_AGENT_LLM_TIMEOUT", 120)),
+                    retries=int(os.environ.get("CEPH_AGENT_LLM_RETRIES", 2)),
+                    keep_alive=os.environ.get("CEPH_AGENT_OLLAMA_KEEP_ALIVE", "30m")
+                )
+    return _shared_client
+
+
+def as_messages(prompt) -> list:
+    """Accepts a prompt string or a message list (see llm/prompts.py)."""
+    if isinstance(prompt, str):
+        return [{"role": "user", "content": prompt}]
+    return prompt
 
 
 # Here declare a class of LLM to access any of it's method easily
 
 class llmResponse:
-    def __init__(self, model_name: str, temperature: float) -> None:
+    def __init__(self, model_name: str, temperature: float, client: llmClientPool = None) -> None:
         if model_name:
             self.model = model_name
         else:
@@ -14,43 +430,99 @@ class llmResponse:
             self.temperature = temperature
         else:
             self.temperature = float(0.2)
+        # UPDATED: All instances share one pooled client unless given their own
+        self.client = client or get_llm_client()
 
-    def _run_llm_query_with_ollama(self, prompt: str):
+    def _run_llm_query_with_ollama(self, prompt):
         """
         Executes a prompt using the LLM model and returns the response.
 
         Args:
-            prompt (str): The prompt to send to the LLM.
-            model (str): The LLM model to use.
+            prompt (str | list): The prompt, or the chat messages, to send to the LLM.
 
         Returns:
             str: The LLM's response.
         """
         print(f"Using the model {self.model}\n")
-        response = ollama.chat(model=self.model, messages=[{"role": "user", "content": prompt}])
-        return response['message']['content'].strip()
-
-    def _run_llm_query_with_lmstudio(self, prompt: str):
-        # Point OpenAI client to LM Studio's local server
-        openai.api_base = "http://localhost:1234/v1"
-        openai.api_key = "not-needed"
+        messages = as_messages(prompt)
+        with trace_span("llm", backend="ollama", model=self.model, prompt_tokens_est=estimate_prompt_tokens(messages)) as span:
+            response = self.client.chat(
+                "ollama",
+                self.model,
+                messages
+            )
+            span.set(response_chars=len(response))
+        return response.strip()
 
+    def _run_llm_query_with_lmstudio(self, prompt):
         """
-        Executes a prompt using the LLM model and returns the response.
+        Executes a prompt using the LLM model loaded in LM Studio and returns the response.
 
         Args:
-            prompt (str): The prompt to send to the LLM.
-            model (str): The LLM model to use.
+            prompt (str | list): The prompt, or the chat messages, to send to the LLM.
 
         Returns:
             str: The LLM's response.
         """
-        response = openai.ChatCompletion.create(
-            model=self.model_name,  # Replace with the actual name of the model loaded in LM Studio
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.0,
-            max_tokens=100
+        messages = as_messages(prompt)
+        with trace_span("llm", backend="lmstudio", model=self.model, prompt_tokens_est=estimate_prompt_tokens(messages)) as span:
+            response = self.client.chat(
+                "lmstudio",
+                self.model,
+                messages,
+                temperature=0.0,
+                max_tokens=100
+            )
+            span.set(response_chars=len(response))
+        return response.strip()
+
+    # NEW: Streaming counterpart of the two calls above
+    def _stream_llm_query(self, prompt, model_choice: str, stats: generationStats = None):
+        """
+        Yields the response to a prompt token by token.
+
+        Args:
+            prompt (str | list): The prompt, or the chat messages, to send to the LLM.
+            model_choice (str): 'o' for Ollama, 'l' for LM Studio.
+            stats (generationStats): Filled in with TTFT and tokens/sec.
+
+        Yields:
+            str: Pieces of the LLM's response.
+        """
+        backend = MODEL_CHOICE_BACKENDS.get(model_choice)
+        if backend is None:
+            print(f"Invalid model choice: {model_choice}")
+            return
+        options = {"temperature": 0.0, "max_tokens": 100} if backend == "lmstudio" else {}
+        yield from self.client.stream_chat(
+            backend,
+            self.model,
+            as_messages(prompt),
+            stats=stats,
+            **options
+        )
+
+    # Helper function to dispatch on the operator's model choice.
+    def _run_llm_query(self, prompt, model_choice: str) -> str:
+        if model_choice == 'o':
+            return self._run_llm_query_with_ollama(prompt)
+        elif model_choice == 'l':
+            return self._run_llm_query_with_lmstudio(prompt)
+        else:
+            print(f"Invalid model choice: {model_choice}")
+            return ""
+
+    async def _arun_llm_query(self, prompt, model_choice: str) -> str:
+        """Async counterpart of `_run_llm_query` for overlapping LLM calls."""
+        backend = MODEL_CHOICE_BACKENDS.get(model_choice)
+        if backend is None:
+            print(f"Invalid model choice: {model_choice}")
+            return ""
+        options = {"temperature": 0.0, "max_tokens": 100} if backend == "lmstudio" else {}
+        response = await self.client.achat(
+            backend,
+            self.model,
+            as_messages(prompt),
+            **options
         )
-        return response.choices[0].message.content.strip()
\ No newline at end of file
+        return response.strip()
@@ -0,0 +1,214 @@
+# --------------------
+# Prompt Assembly
+# --------------------
+#
+# Every LLM call the agent makes is built here, always in the same shape:
+# the long, static instructions first as a system message that is
+# byte-for-byte identical on every call, then the variable data (query,
+# candidate commands, command output) last as the user message. Ollama
+# (llama.cpp) keeps the KV cache of the previous prompt while the model
+# stays loaded, so a request that starts with the same tokens only pays
+# prompt processing for the part after the shared prefix. Putting the query
+# first, or the system message after the user message, changes the very
+# first tokens and throws that cache away on every call.
+#
+# Keep the *_INSTRUCTIONS constants free of anything that varies per call.
+
+import json
+import textwrap
+
+PLANNER_INSTRUCTIONS = textwrap.dedent("""
+    You are an expert assistant for a Ceph Command AI agent. You are a high-level PLANNER. Your job is to analyze a user's goal and create a plan. Another agent will be responsible for finding the specific commands later.
+
+    1.  **Classify the user query into one of two modes:**
+        -   **Direct Mode:** The query can be answered with a **single command**. This includes most "check," "get," "list," or "show" requests.
+            -   *Example Direct Queries:* "check cluster health", "what is the status of the OSDs?", "list all the pools".
+        -   **Planning Mode:** The query requires **multiple, sequential commands** to achieve a final goal. This is for complex workflows, troubleshooting, or tasks with dependencies.
+            -   *Example Planning Queries:* "Create a new RBD image and map it to a host", "Find all inactive PGs and attempt to repair them".
+
+    2.  **Detect Destructive Actions:**
+        -   If the query involves high-risk actions (delete, remove, purge, shutdown), mark it as `"safety": "unsafe"`.
+        -   Otherwise, mark it as `"safety": "safe"`.
+
+    3.  **CRITICAL RULE for Planning Mode Steps:**
+        -   Steps **MUST** be high-level goals described in natural language.
+        -   Under NO circumstances should you ever include a raw command (like "ceph osd tree" or "rbd create") in the "steps" array. Your role is to define WHAT to do, not HOW to do it.
+
+    4.  **Good vs. Bad Step Examples:**
+        -   **BAD Step (Vague/GUI-based):** "Navigate to the Ceph cluster management interface."
+        -   **BAD Step (Contains a command):** "Run 'ceph health' to see the status."
+        -   **GOOD Step (Clear CLI Goal):** "Check the overall health of the cluster."
+        -   **GOOD Step (Clear CLI Goal):** "Identify all unhealthy OSDs."
+
+    5.  **Step Dependencies:**
+        -   Give every step a numeric "id" and list in "depends_on" the ids of the earlier steps whose results it needs.
+        -   Steps that do not need another step's result MUST have an empty "depends_on", so they can run in parallel.
+        -   *Example:* "check OSD status, pool usage and PG states" has three steps that all have `"depends_on": []`.
+
+    6.  **Respond in STRICT JSON only.** The response must match this schema exactly:
+        ```json
+        {
+          "mode": "planning" | "direct",
+          "safety": "safe" | "unsafe",
+          "reasoning": "Short explanation of your classification and plan.",
+          "steps": [
+            {"id": 1, "goal": "If planning: natural language goal only. NO COMMANDS.", "depends_on": []},
+            {"id": 2, "goal": "If direct: leave the steps array empty.", "depends_on": [1]}
+          ],
+          "warning": "Only if unsafe, else empty."
+        }
+        ```
+
+    The user's query is in the next message.
+""").strip()
+
+JUDGE_INSTRUCTIONS = textwrap.dedent("""
+    You are a relevance judge. Your only task is to analyze a user's query and a list of potential commands and determine if ANY of the commands are relevant.
+
+    The next message contains the <user_query> and the <available_commands>.
+
+    Does the <available_commands> list contain at least one command that is highly relevant to the <user_query>?
+    Respond ONLY with the word 'YES' or 'NO'.
+""").strip()
+
+SELECTOR_INSTRUCTIONS = textwrap.dedent("""
+    You are an expert Ceph command selector. Your task is to analyze a user's intent and select the single best command from a provided list that fulfills that intent.
+
+    **Step 1: Analyze the User's Intent**
+    First, understand what the user is trying to accomplish (the <user_query> in the next message), ignoring any specific commands they might have mentioned.
+
+    **Step 2: Select the Best Command**
+    Review the <available_commands> in the next message and choose the one whose description best matches the user's intent.
+
+    **Decision Rules:**
+    1. Your choice MUST be based on the command's `<description>`, not on whether its `<name>` appears in the user query.
+    2. The selected command MUST be one of the exact `<name>` strings from the list.
+    3. If NO command is a highly relevant match for the user's intent, you MUST respond with the exact string 'NO_MATCH'.
+
+    Respond ONLY with the chosen `<name>` or 'NO_MATCH'. Do not provide any explanation.
+""").strip()
+
+STRUCTURED_SELECTION_INSTRUCTIONS = textwrap.dedent("""
+    You are an expert Ceph command selector. Your task is to decide whether any command from a provided list fulfills the user's intent and, if so, select the single best one. The next message contains the <user_query> and the <available_commands>.
+
+    **Decision Rules:**
+    1. Your choice MUST be based on the command's `<description>`, not on whether its `<name>` appears in the user query.
+    2. The selected command MUST be one of the exact `<name>` strings from the list.
+    3. If NO command is a highly relevant match for the user's intent, set "relevant" to false and "command" to "NO_MATCH".
+
+    Respond in STRICT JSON only, matching this schema exactly:
+    {"relevant": true | false, "command": "<name> or NO_MATCH", "confidence": 0.0-1.0}
+""").strip()
+
+ANALYZER_INSTRUCTIONS = textwrap.dedent("""
+    You are an expert Ceph administrator assistant. Your ONLY task is to
+    extract and summarize information from the provided 'COMMAND OUTPUT'
+    to answer the 'USER QUERY'. DO NOT use any external knowledge.
+    DO NOT invent information. If the information is not directly available
+    or cannot be clearly inferred from the 'COMMAND OUTPUT', state that the
+    information is not found in the provided output or that you cannot answer.
+    Be concise, clear, and directly answer the question based *only* on the
+    provided text. Provide a concise, human-readable answer.
+""").strip()
+
+SYNTHESIS_INSTRUCTIONS = textwrap.dedent("""
+    A multi-step plan was executed to answer a Ceph operator's query. The next
+    message contains the original query and the summaries of what was done in
+    each step. Based on the results of these steps, provide a comprehensive
+    final answer to the user's original query.
+""").strip()
+
+
+def _messages(instructions: str, user_content: str) -> list:
+    return [
+        {"role": "system", "content": instructions},
+        {"role": "user", "content": user_content},
+    ]
+
+
+def _format_commands(available_commands: list, with_tags: bool = True) -> str:
+    lines = ["<available_commands>"]
+    for cmd_data in available_commands:
+        command_name = cmd_data.get("command", "N/A")
+        description = cmd_data.get("description", "N/A")
+        if with_tags:
+            lines.append("<command>")
+            lines.append(f"  <name>{command_name}</name>")
+            lines.append(f"  <description>{description}</description>")
+            lines.append("</command>")
+        else:
+            lines.append(f"- Command: {command_name}")
+            lines.append(f"  Description: {description}")
+    lines.append("</available_commands>")
+    return "\n".join(lines)
+
+
+def planner_messages(user_query: str) -> list:
+    return _messages(PLANNER_INSTRUCTIONS, user_query)
+
+
+def judge_messages(user_query: str, available_commands: list) -> list:
+    return _messages(
+        JUDGE_INSTRUCTIONS,
+        f'<user_query>\n"{user_query}"\n</user_query>\n\n{_format_commands(available_commands, with_tags=False)}'
+    )
+
+
+def selector_messages(user_query: str, available_commands: list) -> list:
+    return _messages(
+        SELECTOR_INSTRUCTIONS,
+        f'<user_query>\n"{user_query}"\n</user_query>\n\n{_format_commands(available_commands)}\n\nYour Answer:'
+    )
+
+
+def structured_selection_messages(user_query: str, available_commands: list) -> list:
+    return _messages(
+        STRUCTURED_SELECTION_INSTRUCTIONS,
+        f'<user_query>\n"{user_query}"\n</user_query>\n\n{_format_commands(available_commands)}\n\nYour Answer:'
+    )
+
+
+def analysis_messages(query: str, command: str, command_out: str, command_description: str = None, output_age: float = None) -> list:
+    user_prompt_parts = [
+        f"User Query: {query}",
+        f"Command Executed: {command}"
+    ]
+    if command_description:
+        user_prompt_parts.append(f"The executed command's relevance is: {command_description}")
+    if output_age is not None:
+        user_prompt_parts.append(
+            f"Note: This output was cached {output_age:.0f} seconds ago "
+            "and may not reflect changes made since then."
+        )
+    user_prompt_parts.append(f"COMMAND OUTPUT:\n```\n{command_out}\n```")
+    return _messages(ANALYZER_INSTRUCTIONS, "\n\n".join(user_prompt_parts))
+
+
+def synthesis_messages(user_query: str, execution_context: dict) -> list:
+    return _messages(
+        SYNTHESIS_INSTRUCTIONS,
+        f'The user\'s original query was: "{user_query}"\n\n'
+        f"Summaries of the executed steps:\n{json.dumps(execution_context, indent=2)}"
+    )
+
+
+_KINDS = {
+    PLANNER_INSTRUCTIONS: "planner",
+    JUDGE_INSTRUCTIONS: "judge",
+    SELECTOR_INSTRUCTIONS: "selector",
+    STRUCTURED_SELECTION_INSTRUCTIONS: "structured_selection",
+    ANALYZER_INSTRUCTIONS: "analyzer",
+    SYNTHESIS_INSTRUCTIONS: "synthesis",
+}
+
+
+def prompt_kind(messages: list) -> str:
+    """Names the prompt a message list was built from, for per-prompt metrics."""
+    if messages and messages[0]["role"] == "system":
+        return _KINDS.get(messages[0]["content"], "other")
+    return "other"
+
+
+def estimate_prompt_tokens(messages: list) -> int:
+    """Rough prompt size (4 characters per token) for trace attributes."""
+    return sum(len(message["content"]) for message in messages) // 4
@@ -0,0 +1,169 @@
+# --------------------
+# Semantic Response Cache
+# --------------------
+#
+# During an incident operators ask the same thing again and again, in
+# slightly different words ("is the cluster healthy?", "check cluster
+# health"). Each of those used to run the classifier, retrieval, selection,
+# the command and the analyzer from scratch. This cache remembers recently
+# answered direct-mode queries by their embedding. A new query close enough
+# to one of them is answered from the cache while the command result the
+# answer was based on is still fresh, and otherwise reuses the cached
+# command (skipping classification and retrieval) and only re-analyzes.
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from ceph.result_cache import commandResultCache
+
+# Words carrying digits (osd.3, pg 1.2f, pool ids) change which object a
+# query is about even when the embeddings are nearly identical
+_IDENTIFIER_RE = re.compile(r"[\w.\-]*\d[\w.\-]*")
+
+
+def query_identifiers(query: str) -> frozenset:
+    return frozenset(m.group(0).strip(".-").lower() for m in _IDENTIFIER_RE.finditer(query))
+
+
+def _entry_key(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class cachedResponse:
+    """One answered direct-mode query."""
+    __slots__ = ("query", "vector", "command", "vect_results", "answer",
+                 "stored_at", "ttl", "epoch", "identifiers")
+
+    def __init__(self, query, vector, command, vect_results, answer, stored_at, ttl, epoch) -> None:
+        self.query = query
+        self.vector = vector
+        self.command = command
+        self.vect_results = vect_results
+        self.answer = answer
+        self.stored_at = stored_at
+        self.ttl = ttl
+        self.epoch = epoch
+        self.identifiers = query_identifiers(query)
+
+
+class semanticResponseCache:
+    """
+    Nearest-neighbour cache of query -> (command, answer).
+
+    Args:
+        encoder (callable): encoder(texts) -> matrix of embeddings, e.g. `vectorBuilder.encode`.
+        threshold (float): Minimum cosine similarity for a query to count as a repeat.
+        result_cache (commandResultCache): Supplies the per-command TTL that decides how
+                                           long an answer may be returned as is.
+        reanalyze_window (float): Seconds after which a matched entry is no longer used
+                                  at all, not even to skip retrieval.
+        max_entries (int): Least recently used entries are dropped beyond this.
+        clock (callable): Monotonic time source; tests pass a fake one.
+    """
+    def __init__(
+        self,
+        encoder,
+        threshold: float = 0.9,
+        result_cache: commandResultCache = None,
+        reanalyze_window: float = 900,
+        max_entries: int = 128,
+        clock=time.monotonic
+    ) -> None:
+        self.encoder = encoder
+        self.threshold = threshold
+        self.result_cache = result_cache or commandResultCache()
+        self.reanalyze_window = reanalyze_window
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()  # normalized query -> cachedResponse
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.reanalyzed = 0
+        self.misses = 0
+
+    def _embed(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.encoder([query], normalize_embeddings=True), dtype="float32")[0]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, query: str, epoch: int = 0):
+        """
+        Finds the closest earlier query.
+
+        Args:
+            query (str): The new query.
+            epoch (int): Current cluster-change counter (the result cache's
+                         `invalidations`); answers from an older epoch are
+                         re-analyzed rather than returned.
+
+        Returns:
+            tuple: (entry, similarity, fresh) for a match, or (None, best similarity, False).
+                   When `fresh` is False the caller should re-run entry.command and
+                   re-analyze its output.
+        """
+        vector = self._embed(query)
+        identifiers = query_identifiers(query)
+        now = self.clock()
+        best, best_score = None, 0.0
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if now - entry.stored_at > self.reanalyze_window:
+                    del self._entries[key]
+                    continue
+                if entry.identifiers != identifiers:
+                    continue
+                score = float(np.dot(vector, entry.vector))
+                if score > best_score:
+                    best, best_score = entry, score
+
+            if best is None or best_score < self.threshold:
+                self.misses += 1
+                return None, best_score, False
+
+            self._entries.move_to_end(_entry_key(best.query))
+            fresh = best.epoch == epoch and now - best.stored_at <= best.ttl
+            if fresh:
+                self.hits += 1
+            else:
+                self.reanalyzed += 1
+        return best, best_score, fresh
+
+    def put(self, query: str, command: str, vect_results: list, answer: str, epoch: int = 0, output_age: float = None) -> None:
+        """
+        Remembers an answered query. Only answers based on allowlisted,
+        read-only commands are kept, since a match re-runs the command
+        without going through the classifier's safety check again.
+
+        Args:
+            output_age (float): Age of the command output the answer was based
+                                on, if it came from the result cache; it counts
+                                against the answer's freshness.
+        """
+        command_key, ttl = self.result_cache.key_for(command)
+        if command_key is None:
+            return
+        stored_at = self.clock() - (output_age or 0)
+        entry = cachedResponse(query, self._embed(query), command, vect_results, answer, stored_at, ttl, epoch)
+        key = _entry_key(query)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "reanalyzed": self.reanalyzed,
+                "misses": self.misses,
+            }
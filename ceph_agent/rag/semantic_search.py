@@ -3,7 +3,45 @@
 # --------------------
 
 from utils.file_ops import vectorBuilder
-from llm.llm_response import llmResponse
+from utils.utilities import extract_json
+from llm.llm_response import llmResponse, llmClientPool
+from utils.tracing import trace_span
+from utils.lexical_index import reciprocal_rank_fusion
+from llm.prompts import judge_messages, selector_messages, structured_selection_messages
+import json
+import threading
+
+SELECTION_MODES = ("two_stage", "single")
+
+
+def fast_path_decision(results: list, min_score: float, min_margin: float):
+    """
+    Decides whether the retrieval results are decisive enough to skip the LLM.
+
+    Args:
+        results (list): Search results carrying a similarity "score" (higher is better).
+        min_score (float): The top hit must score at least this much.
+        min_margin (float): The top hit must beat the runner-up by at least this much.
+                            With a single candidate the runner-up counts as 0.
+
+    Returns:
+        tuple: (command or None, top score, margin)
+    """
+    if not results or min_score is None or min_margin is None:
+        return None, None, None
+    # Decided on the dense ranking alone: keyword-only hits from hybrid
+    # search carry no dense score, and the dense runner-up may have been
+    # dropped by fusion (see semanticCephSearch._fuse)
+    ranked = sorted((r for r in results if r.get("dense", True)), key=lambda r: r["score"], reverse=True)
+    if not ranked:
+        return None, None, None
+    top_score = ranked[0]["score"]
+    runner_up = ranked[1]["score"] if len(ranked) > 1 else 0.0
+    runner_up = max(runner_up, ranked[0].get("dense_runner_up", 0.0))
+    margin = top_score - runner_up
+    if top_score >= min_score and margin >= min_margin:
+        return ranked[0]["command"], top_score, margin
+    return None, top_score, margin
 
 
 class semanticCephSearch(llmResponse):
@@ -14,99 +52,184 @@ class semanticCephSearch(llmResponse):
         self,
         vector_store: vectorBuilder,
         top_k: int,
-        threshold: float, # UPDATED: Threshold should be a float for similarity scores
+        threshold: float, # UPDATED: Minimum cosine similarity a candidate must reach
         llm_model: str = "granite3.3:8b",
-        temperature: float = 0.2
+        temperature: float = 0.2,
+        selection_mode: str = "two_stage",
+        min_confidence: float = 0.0,
+        fast_path_min_score: float = None,
+        fast_path_min_margin: float = None,
+        client: llmClientPool = None,
+        hybrid: bool = False,
+        rrf_k: int = 60
     ) -> None:
 
-        super().__init__(llm_model, temperature)
+        super().__init__(llm_model, temperature, client)
+        if selection_mode not in SELECTION_MODES:
+            raise ValueError(f"selection_mode must be one of {SELECTION_MODES}, got '{selection_mode}'")
         self.llm_model = llm_model
         self.top_k = top_k
         self.threshold = threshold
         self.vector_store = vector_store
+        # NEW: 'single' merges the relevance judge and the selector into one call
+        self.selection_mode = selection_mode
+        self.min_confidence = min_confidence
+        # NEW: Skip the LLM entirely when retrieval is decisive (disabled if None)
+        self.fast_path_min_score = fast_path_min_score
+        self.fast_path_min_margin = fast_path_min_margin
+        self.fast_path_stats = {"queries": 0, "fast_path": 0}
+        # Plan steps select commands concurrently on the shared instance
+        self._stats_lock = threading.Lock()
+        # NEW: Fuse BM25 keyword hits with the dense hits (reciprocal rank fusion)
+        self.hybrid = hybrid
+        self.rrf_k = rrf_k
 
     def _search_command(self, query: str):
-        query_embedding = self.vector_store.model.encode(
-            [query],
-            convert_to_numpy=True
-        )
-        distances, indices = self.vector_store.index.search(
-            query_embedding,
-            self.top_k
-        )
+        with trace_span("encode"):
+            query_embedding = self.vector_store.encode_queries([query])
+        return self._search_embeddings(query_embedding, queries=[query])[0]
 
-        results = []
-        for score, idx in zip(distances[0], indices[0]):
-            # Similarity scores are often 0-1, where lower is better. Adjust if using cosine similarity.
-            if score <= self.threshold:
-                matched_data = self.vector_store.metadata[int(idx)]
-                results.append({
-                    "score": float(score),
-                    "command": matched_data["command"],
-                    "description": matched_data["description"],
-                    "query_intent": matched_data["query_intent"]
-                })
-        return results
-    
-    def _get_relevance_judge_prompt(self, user_query, available_commands):
-        # This prompt is good, no changes needed, but we will now use it.
-        judge_prompt = f"""
-        You are a relevance judge. Your only task is to analyze a user's query and a list of potential commands and determine if ANY of the commands are relevant.
-
-        <user_query>
-        "{user_query}"
-        </user_query>
+    # NEW: Retrieval only, no LLM; the results can be handed to search_and_select
+    def search(self, query: str) -> list:
+        return self._search_command(query=query)
 
-        <available_commands>
+    def search_many(self, queries: list) -> list:
         """
-        for cmd_data in available_commands:
-            judge_prompt += f"- Command: {cmd_data.get('command')}\n"
-            judge_prompt += f"  Description: {cmd_data.get('description')}\n\n"
-        judge_prompt += "</available_commands>\n\n"
-
-        judge_prompt += """
-        Does the <available_commands> list contain at least one command that is highly relevant to the <user_query>?
-        Respond ONLY with the word 'YES' or 'NO'.
+        Retrieves candidates for several queries at once.
+
+        All queries are encoded in one batched forward pass and looked up
+        with a single FAISS search over the stacked matrix, so a plan with
+        N steps pays for one encoder invocation instead of N.
+
+        Args:
+            queries (list): The natural language queries to search for.
+
+        Returns:
+            list: One result list per query, in input order, with the same
+                  score/threshold semantics as `_search_command`.
         """
-        return judge_prompt
+        if not queries:
+            return []
+        query_embeddings = self.vector_store.encode_queries(list(queries))
+        return self._search_embeddings(query_embeddings, queries=list(queries))
 
-    # UPDATED: The selection prompt is heavily revised to focus on intent.
-    def _get_llm_selection_prompt(self, user_query, available_commands):
-        llm_selection_prompt = f"""
-        You are an expert Ceph command selector. Your task is to analyze a user's intent and select the single best command from a provided list that fulfills that intent.
+    def _search_embeddings(self, query_embeddings, queries: list = None) -> list:
+        """
+        Args:
+            query_embeddings (np.ndarray): One query vector per row.
+            queries (list): The query texts; needed for hybrid search, which
+                            falls back to dense only without them.
+        """
+        hybrid = self.hybrid and queries is not None
+        # Hybrid search looks deeper, so lexical hits usually have a dense score too
+        k = self.top_k * 3 if hybrid else self.top_k
+        # UPDATED: Scores come back as cosine similarities whatever the
+        # index metric, so higher is always better.
+        with trace_span("faiss_search", queries=len(query_embeddings), top_k=k):
+            similarities, indices = self.vector_store.search(
+                query_embeddings,
+                k
+            )
 
-        **Step 1: Analyze the User's Intent**
-        First, understand what the user is trying to accomplish, ignoring any specific commands they might have mentioned.
+        all_results = []
+        for row_no, (row_scores, row_indices) in enumerate(zip(similarities, indices)):
+            results = []
+            for score, idx in zip(row_scores, row_indices):
+                if idx < 0:
+                    # FAISS pads with -1 when the index holds fewer than top_k vectors
+                    continue
+                if score >= self.threshold or hybrid:
+                    results.append(self._result(int(idx), float(score)))
+            if hybrid:
+                results = self._fuse(queries[row_no], results)
+            all_results.append(results)
+        return all_results
 
-        <user_query>
-        "{user_query}"
-        </user_query>
+    def _result(self, idx: int, score: float) -> dict:
+        matched_data = self.vector_store.metadata[idx]
+        return {
+            "score": score,
+            "command": matched_data["command"],
+            "description": matched_data["description"],
+            "query_intent": matched_data["query_intent"]
+        }
 
-        **Step 2: Select the Best Command**
-        Review the following commands and choose the one whose description best matches the user's intent.
+    def _fuse(self, query: str, dense: list) -> list:
+        """
+        Merges dense and BM25 candidates with reciprocal rank fusion.
 
-        <available_commands>
+        Every result keeps its dense cosine "score" (0.0 for a keyword-only
+        hit the dense search did not return) and gains an "rrf_score" it is
+        ordered by, plus "dense": whether the dense search ranked it above
+        the threshold. The dense top hit also carries "dense_runner_up", the
+        score of the dense runner-up, which fusion may have dropped, so the
+        fast path margin is the pure dense one. Dense hits below the
+        threshold only count if BM25 also finds them.
         """
-        for cmd_data in available_commands:
-            command_name = cmd_data.get("command", "N/A")
-            description = cmd_data.get("description", "N/A")
-            llm_selection_prompt += f"<command>\n"
-            llm_selection_prompt += f"  <name>{command_name}</name>\n"
-            llm_selection_prompt += f"  <description>{description}</description>\n"
-            llm_selection_prompt += f"</command>\n"
-        llm_selection_prompt += "</available_commands>\n\n"
-
-        llm_selection_prompt += """
-        **Decision Rules:**
-        1. Your choice MUST be based on the command's `<description>`, not on whether its `<name>` appears in the user query.
-        2. The selected command MUST be one of the exact `<name>` strings from the list.
-        3. If NO command is a highly relevant match for the user's intent, you MUST respond with the exact string 'NO_MATCH'.
-
-        Respond ONLY with the chosen `<name>` or 'NO_MATCH'. Do not provide any explanation.
-
-        Your Answer: """
-        return llm_selection_prompt
+        with trace_span("bm25_search", top_k=self.top_k * 3) as span:
+            lexical = self.vector_store.lexical_search(query, self.top_k * 3)
+            span.set(hits=len(lexical))
+
+        # Best dense result per command (chunked indexes hold several vectors per command)
+        by_command = {}
+        for result in dense:
+            if result["command"] not in by_command or result["score"] > by_command[result["command"]]["score"]:
+                by_command[result["command"]] = result
+        dense_ranking = [
+            command for command, result in sorted(by_command.items(), key=lambda item: item[1]["score"], reverse=True)
+            if result["score"] >= self.threshold
+        ]
+
+        lexical_ranking = []
+        lexical_scores = {}
+        for idx, bm25_score in lexical:
+            result = by_command.get(self.vector_store.metadata[idx]["command"]) or self._result(idx, 0.0)
+            if result["command"] not in lexical_scores:
+                by_command.setdefault(result["command"], result)
+                lexical_ranking.append(result["command"])
+                lexical_scores[result["command"]] = bm25_score
+
+        fused = reciprocal_rank_fusion([dense_ranking, lexical_ranking], k=self.rrf_k)
+        in_dense = set(dense_ranking)
+        results = []
+        for command in sorted(fused, key=fused.get, reverse=True)[:self.top_k]:
+            result = dict(by_command[command], rrf_score=fused[command], dense=command in in_dense)
+            if dense_ranking and command == dense_ranking[0]:
+                # Kept even if fusion drops the runner-up, for the fast path margin
+                result["dense_runner_up"] = by_command[dense_ranking[1]]["score"] if len(dense_ranking) > 1 else 0.0
+            if command in lexical_scores:
+                result["bm25_score"] = lexical_scores[command]
+            results.append(result)
+        return results
     
+    def _parse_structured_selection(self, response: str, results: list):
+        try:
+            verdict = extract_json(response)
+        except (ValueError, json.JSONDecodeError) as e:
+            print(f"WARNING: Could not parse structured selection response. Error: {e}")
+            return None, None
+
+        relevant = verdict.get("relevant")
+        if isinstance(relevant, str):
+            relevant = relevant.strip().lower() in ("yes", "true")
+        selected_command = str(verdict.get("command", "NO_MATCH")).strip()
+        try:
+            confidence = float(verdict.get("confidence", 0.0))
+        except (TypeError, ValueError):
+            confidence = 0.0
+
+        print(f"INFO: Structured verdict: relevant={relevant}, command='{selected_command}', confidence={confidence:.2f}")
+        if not relevant:
+            print("INFO: LLM determined no commands are suitable. Stopping.")
+            return None, None
+        if confidence < self.min_confidence:
+            print(f"INFO: Selection confidence {confidence:.2f} is below {self.min_confidence:.2f}. Stopping.")
+            return None, None
+        return self._validate_llm_selection(
+            selected_command=selected_command,
+            results=results
+        )
+
     # UPDATED: Renamed for clarity.
     def _validate_llm_selection(self, selected_command: str, results: list):
         # Get a list of all available command names from your retrieved results
@@ -123,31 +246,58 @@ class semanticCephSearch(llmResponse):
             print(f"WARNING: LLM hallucinated a command: '{selected_command}'. It was not in the provided list.")
             return None, None
 
-    # NEW: Helper function to reduce code duplication.
-    def _run_llm_query(self, prompt: str, model_choice: str) -> str:
-        if model_choice == 'o':
-            return self._run_llm_query_with_ollama(prompt)
-        elif model_choice == 'l':
-            return self._run_llm_query_with_lmstudio(prompt)
-        else:
-            print(f"Invalid model choice: {model_choice}")
-            return ""
-
     # UPDATED: The main workflow now uses the two-stage chain.
     # Also made it a public method by removing the leading underscore.
-    def search_and_select(self, query: str, model_choice: str):
-        results = self._search_command(query=query)
+    def search_and_select(self, query: str, model_choice: str, candidates: list = None):
+        """
+        Args:
+            query (str): The user's query.
+            model_choice (str): 'o' (Ollama) or 'l' (LM Studio) for the selection call.
+            candidates (list): Results of an earlier `search(query)`, e.g. one run
+                               speculatively; the vector search is skipped if given.
+        """
+        with trace_span("retrieve", precomputed=candidates is not None) as span:
+            vect_results, selected = self._search_and_select(query, model_choice, candidates)
+            span.set(candidates=len(vect_results or []), selected=selected)
+        return vect_results, selected
+
+    def _search_and_select(self, query: str, model_choice: str, candidates: list = None):
+        results = candidates if candidates is not None else self._search_command(query=query)
         if not results:
             print("INFO: No relevant commands found in the vector DB search.")
             return None, None
 
         print(f"Vector search provided the following top-{self.top_k} commands:")
         for r in results:
-            print(f"[Score: {r['score']:.4f}] ➜ {r['command']}")
+            fused = f", RRF: {r['rrf_score']:.4f}" if "rrf_score" in r else ""
+            print(f"[Score: {r['score']:.4f}{fused}] ➜ {r['command']}")
+
+        fast_command, top_score, margin = fast_path_decision(
+            results,
+            self.fast_path_min_score,
+            self.fast_path_min_margin
+        )
+        with self._stats_lock:
+            self.fast_path_stats["queries"] += 1
+            if fast_command:
+                self.fast_path_stats["fast_path"] += 1
+            fast_paths, queries = self.fast_path_stats["fast_path"], self.fast_path_stats["queries"]
+        if fast_command:
+            print(
+                f"INFO: Fast path selected '{fast_command}' (score={top_score:.4f}, margin={margin:.4f}) "
+                f"without an LLM call [{fast_paths}/{queries} queries]."
+            )
+            return results, fast_command
+
+        if self.selection_mode == "single":
+            # Static instructions first, so the backend can reuse their KV cache
+            with trace_span("select"):
+                response = self._run_llm_query(structured_selection_messages(query, results), model_choice)
+            return self._parse_structured_selection(response, results)
 
         # --- STAGE 1: Relevance Judge ---
-        judge_prompt = self._get_relevance_judge_prompt(query, results)
-        relevance_response = self._run_llm_query(judge_prompt, model_choice).strip().upper()
+        with trace_span("judge"):
+            relevance_response = self._run_llm_query(judge_messages(query, results), model_choice).strip().upper()
         
         if "NO" in relevance_response:
             print("INFO: Relevance Judge determined no commands are suitable. Stopping.")
@@ -156,8 +306,8 @@ class semanticCephSearch(llmResponse):
         print("INFO: Relevance Judge confirmed potential match. Proceeding to selection.")
 
         # --- STAGE 2: Command Selector ---
-        selection_prompt = self._get_llm_selection_prompt(query, results)
-        selected_command_name = self._run_llm_query(selection_prompt, model_choice).strip()
+        with trace_span("selector"):
+            selected_command_name = self._run_llm_query(selector_messages(query, results), model_choice).strip()
 
         return self._validate_llm_selection(
             selected_command=selected_command_name,
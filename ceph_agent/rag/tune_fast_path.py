@@ -0,0 +1,125 @@
+# --------------------
+# Offline tuning of the retrieval fast path
+# --------------------
+#
+# Usage (from the ceph_agent directory):
+#   python -m rag.tune_fast_path --labels labeled_queries.json
+#
+# The labels file is a JSON list of {"query": ..., "command": ...} pairs.
+# Every query is retrieved once without any LLM call, then every
+# (min_score, min_margin) pair on the grid is replayed against the stored
+# results to report how often the fast path would fire and how often it
+# would pick the labeled command.
+
+import argparse
+import json
+
+from rag.semantic_search import semanticCephSearch, fast_path_decision
+from utils.file_ops import vectorBuilder
+
+
+def _frange(start: float, stop: float, step: float) -> list:
+    values = []
+    value = start
+    while value <= stop + 1e-9:
+        values.append(round(value, 4))
+        value += step
+    return values
+
+
+def evaluate_thresholds(labeled_results: list, min_score: float, min_margin: float) -> dict:
+    """
+    Replays the fast path decision over pre-computed search results.
+
+    Args:
+        labeled_results (list): (expected command, search results) pairs.
+        min_score (float): Candidate score floor.
+        min_margin (float): Candidate top-1/top-2 gap.
+
+    Returns:
+        dict: coverage (share of queries that skip the LLM) and precision
+              (share of those that picked the expected command).
+    """
+    fired = 0
+    correct = 0
+    for expected, results in labeled_results:
+        command, _, _ = fast_path_decision(results, min_score, min_margin)
+        if command is None:
+            continue
+        fired += 1
+        if command == expected:
+            correct += 1
+    total = len(labeled_results)
+    return {
+        "min_score": min_score,
+        "min_margin": min_margin,
+        "coverage": fired / total if total else 0.0,
+        "precision": correct / fired if fired else 1.0,
+        "fired": fired,
+    }
+
+
+def tune(labeled_results: list, target_precision: float, score_grid: list, margin_grid: list) -> list:
+    """Returns every grid point that meets the target precision, best coverage first."""
+    candidates = []
+    for min_score in score_grid:
+        for min_margin in margin_grid:
+            stats = evaluate_thresholds(labeled_results, min_score, min_margin)
+            if stats["fired"] and stats["precision"] >= target_precision:
+                candidates.append(stats)
+    candidates.sort(key=lambda c: (-c["coverage"], -c["min_score"], -c["min_margin"]))
+    return candidates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the semanticCephSearch fast path thresholds.")
+    parser.add_argument("--labels", required=True, help="JSON list of {query, command} pairs")
+    parser.add_argument("--json-path", default="./database/basic_commands.json")
+    parser.add_argument("--model-name", default="all-MiniLM-L6-v2")
+    parser.add_argument("--index-path", default="./faiss_index_store/ceph_faiss.index")
+    parser.add_argument("--metadata-path", default="./faiss_index_store/ceph_faiss_metadata.json")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=0.35)
+    parser.add_argument("--target-precision", type=float, default=0.98)
+    args = parser.parse_args()
+
+    with open(args.labels) as f:
+        labels = json.load(f)
+
+    vector_store = vectorBuilder(
+        json_path=args.json_path,
+        model_name=args.model_name,
+        index_path=args.index_path,
+        metadata_path=args.metadata_path
+    )
+    cephSearch = semanticCephSearch(
+        vector_store=vector_store,
+        top_k=args.top_k,
+        threshold=args.threshold
+    )
+
+    all_results = cephSearch.search_many([item["query"] for item in labels])
+    labeled_results = [(item["command"], results) for item, results in zip(labels, all_results)]
+
+    candidates = tune(
+        labeled_results,
+        args.target_precision,
+        score_grid=_frange(0.3, 0.95, 0.05),
+        margin_grid=_frange(0.0, 0.5, 0.05)
+    )
+    if not candidates:
+        print(f"🔴 No threshold pair reaches a precision of {args.target_precision:.2f}. Keep the fast path disabled.")
+        return
+
+    print(f"Top threshold pairs with precision >= {args.target_precision:.2f}:")
+    for c in candidates[:10]:
+        print(
+            f"  min_score={c['min_score']:.2f}  min_margin={c['min_margin']:.2f}  "
+            f"coverage={c['coverage']:.1%}  precision={c['precision']:.1%}"
+        )
+    best = candidates[0]
+    print(f"✅ Suggested: fast_path_min_score={best['min_score']:.2f}, fast_path_min_margin={best['min_margin']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
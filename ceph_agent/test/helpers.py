@@ -0,0 +1,75 @@
+# --------------------
+# Shared test doubles
+# --------------------
+
+import hashlib
+import re
+import sys
+import types
+import unittest
+
+import numpy as np
+
+
+class fakeClock:
+    """A monotonic clock the test moves by hand through `now`."""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def bag_of_words_encoder(vocabulary: list):
+    """
+    Stands in for the SentenceTransformer: one dimension per known word.
+
+    Returns:
+        callable: encoder(texts, normalize_embeddings=False) -> matrix, like `vectorBuilder.encode`.
+    """
+    def encode(texts, normalize_embeddings=False):
+        matrix = np.zeros((len(texts), len(vocabulary)), dtype="float32")
+        for row, text in enumerate(texts):
+            for word in text.lower().replace("?", "").replace(",", "").split():
+                if word in vocabulary:
+                    matrix[row, vocabulary.index(word)] += 1
+        return matrix
+    return encode
+
+
+class fakeSentenceTransformer:
+    """
+    Stands in for sentence_transformers.SentenceTransformer: hashed
+    bag-of-words embeddings, so texts sharing words are close.
+    """
+    dimension = 256
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.encoded = []
+
+    def encode(self, texts, convert_to_numpy=True, normalize_embeddings=False, show_progress_bar=False):
+        self.encoded.extend(texts)
+        matrix = np.zeros((len(texts), self.dimension), dtype="float32")
+        for row, text in enumerate(texts):
+            for word in re.findall(r"[a-z0-9]+", text.lower()):
+                matrix[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dimension] += 1.0
+        if normalize_embeddings:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix /= norms
+        return matrix
+
+
+def use_fake_sentence_transformers(test: unittest.TestCase) -> None:
+    """Makes `from sentence_transformers import SentenceTransformer` return the fake for one test."""
+    module = types.ModuleType("sentence_transformers")
+    module.SentenceTransformer = fakeSentenceTransformer
+    # Only this entry is swapped: restoring all of sys.modules would drop
+    # faiss, which is imported lazily, and a second import of it crashes
+    previous = sys.modules.get("sentence_transformers")
+    sys.modules["sentence_transformers"] = module
+    if previous is None:
+        test.addCleanup(sys.modules.pop, "sentence_transformers", None)
+    else:
+        test.addCleanup(sys.modules.__setitem__, "sentence_transformers", previous)
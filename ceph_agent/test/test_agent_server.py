@@ -0,0 +1,128 @@
+import unittest
+import asyncio
+import os
+import tempfile
+import threading
+
+from agent_server import agentServer
+from agent_client import agentClient
+
+
+class stubController:
+    """Answers every query by echoing it, streaming one token per word."""
+    def handle_query(self, user_query, model_choice=None, session=None, on_token=None):
+        for word in user_query.split():
+            on_token(word + " ")
+        answer = f"{session.session_id}:{len(session.history)}:{user_query}"
+        result = {"query": user_query, "mode": "direct", "answer": answer, "success": True}
+        session.remember(result)
+        return result
+
+    def stats(self):
+        return {"queries": "n/a"}
+
+
+class serverTestCase(unittest.TestCase):
+    """Runs an agentServer on a Unix socket in a background loop."""
+    token = None
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.tmp_dir, "agent.sock")
+        self.server = agentServer(stubController(), max_concurrent_queries=2, token=self.token)
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        async def start():
+            self.unix_server = await asyncio.start_unix_server(self.server.handle_connection, self.socket_path)
+            ready.set()
+
+        def run():
+            self.loop.run_until_complete(start())
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        ready.wait(5)
+
+    def tearDown(self):
+        async def stop():
+            self.unix_server.close()
+            await self.unix_server.wait_closed()
+        asyncio.run_coroutine_threadsafe(stop(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        os.rmdir(self.tmp_dir)
+
+
+class TestAgentServer(serverTestCase):
+
+    def test_tokens_stream_and_session_context_persists(self):
+        client = agentClient(self.socket_path)
+        tokens = []
+        first = client.query("check cluster health", on_token=tokens.append)
+        second = client.query("list pools")
+        client.close()
+
+        self.assertEqual(tokens, ["check ", "cluster ", "health "])
+        self.assertTrue(first["answer"].endswith(":0:check cluster health"))
+        self.assertTrue(second["answer"].endswith(":1:list pools"))
+
+        # A new connection can resume the same session
+        resumed = agentClient(self.socket_path, session=client.session)
+        third = resumed.query("show osd tree")
+        resumed.close()
+        self.assertEqual(third["answer"], f"{client.session}:2:show osd tree")
+
+    def test_concurrent_sessions(self):
+        results = {}
+
+        def run(name):
+            client = agentClient(self.socket_path)
+            result = client.query(name)
+            results[name] = (client.session, result)
+            client.close()
+
+        threads = [threading.Thread(target=run, args=(f"query {i}",)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(len(results), 4)
+        self.assertEqual(len({session for session, _ in results.values()}), 4)
+        for name, (session, result) in results.items():
+            self.assertEqual(result["answer"], f"{session}:0:{name}")
+
+    def test_stats(self):
+        client = agentClient(self.socket_path)
+        self.assertEqual(client.stats(), {"queries": "n/a"})
+        client.close()
+
+
+class TestAgentServerToken(serverTestCase):
+    token = "s3cret"
+
+    def test_requests_without_the_token_are_rejected(self):
+        for token in (None, "wrong"):
+            client = agentClient(self.socket_path, token=token)
+            # Not picked up from CEPH_AGENT_SERVER_TOKEN either
+            client.token = token
+            with self.assertRaisesRegex(RuntimeError, "Unauthorized"):
+                client.query("check cluster health")
+            client.close()
+
+    def test_requests_with_the_token_are_served(self):
+        client = agentClient(self.socket_path, token="s3cret")
+        self.assertTrue(client.query("check cluster health")["success"])
+        client.close()
+
+    def test_tcp_listener_requires_a_token(self):
+        server = agentServer(stubController())
+        with self.assertRaises(ValueError):
+            asyncio.run(server.serve(host="127.0.0.1", port=0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,46 +1,64 @@
 import unittest
-from utils.file_ops import build_index, load_index, get_command_output_with_context
+import json
 import os
+import tempfile
+
+from utils.file_ops import vectorBuilder
+from rag.semantic_search import semanticCephSearch
+from test.helpers import use_fake_sentence_transformers
+
+
+SAMPLE_COMMANDS = [
+    {"command": "ceph osd df", "query_intent": "check osd usage", "description": "Shows OSD utilization and PG counts"},
+    {"command": "ceph -s", "query_intent": "cluster health", "description": "Overall cluster status"},
+    {"command": "ceph df", "query_intent": "pool capacity", "description": "Raw and per-pool storage"},
+    {"command": "rbd ls", "query_intent": "list block images", "description": "Lists RBD images in a pool"},
+]
+
 
 class TestCommandSelectionAndContextualization(unittest.TestCase):
 
     def setUp(self):
-        self.data_file = "sample_command_data.json"
-        self.index_dir = "test_faiss_index"
-        self.query = "How to check OSD usage?"
-        self.model = "llama3"
+        use_fake_sentence_transformers(self)
+        self.index_dir = tempfile.mkdtemp()
+        self.data_file = os.path.join(self.index_dir, "sample_command_data.json")
+        with open(self.data_file, "w") as f:
+            json.dump(SAMPLE_COMMANDS, f)
 
         # Build and load the index for testing
-        build_index(self.data_file, self.index_dir)
-        self.index, self.commands = load_index(self.index_dir)
+        self.vector_store = vectorBuilder(
+            json_path=self.data_file,
+            model_name="fake-minilm",
+            index_path=os.path.join(self.index_dir, "ceph_faiss.index"),
+            metadata_path=os.path.join(self.index_dir, "ceph_faiss_metadata.json")
+        )
+        # The fast path keeps decisive queries away from the LLM, so no client is needed
+        self.search = semanticCephSearch(
+            vector_store=self.vector_store,
+            top_k=3,
+            threshold=0.3,
+            selection_mode="single",
+            fast_path_min_score=0.5,
+            fast_path_min_margin=0.1,
+            client=object()
+        )
 
     def test_osd_usage_query(self):
-        response = get_command_output_with_context(
-            self.query,
-            self.index,
-            self.commands,
-            model=self.model,
-            top_k=5
-        )
-        self.assertTrue(isinstance(response, str))
-        self.assertIn("OSD", response.upper())
+        results, command = self.search.search_and_select("How to check OSD usage?", "o")
+        self.assertEqual(command, "ceph osd df")
+        self.assertEqual(results[0]["command"], "ceph osd df")
+        self.assertIn("OSD", results[0]["description"].upper())
 
     def test_invalid_query(self):
-        invalid_query = "Launch a satellite using ceph"
-        response = get_command_output_with_context(
-            invalid_query,
-            self.index,
-            self.commands,
-            model=self.model,
-            top_k=5
-        )
-        self.assertTrue(isinstance(response, str))
+        results, command = self.search.search_and_select("Launch a satellite using ceph", "o")
+        self.assertIsNone(results)
+        self.assertIsNone(command)
+
+    def test_batched_search_matches_single_search(self):
+        queries = ["How to check OSD usage?", "list block images"]
+        batched = self.search.search_many(queries)
+        self.assertEqual(batched, [self.search.search(query) for query in queries])
 
-    def tearDown(self):
-        if os.path.exists(self.index_dir):
-            for f in os.listdir(self.index_dir):
-                os.remove(os.path.join(self.index_dir, f))
-            os.rmdir(self.index_dir)
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,35 @@
+import json
+import sys
+import unittest
+
+from ceph.executor import commandStream, bufferedStream, STREAM_CHUNK_CHARS
+from agent.agentsList import AnalyzerAgent
+
+
+def python_command(code: str) -> str:
+    return f'"{sys.executable}" -c "{code}"'
+
+
+class TestCommandStream(unittest.TestCase):
+
+    def test_long_single_line_is_cut_not_dropped(self):
+        # One 200 KB line, like a `--format json` reply
+        stream = commandStream(python_command("print('x' * 200000)"), max_bytes=1000)
+        pieces = list(stream)
+        self.assertTrue(stream.truncated)
+        self.assertEqual(stream.returncode, 0)
+        self.assertEqual(stream.bytes_read, 200001)
+        self.assertTrue(pieces[-1].startswith("x" * 10))
+        self.assertIn("truncated after 1000 bytes", pieces[-1])
+        self.assertEqual("".join(pieces).count("x"), 1000)
+
+    def test_long_lines_arrive_in_pieces_and_are_reassembled(self):
+        data = json.dumps({"pools": [{"name": f"pool-{i}", "pg_num": 32} for i in range(5000)]})
+        self.assertGreater(len(data), STREAM_CHUNK_CHARS)
+        stream = bufferedStream(data + "\n", max_bytes=len(data) + 1)
+        self.assertGreater(len(list(bufferedStream(data + "\n"))), 1)
+        self.assertEqual(json.loads(AnalyzerAgent().collect_output(stream)), json.loads(data))
+
+
+if __name__ == "__main__":
+    unittest.main()
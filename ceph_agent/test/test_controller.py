@@ -0,0 +1,42 @@
+import unittest
+from types import SimpleNamespace
+
+from ceph.result_cache import commandResultCache
+from core.controller import agentController
+from rag.response_cache import semanticResponseCache
+from test.helpers import bag_of_words_encoder, fakeClock
+
+
+class TestCachedAnswers(unittest.TestCase):
+
+    def setUp(self):
+        clock = fakeClock()
+        result_cache = commandResultCache(clock=clock)
+        # Only the parts of the controller that the response cache path touches
+        self.controller = agentController.__new__(agentController)
+        self.controller.executor = SimpleNamespace(result_cache=result_cache)
+        self.controller.response_cache = semanticResponseCache(
+            bag_of_words_encoder(["osd.3", "status"]),
+            threshold=0.7,
+            result_cache=result_cache,
+            clock=clock
+        )
+        self.controller.response_cache.put("check osd.3 status", "ceph osd tree", [], "osd.3 is up")
+
+    def run_cached(self, query):
+        result = {"query": query, "mode": None, "answer": "", "success": False}
+        return self.controller._run_cached(query, "o", result, None), result
+
+    def test_repeat_of_a_read_only_query_is_answered(self):
+        handled, result = self.run_cached("check osd.3 status")
+        self.assertTrue(handled)
+        self.assertEqual(result["answer"], "osd.3 is up")
+
+    def test_state_changing_query_is_not_answered_from_a_read_only_entry(self):
+        handled, result = self.run_cached("mark osd.3 out")
+        self.assertFalse(handled)
+        self.assertNotIn("cached", result)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from utils.embedding_cache import embeddingCache
+
+
+def vector(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).random(8, dtype=np.float32)
+
+
+class TestEmbeddingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.disk_path = tempfile.mkdtemp()
+
+    def cache(self, **kwargs):
+        return embeddingCache("fake-minilm", disk_path=self.disk_path, **kwargs)
+
+    def test_hits_and_misses(self):
+        cache = embeddingCache("fake-minilm")
+        self.assertIsNone(cache.get("check cluster health"))
+        cache.put("check cluster health", False, vector(1))
+        np.testing.assert_array_equal(cache.get("  check  cluster\nhealth "), vector(1))
+        # The normalization flag is part of the key
+        self.assertIsNone(cache.get("check cluster health", normalize=True))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+
+    def test_memory_lru_is_bounded(self):
+        cache = embeddingCache("fake-minilm", max_entries=2)
+        for i in range(3):
+            cache.put(f"query {i}", False, vector(i))
+        self.assertIsNone(cache.get("query 0"))
+        self.assertIsNotNone(cache.get("query 2"))
+
+    def test_flushed_entries_survive_a_restart(self):
+        cache = self.cache()
+        cache.put("show osd tree", True, vector(2))
+        cache.put("pool usage", True, vector(3))
+        cache.flush()
+
+        reopened = self.cache()
+        np.testing.assert_array_equal(reopened.get("show osd tree", normalize=True), vector(2))
+        np.testing.assert_array_equal(reopened.get("pool usage", normalize=True), vector(3))
+        self.assertEqual(reopened.stats()["disk_hits"], 2)
+
+    def test_unflushed_entries_are_not_on_disk(self):
+        cache = self.cache()
+        cache.put("show osd tree", False, vector(2))
+        self.assertIsNone(self.cache().get("show osd tree"))
+
+    def test_partial_record_from_a_crash_is_dropped(self):
+        cache = self.cache()
+        cache.put("show osd tree", False, vector(2))
+        cache.flush()
+        with open(os.path.join(cache._disk_dir, "embeddings.bin"), "ab") as f:
+            f.write(b"\x01\x02\x03")
+
+        reopened = self.cache()
+        reopened.put("pool usage", False, vector(3))
+        reopened.flush()
+        again = self.cache()
+        np.testing.assert_array_equal(again.get("show osd tree"), vector(2))
+        np.testing.assert_array_equal(again.get("pool usage"), vector(3))
+
+    def test_disk_store_is_compacted_past_its_cap(self):
+        cache = self.cache(max_entries=2, max_disk_entries=8)
+        for i in range(8):
+            cache.put(f"query {i}", False, vector(i))
+            cache.flush()
+        self.assertEqual(cache.stats()["compactions"], 0)
+        # Used recently, so it is kept although it is the oldest entry
+        cache.get("query 0")
+        cache.put("query 8", False, vector(8))
+        cache.flush()
+
+        stats = cache.stats()
+        self.assertEqual(stats["compactions"], 1)
+        self.assertEqual(stats["disk_entries"], 6)
+        reopened = self.cache()
+        self.assertEqual(reopened.stats()["disk_entries"], 6)
+        np.testing.assert_array_equal(reopened.get("query 0"), vector(0))
+        np.testing.assert_array_equal(reopened.get("query 8"), vector(8))
+        self.assertIsNone(reopened.get("query 1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
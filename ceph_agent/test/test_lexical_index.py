@@ -0,0 +1,108 @@
+import unittest
+
+import numpy as np
+
+from utils.lexical_index import bm25Index, tokenize, reciprocal_rank_fusion
+from rag.semantic_search import semanticCephSearch, fast_path_decision
+
+
+RECORDS = {
+    0: {"command": "ceph -s", "query_intent": "check cluster health", "description": "Overall cluster status"},
+    1: {"command": "ceph pg stat", "query_intent": "placement group summary", "description": "Shows pg states"},
+    2: {"command": "ceph osd tree", "query_intent": "show osd tree", "description": "OSD hierarchy by host"},
+    3: {"command": "rbd ls", "query_intent": "list block images", "description": "Lists rbd images in a pool"},
+    4: {"command": "ceph fs status", "query_intent": "filesystem status", "description": "Shows mds ranks and cephfs state"},
+}
+
+
+class fakeMetadata(dict):
+    def ids(self):
+        return sorted(self)
+
+
+class fakeVectorStore:
+    """Dense search returns fixed similarities; the lexical side is a real bm25Index."""
+    def __init__(self, similarities):
+        self.metadata = fakeMetadata(RECORDS)
+        self.similarities = similarities
+        self.lexical_index = bm25Index(RECORDS.items())
+
+    def search(self, query_embeddings, k):
+        order = sorted(self.similarities, key=self.similarities.get, reverse=True)[:k]
+        return np.array([[self.similarities[i] for i in order]]), np.array([order])
+
+    def lexical_search(self, query, k):
+        return self.lexical_index.search(query, k)
+
+
+class TestBm25Index(unittest.TestCase):
+
+    def test_tokenizer_keeps_dotted_names_and_their_parts(self):
+        self.assertEqual(tokenize("Is osd.12 up?"), ["osd.12", "osd", "12", "up"])
+        self.assertEqual(tokenize("ceph osd tree"), ["osd", "tree"])
+
+    def test_exact_tokens_find_their_commands(self):
+        index = bm25Index(RECORDS.items())
+        self.assertEqual(index.search("how many PGs, pg stats", 2)[0][0], 1)
+        self.assertEqual(index.search("rbd images", 1)[0][0], 3)
+        self.assertEqual(index.search("which mds is active", 1)[0][0], 4)
+        self.assertEqual(index.search("unrelated words only", 3), [])
+
+    def test_reciprocal_rank_fusion(self):
+        fused = reciprocal_rank_fusion([["a", "b"], ["b", "c"]], k=60)
+        self.assertEqual(max(fused, key=fused.get), "b")
+        self.assertAlmostEqual(fused["c"], 1 / 62)
+
+
+class TestHybridSearch(unittest.TestCase):
+
+    def search(self, similarities, hybrid=True):
+        return semanticCephSearch(
+            vector_store=fakeVectorStore(similarities),
+            top_k=2,
+            threshold=0.5,
+            selection_mode="single",
+            client=object(),
+            hybrid=hybrid
+        )
+
+    def test_keyword_hit_missed_by_dense_search_is_added(self):
+        # Dense search ranks the cluster status first and barely sees `rbd ls`
+        similarities = {0: 0.71, 2: 0.55, 3: 0.2, 1: 0.1, 4: 0.05}
+        dense_only = self.search(similarities, hybrid=False)._search_embeddings(np.zeros((1, 4)), queries=["rbd images"])[0]
+        self.assertNotIn("rbd ls", [r["command"] for r in dense_only])
+
+        results = self.search(similarities)._search_embeddings(np.zeros((1, 4)), queries=["rbd images"])[0]
+        commands = [r["command"] for r in results]
+        self.assertIn("rbd ls", commands)
+        rbd = results[commands.index("rbd ls")]
+        # The dense score is kept as is, the fused rank is reported next to it
+        self.assertAlmostEqual(rbd["score"], 0.2, places=5)
+        self.assertIn("rrf_score", rbd)
+        self.assertIn("bm25_score", rbd)
+
+    def test_results_agreeing_in_both_lists_rank_first(self):
+        similarities = {0: 0.6, 1: 0.58, 2: 0.3, 3: 0.1, 4: 0.05}
+        results = self.search(similarities)._search_embeddings(np.zeros((1, 4)), queries=["pg states"])[0]
+        self.assertEqual(results[0]["command"], "ceph pg stat")
+        self.assertGreater(results[0]["rrf_score"], results[1]["rrf_score"])
+
+    def test_keyword_only_hit_does_not_decide_the_fast_path(self):
+        # A clear dense winner, a close dense runner-up, and a keyword-only
+        # hit that outranks the runner-up in the fused list
+        similarities = {0: 0.9, 2: 0.6, 1: 0.1, 4: 0.05, 3: 0.01}
+        dense_only = self.search(similarities, hybrid=False)._search_embeddings(np.zeros((1, 4)), queries=["rbd images"])[0]
+        results = self.search(similarities)._search_embeddings(np.zeros((1, 4)), queries=["rbd images"])[0]
+
+        commands = [r["command"] for r in results]
+        self.assertEqual(commands, ["ceph -s", "rbd ls"])
+        self.assertFalse(results[1]["dense"])
+        self.assertEqual(
+            fast_path_decision(results, min_score=0.75, min_margin=0.35),
+            fast_path_decision(dense_only, min_score=0.75, min_margin=0.35)
+        )
+        self.assertIsNone(fast_path_decision(results, min_score=0.75, min_margin=0.35)[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
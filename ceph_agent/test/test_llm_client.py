@@ -0,0 +1,51 @@
+import asyncio
+import unittest
+
+from llm.llm_response import llmClientPool
+
+
+class statusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class scriptedPool(llmClientPool):
+    """Pool whose requests raise the scripted errors in turn, then answer."""
+    def __init__(self, errors):
+        super().__init__(retries=2, retry_backoff=0)
+        self.errors = list(errors)
+        self.calls = 0
+
+    def _get_client(self, backend):
+        return None, asyncio.Semaphore(1)
+
+    async def _request(self, backend, client, model, messages, options):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+class TestRetries(unittest.TestCase):
+
+    def pool(self, errors):
+        pool = scriptedPool(errors)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_timeouts_and_server_errors_are_retried(self):
+        pool = self.pool([asyncio.TimeoutError(), statusError(503)])
+        self.assertEqual(pool.chat("ollama", "m", []), "ok")
+        self.assertEqual(pool.calls, 3)
+
+    def test_other_errors_are_raised_without_retrying(self):
+        for error in (KeyError("message"), TypeError("bad response"), statusError(404)):
+            pool = self.pool([error])
+            with self.assertRaises(type(error)):
+                pool.chat("ollama", "m", [])
+            self.assertEqual(pool.calls, 1, repr(error))
+
+
+if __name__ == "__main__":
+    unittest.main()
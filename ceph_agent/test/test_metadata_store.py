@@ -0,0 +1,54 @@
+import unittest
+import os
+import tempfile
+
+from utils.metadata_store import compactMetadataStore
+
+
+class TestCompactMetadataStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "ceph_faiss_metadata.bin")
+        self.records = [
+            {"id": 7, "command": "ceph osd tree", "query_intent": "show osd tree", "description": "OSD hierarchy"},
+            {"id": 0, "command": "ceph -s", "query_intent": "check cluster health", "description": "Cluster status ✅"},
+            {"id": 3, "command": "ceph df", "query_intent": "", "description": "Pool usage"},
+        ]
+        compactMetadataStore.write(self.path, self.records)
+        self.store = compactMetadataStore(self.path)
+
+    def test_lookup_by_id(self):
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual(self.store[7]["command"], "ceph osd tree")
+        self.assertEqual(self.store[0]["description"], "Cluster status ✅")
+        self.assertEqual(self.store[3]["query_intent"], "")
+        self.assertEqual(self.store[3]["id"], 3)
+
+    def test_missing_id(self):
+        self.assertNotIn(5, self.store)
+        self.assertIsNone(self.store.get(5))
+        with self.assertRaises(KeyError):
+            self.store[5]
+
+    def test_iteration_is_sorted_by_id(self):
+        self.assertEqual(self.store.ids(), [0, 3, 7])
+        self.assertEqual([r["command"] for r in self.store.values()], ["ceph -s", "ceph df", "ceph osd tree"])
+
+    def test_rewrite_keeps_open_store_consistent(self):
+        compactMetadataStore.write(self.path, self.records[:1])
+        # The already mapped file is unaffected by the replacement
+        self.assertEqual(self.store[0]["command"], "ceph -s")
+        reopened = compactMetadataStore(self.path)
+        self.assertEqual(len(reopened), 1)
+        reopened.close()
+
+    def tearDown(self):
+        self.store.close()
+        for f in os.listdir(self.tmp_dir):
+            os.remove(os.path.join(self.tmp_dir, f))
+        os.rmdir(self.tmp_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import os
+import tempfile
+import unittest
+
+from core.mode_classifier import modeClassifier, detect_destructive, detect_mutating, DEFAULT_EXAMPLES_PATH
+from test.helpers import bag_of_words_encoder
+
+
+VOCABULARY = ["check", "cluster", "health", "show", "osd", "tree", "list", "pools",
+              "troubleshoot", "slow", "repair", "pgs", "find", "and"]
+
+
+class TestModeClassifier(unittest.TestCase):
+
+    def setUp(self):
+        examples = [
+            {"query": "check cluster health", "mode": "direct"},
+            {"query": "show osd tree", "mode": "direct"},
+            {"query": "list pools", "mode": "direct"},
+            {"query": "troubleshoot slow cluster", "mode": "planning"},
+            {"query": "find and repair pgs", "mode": "planning"},
+        ]
+        fd, self.examples_path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(examples, f)
+
+        self.llm_calls = []
+
+        def llm_fallback(query):
+            self.llm_calls.append(query)
+            return {"mode": "planning", "safety": "safe", "steps": [{"id": 1, "goal": query, "depends_on": []}]}
+
+        self.classifier = modeClassifier(
+            bag_of_words_encoder(VOCABULARY), llm_fallback, examples_path=self.examples_path, k=3,
+            min_confidence=0.7, min_similarity=0.5
+        )
+
+    def tearDown(self):
+        os.remove(self.examples_path)
+
+    def test_confident_direct_query_skips_the_llm(self):
+        decision = self.classifier.classify("check the cluster health")
+        self.assertEqual((decision["mode"], decision["safety"], decision["source"]), ("direct", "safe", "local"))
+        self.assertEqual(self.llm_calls, [])
+
+    def test_planning_and_unknown_queries_fall_back_to_the_llm(self):
+        self.assertEqual(self.classifier.classify("troubleshoot slow cluster")["source"], "llm")
+        self.assertEqual(self.classifier.classify("what time is it")["source"], "llm")
+        self.assertEqual(len(self.llm_calls), 2)
+
+    def test_destructive_keywords_are_unsafe_without_the_llm(self):
+        decision = self.classifier.classify("Purge osd.3 from the cluster")
+        self.assertEqual((decision["safety"], decision["source"]), ("unsafe", "keyword"))
+        self.assertIn("purge", decision["warning"])
+        self.assertEqual(detect_destructive("why was osd.3 removed?"), None)
+        self.assertEqual(detect_destructive("mark osd.7 as lost"), "mark osd.7 as lost")
+        self.assertEqual(self.llm_calls, [])
+
+    def test_state_changing_queries_are_never_decided_locally(self):
+        for query in ("restart osd.3", "mark osd.5 out", "set the noout flag", "reweight osd.2 to 0",
+                      "set pool size 1", "disable the module", "mute the warning", "check cluster health and restart"):
+            self.assertIsNone(detect_destructive(query), query)
+            self.assertIsNotNone(detect_mutating(query), query)
+            self.assertEqual(self.classifier.classify(query)["source"], "llm", query)
+        self.assertEqual(len(self.llm_calls), 8)
+
+    def test_decisions_are_cached_by_normalized_query(self):
+        self.classifier.classify("troubleshoot slow cluster")
+        decision = self.classifier.classify("  Troubleshoot   SLOW cluster? ")
+        self.assertEqual(decision["source"], "cache")
+        self.assertEqual(decision["mode"], "planning")
+        self.assertEqual(len(self.llm_calls), 1)
+        self.assertEqual(self.classifier.stats()["cache"], 1)
+
+    def test_shipped_examples_are_well_formed(self):
+        with open(DEFAULT_EXAMPLES_PATH, "r", encoding="utf-8") as f:
+            examples = json.load(f)
+        self.assertEqual({example["mode"] for example in examples}, {"direct", "planning"})
+        self.assertTrue(all(detect_destructive(example["query"]) is None for example in examples))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import json
+
+from core.output_reducer import outputReducer, estimate_tokens
+
+
+class TestOutputReducer(unittest.TestCase):
+
+    def setUp(self):
+        self.reducer = outputReducer(max_tokens=200)
+
+    def test_prepare_command(self):
+        self.assertEqual(self.reducer.prepare_command("ceph osd tree"), "ceph osd tree --format json")
+        self.assertEqual(self.reducer.prepare_command("ceph df -f plain"), "ceph df -f plain")
+        self.assertEqual(self.reducer.prepare_command("ceph -w"), "ceph -w")
+        self.assertEqual(self.reducer.prepare_command("rados df"), "rados df")
+
+    def test_extractor_keeps_relevant_fields(self):
+        status = {
+            "fsid": "abc",
+            "health": {"status": "HEALTH_WARN", "checks": {
+                "OSD_DOWN": {"severity": "HEALTH_WARN", "summary": {"message": "1 osds down", "count": 1}, "muted": False}
+            }},
+            "osdmap": {"epoch": 50, "num_osds": 3, "num_up_osds": 2, "num_in_osds": 3, "osd_in_since": 1700000000},
+            "servicemap": {"services": {"rgw": {"daemons": {"summary": ""}}}},
+        }
+        reduced = json.loads(self.reducer.reduce("is anything down?", "ceph -s --format json", json.dumps(status)))
+        self.assertEqual(reduced["health"], "HEALTH_WARN")
+        self.assertEqual(reduced["checks"]["OSD_DOWN"]["summary"], "1 osds down")
+        self.assertEqual(reduced["osds"]["num_up_osds"], 2)
+        self.assertNotIn("fsid", reduced)
+        self.assertNotIn("servicemap", reduced)
+
+    def test_large_output_is_cut_to_the_budget(self):
+        nodes = [{"id": i, "name": f"osd.{i}", "type": "osd", "status": "up", "reweight": 1.0} for i in range(200)]
+        nodes[150]["status"] = "down"
+        output = json.dumps({"nodes": nodes}, indent=2)
+        reduced = self.reducer.reduce("which osd is down", "ceph osd tree --format json", output)
+        self.assertLessEqual(estimate_tokens(reduced), 220)
+        self.assertIn('"osd.150"', reduced)
+        stats = self.reducer.stats()
+        self.assertGreater(stats["saved_pct"], 80)
+
+    def test_truncated_json_keeps_data_within_the_budget(self):
+        nodes = [{"id": i, "name": f"osd.{i}", "status": "up"} for i in range(2000)]
+        output = json.dumps({"nodes": nodes})[:20000] + "\n[... output truncated after 20000 bytes ...]"
+        reduced = self.reducer.reduce("is osd.12 up", "ceph osd tree --format json", output)
+        self.assertLessEqual(estimate_tokens(reduced), 220)
+        self.assertIn('"osd.12"', reduced)
+
+    def test_small_plain_text_is_untouched(self):
+        self.assertEqual(self.reducer.reduce("health", "ceph health", "HEALTH_OK"), "HEALTH_OK")
+
+
+if __name__ == "__main__":
+    unittest.main()
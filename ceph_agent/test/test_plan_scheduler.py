@@ -0,0 +1,91 @@
+import unittest
+import threading
+import time
+
+from core.plan_scheduler import planScheduler, normalize_plan
+
+
+class TestNormalizePlan(unittest.TestCase):
+
+    def test_string_steps_run_in_sequence(self):
+        plan = normalize_plan(["Check health", "List pools"])
+        self.assertEqual(plan[0], {"id": 1, "goal": "Check health", "depends_on": []})
+        self.assertEqual(plan[1]["depends_on"], [1])
+
+    def test_explicit_dependencies(self):
+        plan = normalize_plan([
+            {"id": 1, "goal": "Check OSDs", "depends_on": []},
+            {"id": 2, "goal": "Check pools", "depends_on": []},
+            {"id": 3, "goal": "Repair PGs", "depends_on": [1, 2]},
+        ])
+        self.assertEqual([s["depends_on"] for s in plan], [[], [], [1, 2]])
+
+    def test_forward_and_unknown_references_are_dropped(self):
+        plan = normalize_plan([
+            {"id": 1, "goal": "a", "depends_on": [2]},
+            {"id": 2, "goal": "b", "depends_on": [7, 1]},
+        ])
+        self.assertEqual([s["depends_on"] for s in plan], [[], [1]])
+
+
+class TestPlanScheduler(unittest.TestCase):
+
+    def test_independent_steps_overlap_and_results_keep_plan_order(self):
+        plan = normalize_plan([
+            {"id": 1, "goal": "slow", "depends_on": []},
+            {"id": 2, "goal": "fast", "depends_on": []},
+            {"id": 3, "goal": "after both", "depends_on": [1, 2]},
+        ])
+        barrier = threading.Barrier(2, timeout=5)
+        seen_deps = {}
+
+        def run_step(step, dependency_results):
+            seen_deps[step["id"]] = sorted(dependency_results)
+            if step["id"] in (1, 2):
+                # Both independent steps must be running at the same time to get past this
+                barrier.wait()
+                if step["id"] == 1:
+                    time.sleep(0.05)
+            return True, {"goal": step["goal"]}
+
+        results, ok = planScheduler(max_workers=3).run(plan, run_step)
+        self.assertTrue(ok)
+        self.assertEqual([step["id"] for step, _ in results], [1, 2, 3])
+        self.assertEqual(seen_deps[3], [1, 2])
+
+    def test_concurrency_cap(self):
+        plan = normalize_plan([{"id": i, "goal": str(i), "depends_on": []} for i in range(1, 7)])
+        lock = threading.Lock()
+        active = [0, 0]  # current, peak
+
+        def run_step(step, dependency_results):
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            return True, {}
+
+        _, ok = planScheduler(max_workers=2).run(plan, run_step)
+        self.assertTrue(ok)
+        self.assertLessEqual(active[1], 2)
+
+    def test_failure_stops_dependent_steps(self):
+        plan = normalize_plan(["first", "second", "third"])
+        ran = []
+
+        def run_step(step, dependency_results):
+            ran.append(step["id"])
+            if step["id"] == 2:
+                raise RuntimeError("command failed")
+            return True, {}
+
+        results, ok = planScheduler().run(plan, run_step)
+        self.assertFalse(ok)
+        self.assertEqual(ran, [1, 2])
+        self.assertEqual(results[-1][1]["error"], "command failed")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+from llm.prompts import (
+    planner_messages, judge_messages, selector_messages, structured_selection_messages,
+    analysis_messages, synthesis_messages, prompt_kind
+)
+from llm.llm_response import promptEvalStats
+
+
+COMMANDS = [
+    {"command": "ceph -s", "description": "Cluster status"},
+    {"command": "ceph osd tree", "description": "OSD hierarchy"},
+]
+
+
+class TestPromptLayout(unittest.TestCase):
+
+    def builders(self, query):
+        return {
+            "planner": planner_messages(query),
+            "judge": judge_messages(query, COMMANDS),
+            "selector": selector_messages(query, COMMANDS),
+            "structured_selection": structured_selection_messages(query, COMMANDS),
+            "analyzer": analysis_messages(query, "ceph -s", "HEALTH_OK", "Cluster status", output_age=12),
+            "synthesis": synthesis_messages(query, {"step_1": {"summary": "ok"}}),
+        }
+
+    def test_static_system_message_comes_first_and_never_varies(self):
+        first = self.builders("is osd.7 flapping")
+        second = self.builders("list all the pools")
+        for kind, messages in first.items():
+            self.assertEqual([m["role"] for m in messages], ["system", "user"], kind)
+            self.assertEqual(messages[0]["content"], second[kind][0]["content"], kind)
+            self.assertNotIn("is osd.7 flapping", messages[0]["content"], kind)
+            self.assertIn("is osd.7 flapping", messages[1]["content"], kind)
+            self.assertEqual(prompt_kind(messages), kind)
+
+    def test_variable_data_is_in_the_user_message(self):
+        messages = self.builders("q")
+        self.assertIn("<name>ceph osd tree</name>", messages["selector"][1]["content"])
+        self.assertIn("- Command: ceph osd tree", messages["judge"][1]["content"])
+        self.assertIn("cached 12 seconds ago", messages["analyzer"][1]["content"])
+        self.assertEqual(prompt_kind([{"role": "user", "content": "q"}]), "other")
+
+    def test_prompt_eval_stats_average_per_kind(self):
+        stats = promptEvalStats()
+        stats.record_ollama("planner", {"prompt_eval_count": 600, "prompt_eval_duration": 300_000_000, "load_duration": 0})
+        stats.record_ollama("planner", {"prompt_eval_count": 10, "prompt_eval_duration": 10_000_000})
+        self.assertEqual(stats.as_dict()["planner"], {
+            "calls": 2, "prompt_tokens_mean": 305.0, "prompt_eval_ms_mean": 155.0, "load_ms_total": 0.0
+        })
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import errno
+import json
+
+from ceph.executor import radosBackend
+from ceph.fake_cluster import fakeRadosCluster
+
+
+class recordingBackend:
+    """Fallback that records what it was asked to run instead of spawning the CLI."""
+    name = "recording"
+
+    def __init__(self):
+        self.commands = []
+
+    def execute(self, cmd):
+        self.commands.append(cmd)
+        return "cli output", "", 0
+
+    def stream(self, cmd, max_bytes=None):
+        raise AssertionError("not expected")
+
+
+class TestRadosBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.cluster = fakeRadosCluster()
+        self.fallback = recordingBackend()
+        self.backend = radosBackend(cluster=self.cluster, fallback=self.fallback)
+
+    def test_status_flag_maps_to_status_prefix(self):
+        stdout, stderr, retcode = self.backend.execute("ceph -s")
+        self.assertEqual(retcode, 0)
+        self.assertEqual(json.loads(stdout)["health"]["status"], "HEALTH_OK")
+        self.assertEqual(self.cluster.sent[-1], {"prefix": "status", "format": "json"})
+
+    def test_positional_arguments_follow_the_signature(self):
+        self.backend.execute("ceph osd pool get rbd size --format json-pretty")
+        self.assertEqual(
+            self.cluster.sent[-1],
+            {"prefix": "osd pool get", "pool": "rbd", "var": "size", "format": "json-pretty"}
+        )
+
+    def test_optional_choice_argument(self):
+        self.backend.execute("ceph health detail")
+        self.assertEqual(self.cluster.sent[-1], {"prefix": "health", "detail": "detail", "format": "json"})
+        self.backend.execute("ceph health")
+        self.assertEqual(self.cluster.sent[-1], {"prefix": "health", "format": "json"})
+
+    def test_untranslatable_commands_use_the_fallback(self):
+        for cmd in ("ceph -w", "ceph orch ps", "rados df"):
+            stdout, _, _ = self.backend.execute(cmd)
+            self.assertEqual(stdout, "cli output")
+        self.assertEqual(self.fallback.commands, ["ceph -w", "ceph orch ps", "rados df"])
+        self.assertEqual(self.cluster.sent, [])
+
+    def test_errors_become_positive_return_codes(self):
+        cluster = fakeRadosCluster(responses={})
+        backend = radosBackend(cluster=cluster, fallback=self.fallback)
+        _, stderr, retcode = backend.execute("ceph osd tree")
+        self.assertEqual(retcode, errno.EINVAL)
+        self.assertIn("osd tree", stderr)
+
+    def test_stream_interface(self):
+        stream = self.backend.stream("ceph osd pool ls", max_bytes=1024)
+        self.assertEqual(json.loads(stream.read_all()), ["rbd", ".mgr"])
+        self.assertEqual(stream.returncode, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+
+from ceph.result_cache import commandResultCache
+from rag.response_cache import semanticResponseCache, query_identifiers
+from test.helpers import bag_of_words_encoder, fakeClock
+
+
+VOCABULARY = ["cluster", "health", "healthy", "check", "osd", "tree", "pool", "usage", "is", "the"]
+
+
+class TestSemanticResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = fakeClock()
+        self.cache = semanticResponseCache(
+            bag_of_words_encoder(VOCABULARY),
+            threshold=0.7,
+            result_cache=commandResultCache(clock=self.clock),
+            reanalyze_window=300,
+            clock=self.clock
+        )
+
+    def test_similar_query_is_served_while_fresh(self):
+        self.cache.put("check the cluster health", "ceph -s", [], "HEALTH_OK")
+        entry, similarity, fresh = self.cache.lookup("is the cluster healthy? check health")
+        self.assertIsNotNone(entry)
+        self.assertTrue(fresh)
+        self.assertGreaterEqual(similarity, 0.7)
+        self.assertEqual(entry.answer, "HEALTH_OK")
+        self.assertIsNone(self.cache.lookup("show osd tree")[0])
+
+    def test_stale_match_is_reanalyzed_then_dropped(self):
+        self.cache.put("check cluster health", "ceph -s", [], "HEALTH_OK")
+        # `ceph status` results live for 10s, so the answer does too
+        self.clock.now += 11
+        entry, _, fresh = self.cache.lookup("check cluster health")
+        self.assertEqual(entry.command, "ceph -s")
+        self.assertFalse(fresh)
+        self.clock.now += 300
+        self.assertIsNone(self.cache.lookup("check cluster health")[0])
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_cluster_change_and_cached_output_age_count_against_freshness(self):
+        self.cache.put("check cluster health", "ceph -s", [], "HEALTH_OK", epoch=0)
+        self.assertFalse(self.cache.lookup("check cluster health", epoch=1)[2])
+        # The output was already 9s old when analyzed
+        self.cache.put("show osd tree", "ceph status", [], "ok", output_age=9)
+        self.clock.now += 2
+        self.assertFalse(self.cache.lookup("show osd tree")[2])
+
+    def test_only_read_only_commands_and_matching_identifiers(self):
+        self.cache.put("check pool usage", "ceph osd pool create foo", [], "created")
+        self.assertIsNone(self.cache.lookup("check pool usage")[0])
+
+        self.cache.put("check osd.3 health", "ceph osd tree", [], "osd.3 is up")
+        self.assertIsNone(self.cache.lookup("check osd.4 health")[0])
+        self.assertIsNotNone(self.cache.lookup("check health osd.3")[0])
+        self.assertEqual(query_identifiers("is OSD.3 in pg 1.2f?"), {"osd.3", "1.2f"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+
+from ceph.result_cache import commandResultCache
+from ceph.executor import radosBackend
+from ceph.fake_cluster import fakeRadosCluster
+from agent.agentsList import ExecutorAgent
+from test.helpers import fakeClock
+
+
+class TestCommandResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = fakeClock()
+        self.cache = commandResultCache(clock=self.clock)
+
+    def test_equivalent_commands_share_an_entry(self):
+        self.cache.put("ceph -s", "HEALTH_OK", "", 0)
+        self.assertIsNotNone(self.cache.get("ceph status"))
+        self.assertIsNotNone(self.cache.get("ceph   -s"))
+        # A different output format is a different result
+        self.assertIsNone(self.cache.get("ceph -s --format json"))
+
+    def test_entries_expire_after_their_ttl(self):
+        self.cache.put("ceph osd tree", "tree", "", 0)
+        self.clock.now += 30
+        stdout, _, _, age = self.cache.get("ceph osd tree")
+        self.assertEqual(stdout, "tree")
+        self.assertEqual(age, 30)
+        self.clock.now += 31
+        self.assertIsNone(self.cache.get("ceph osd tree"))
+
+    def test_only_allowlisted_successful_results_are_cached(self):
+        self.cache.put("ceph osd pool create foo", "", "", 0)
+        self.cache.put("ceph df", "", "error", 1)
+        self.cache.put("ceph -w", "", "", 0)
+        self.assertEqual(self.cache.stats()["entries"], 0)
+        self.assertTrue(self.cache.is_cacheable("ceph osd pool get rbd size"))
+
+    def test_allowlist_matches_whole_subcommands(self):
+        for cmd in ("ceph health mute OSD_DOWN", "ceph health unmute OSD_DOWN",
+                    "ceph osd pool get rbd size extra", "ceph osd tree set", "rbd ls pool image"):
+            self.assertFalse(self.cache.is_cacheable(cmd), cmd)
+        for cmd in ("ceph health detail", "ceph osd pool ls detail", "rados df", "rbd ls", "rbd ls rbd"):
+            self.assertTrue(self.cache.is_cacheable(cmd), cmd)
+
+    def test_read_only_non_ceph_commands_do_not_invalidate(self):
+        self.cache.put("ceph osd tree", "tree", "", 0)
+        self.cache.note_executed("rados df")
+        self.cache.note_executed("rbd ls --format json")
+        self.assertIsNotNone(self.cache.get("ceph osd tree"))
+        self.cache.note_executed("ceph health mute OSD_DOWN")
+        self.assertIsNone(self.cache.get("ceph osd tree"))
+
+    def test_mutating_command_invalidates(self):
+        self.cache.put("ceph osd tree", "tree", "", 0)
+        self.cache.note_executed("ceph df")
+        self.assertIsNotNone(self.cache.get("ceph osd tree"))
+        self.cache.note_executed("ceph osd out 3")
+        self.assertIsNone(self.cache.get("ceph osd tree"))
+        self.assertEqual(self.cache.stats()["invalidations"], 1)
+
+
+class TestExecutorAgentCaching(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = fakeClock()
+        self.cluster = fakeRadosCluster()
+        self.executor = ExecutorAgent(
+            backend=radosBackend(cluster=self.cluster),
+            result_cache=commandResultCache(clock=self.clock)
+        )
+
+    def test_repeated_run_is_served_from_cache(self):
+        first = self.executor.run_with_age("ceph osd tree")
+        self.clock.now += 5
+        second = self.executor.run_with_age("ceph osd tree")
+        self.assertIsNone(first[3])
+        self.assertEqual(second[3], 5)
+        self.assertEqual(first[0], second[0])
+        self.assertEqual(len(self.cluster.sent), 1)
+
+    def test_stream_fills_the_cache(self):
+        stream = self.executor.run_stream("ceph df")
+        output = stream.read_all()
+        self.assertIsNone(stream.cache_age)
+        cached = self.executor.run_stream("ceph df")
+        self.assertEqual(cached.read_all(), output)
+        self.assertEqual(cached.cache_age, 0)
+        self.assertEqual(len(self.cluster.sent), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from ceph.result_cache import commandResultCache
+from core.speculation import speculativeRun
+
+
+CANDIDATES = [
+    {"score": 0.61, "command": "ceph osd tree"},
+    {"score": 0.83, "command": "ceph -s"},
+]
+
+
+class TestSpeculativeRun(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ThreadPoolExecutor(max_workers=2)
+        self.executed = []
+        self.is_cacheable = commandResultCache().is_cacheable
+
+    def tearDown(self):
+        self.pool.shutdown(wait=True)
+
+    def test_top_read_only_candidate_is_run_after_search(self):
+        run = speculativeRun(
+            "check health", self.pool,
+            search=lambda q: CANDIDATES,
+            execute=self.executed.append,
+            prepare_command=lambda c: c + " --format json",
+            is_cacheable=self.is_cacheable
+        )
+        self.assertEqual(run.candidates(), CANDIDATES)
+        run.wait_for("ceph -s --format json")
+        self.assertEqual(self.executed, ["ceph -s --format json"])
+
+    def test_commands_outside_the_allowlist_are_never_run(self):
+        run = speculativeRun(
+            "make a pool", self.pool,
+            search=lambda q: [{"score": 0.9, "command": "ceph osd pool create foo"}],
+            execute=self.executed.append,
+            is_cacheable=self.is_cacheable
+        )
+        self.assertEqual(len(run.candidates()), 1)
+        run.wait_for("ceph osd pool create foo")
+        self.assertIsNone(run.command)
+        self.assertEqual(self.executed, [])
+
+    def test_extensions_of_read_only_commands_are_never_run(self):
+        run = speculativeRun(
+            "mute the OSD_DOWN warning", self.pool,
+            search=lambda q: [{"score": 0.9, "command": "ceph health mute OSD_DOWN"}],
+            execute=self.executed.append,
+            is_cacheable=self.is_cacheable
+        )
+        run.wait_for("ceph health mute OSD_DOWN")
+        self.assertIsNone(run.command)
+        self.assertEqual(self.executed, [])
+
+    def test_discard_before_execution_skips_it(self):
+        release = threading.Event()
+
+        def slow_search(query):
+            release.wait(5)
+            return CANDIDATES
+
+        run = speculativeRun("check health", self.pool, search=slow_search,
+                             execute=self.executed.append, is_cacheable=self.is_cacheable)
+        run.discard()
+        release.set()
+        self.pool.shutdown(wait=True)
+        self.assertEqual(self.executed, [])
+
+    def test_failed_search_falls_back_to_normal_retrieval(self):
+        def broken_search(query):
+            raise RuntimeError("index not loaded")
+
+        run = speculativeRun("check health", self.pool, search=broken_search)
+        self.assertIsNone(run.candidates())
+        self.assertIsInstance(run.error, RuntimeError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from ceph.remote import sshConnectionPool, sshTarget
+
+
+class slowStartPool(sshConnectionPool):
+    """Pool whose master start for `slow-host` blocks until released."""
+    def __init__(self):
+        super().__init__(control_dir=tempfile.mkdtemp())
+        self.release = threading.Event()
+        self.started = []
+
+    def _is_alive(self, target):
+        return target.key in self.started
+
+    def _start_master(self, target):
+        if target.host == "slow-host":
+            self.release.wait(10)
+        self.started.append(target.key)
+        return True
+
+
+class TestSshConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = slowStartPool()
+        self.addCleanup(self.pool.release.set)
+
+    def test_slow_host_does_not_block_other_hosts(self):
+        slow = threading.Thread(target=self.pool.command_args, args=(sshTarget("slow-host"), "ceph -s"))
+        slow.start()
+        time.sleep(0.1)
+
+        start = time.monotonic()
+        args = self.pool.command_args(sshTarget("fast-host"), "ceph -s")
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertIn("ControlMaster=no", args)
+
+        self.pool.release.set()
+        slow.join(10)
+        self.assertEqual(sorted(self.pool.started), ["root@fast-host:22", "root@slow-host:22"])
+
+    def test_concurrent_commands_start_one_master_per_host(self):
+        target = sshTarget("slow-host")
+        threads = [threading.Thread(target=self.pool.command_args, args=(target, "ceph df")) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        self.pool.release.set()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(self.pool.started, ["root@slow-host:22"])
+
+
+class TestSshTargetFromEnv(unittest.TestCase):
+
+    def test_unset_host_means_local_execution(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertIsNone(sshTarget.from_env())
+
+    def test_key_is_only_used_when_configured(self):
+        with mock.patch.dict(os.environ, {"CEPH_AGENT_SSH_HOST": "mon1"}, clear=True):
+            target = sshTarget.from_env()
+        self.assertIsNone(target.key_path)
+        self.assertEqual(target.ssh_args(), ["-p", "22", "root@mon1"])
+        with mock.patch.dict(os.environ, {"CEPH_AGENT_SSH_HOST": "mon1", "CEPH_AGENT_SSH_KEY": "/etc/ceph-agent/id_ed25519"}):
+            self.assertEqual(sshTarget.from_env().key_path, "/etc/ceph-agent/id_ed25519")
+
+
+if __name__ == "__main__":
+    unittest.main()
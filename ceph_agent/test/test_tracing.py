@@ -0,0 +1,76 @@
+import unittest
+import json
+import os
+import tempfile
+import threading
+
+from utils.tracing import pipelineTracer, _current_span
+
+
+class TestPipelineTracer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "trace.jsonl")
+        self.tracer = pipelineTracer(enabled=True, export_path=self.path, print_waterfall=False)
+
+    def test_disabled_tracer_returns_a_shared_noop(self):
+        tracer = pipelineTracer(enabled=False)
+        first = tracer.span("a", x=1)
+        self.assertIs(first, tracer.span("b"))
+        with first as span:
+            span.set(y=2)
+        self.assertIsNone(_current_span.get())
+
+    def test_nesting_and_export(self):
+        with self.tracer.span("query", query="check health") as root:
+            with self.tracer.span("retrieve") as retrieve:
+                with self.tracer.span("encode"):
+                    pass
+            with self.tracer.span("execute") as execute:
+                execute.set(output_bytes=42)
+
+        with open(self.path) as f:
+            spans = {s["name"]: s for s in map(json.loads, f)}
+        self.assertEqual(set(spans), {"query", "retrieve", "encode", "execute"})
+        self.assertIsNone(spans["query"]["parent_id"])
+        self.assertEqual(spans["retrieve"]["parent_id"], root.span_id)
+        self.assertEqual(spans["encode"]["parent_id"], retrieve.span_id)
+        self.assertEqual(spans["execute"]["attributes"], {"output_bytes": 42})
+        self.assertEqual(len({s["trace_id"] for s in spans.values()}), 1)
+
+    def test_errors_are_recorded(self):
+        with self.assertRaises(RuntimeError):
+            with self.tracer.span("query"):
+                raise RuntimeError("boom")
+        with open(self.path) as f:
+            span = json.loads(f.readline())
+        self.assertEqual(span["attributes"]["error"], "RuntimeError: boom")
+
+    def test_waterfall_lists_children_under_parents(self):
+        spans = []
+        self.tracer._finish = spans.append
+        with self.tracer.span("query"):
+            with self.tracer.span("classify"):
+                pass
+        text = pipelineTracer.waterfall(spans)
+        lines = text.splitlines()
+        self.assertTrue(lines[1].startswith("query"))
+        self.assertTrue(lines[2].startswith("  classify"))
+
+    def test_threads_without_context_start_new_traces(self):
+        seen = []
+        with self.tracer.span("query"):
+            thread = threading.Thread(target=lambda: seen.append(_current_span.get()))
+            thread.start()
+            thread.join()
+        self.assertEqual(seen, [None])
+
+    def tearDown(self):
+        for f in os.listdir(self.tmp_dir):
+            os.remove(os.path.join(self.tmp_dir, f))
+        os.rmdir(self.tmp_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
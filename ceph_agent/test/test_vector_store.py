@@ -0,0 +1,80 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from utils.file_ops import vectorBuilder
+from test.helpers import use_fake_sentence_transformers
+
+
+CATALOG = [
+    {"command": "ceph -s", "query_intent": "check cluster health", "description": "Overall cluster status"},
+    {"command": "ceph osd tree", "query_intent": "show osd tree", "description": "OSD hierarchy by host"},
+    {"command": "ceph df", "query_intent": "pool usage", "description": "Raw and per-pool usage"},
+]
+
+
+class TestVectorBuilder(unittest.TestCase):
+
+    def setUp(self):
+        use_fake_sentence_transformers(self)
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.json_path = os.path.join(self.tmp_dir, "commands.json")
+        with open(self.json_path, "w") as f:
+            json.dump(CATALOG, f)
+
+    def builder(self, **kwargs):
+        return vectorBuilder(
+            json_path=self.json_path,
+            model_name="fake-minilm",
+            index_path=os.path.join(self.tmp_dir, "ceph_faiss.index"),
+            metadata_path=os.path.join(self.tmp_dir, "ceph_faiss_metadata.json"),
+            lazy=True,
+            **kwargs
+        )
+
+    def test_lazy_builder_loads_nothing_up_front(self):
+        store = self.builder()
+        self.assertIsNone(store._model)
+        self.assertIsNone(store._index)
+
+    def test_warm_up_loads_and_runs_the_model(self):
+        self.builder().warm_up()
+        # The index exists now, so loading it no longer needs the model
+        store = self.builder()
+        store.warm_up()
+        self.assertIsNotNone(store._model)
+        self.assertIn("model", store.load_times)
+        self.assertEqual(store._model.encoded, ["warm up"])
+
+    def test_background_warm_up_loads_the_model(self):
+        self.builder().warm_up()
+        store = self.builder()
+        store.warm_up(background=True).join(10)
+        self.assertIsNotNone(store._model)
+        self.assertEqual(len(store.metadata), len(CATALOG))
+
+    def test_patch_replaces_the_index_file_under_open_readers(self):
+        reader = self.builder()
+        reader.warm_up()
+        before = reader.search(reader.encode_queries(["check cluster health"]), 3)
+        inode = os.stat(reader.index_path).st_ino
+
+        with open(self.json_path, "w") as f:
+            json.dump(CATALOG + [{"command": "rados df", "query_intent": "object usage", "description": "Per-pool objects"}], f)
+        writer = self.builder()
+        writer.warm_up()
+
+        self.assertEqual(writer.index.ntotal, len(CATALOG) + 1)
+        self.assertNotEqual(os.stat(reader.index_path).st_ino, inode)
+        self.assertFalse(os.path.exists(reader.index_path + ".tmp"))
+        # The reader still sees the index it mapped
+        after = reader.search(reader.encode_queries(["check cluster health"]), 3)
+        np.testing.assert_array_equal(before[1], after[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,231 @@
+# --------------------
+# Query Embedding Cache
+# --------------------
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# A disk record is the raw SHA-256 of the cache key followed by the vector
+_KEY_BYTES = 32
+
+
+def normalize_text(text: str) -> str:
+    """
+    Collapses whitespace so that cosmetically different copies of the same
+    query (indentation in contextual planning queries, trailing newlines)
+    share one cache entry. Whitespace carries no meaning for the tokenizer.
+    """
+    return " ".join(text.split())
+
+
+class embeddingCache:
+    """
+    A content-addressed cache of SentenceTransformer embeddings.
+
+    Entries are keyed by model name + normalization flag + normalized text and
+    kept in an in-memory LRU. If `disk_path` is given, embeddings are also
+    appended to a record file (key hash + float32 vector) that is read back
+    through a memory map, so repeat queries survive restarts without
+    re-running the encoder. `flush` appends the new records of a batch in one
+    write; once the file holds more than `max_disk_entries` records it is
+    compacted down to three quarters of that, keeping recently used and
+    newest entries.
+    """
+    def __init__(
+        self,
+        model_name: str,
+        max_entries: int = 1024,
+        disk_path: str = None,
+        max_disk_entries: int = 100_000
+    ) -> None:
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.compactions = 0
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        # On-disk store, one directory per model so the row width never mixes
+        self._disk_dir = None
+        self._disk_keys = {}
+        self._disk_pending = OrderedDict()  # key -> vector, appended on flush
+        self._disk_dim = None
+        self._disk_map = None
+        if disk_path:
+            safe_model = model_name.replace("/", "_")
+            self._disk_dir = os.path.join(disk_path, safe_model)
+            os.makedirs(self._disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    def _key(self, text: str, normalize: bool) -> str:
+        raw = f"{self.model_name}\x00{int(bool(normalize))}\x00{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @property
+    def _records_path(self) -> str:
+        return os.path.join(self._disk_dir, "embeddings.bin")
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self._disk_dir, "embeddings_meta.json")
+
+    def _record_dtype(self) -> np.dtype:
+        return np.dtype([("key", np.uint8, (_KEY_BYTES,)), ("vector", "<f4", (self._disk_dim,))])
+
+    def _load_disk_index(self) -> None:
+        if not os.path.exists(self._meta_path):
+            return
+        try:
+            with open(self._meta_path, "r") as f:
+                self._disk_dim = int(json.load(f)["dim"])
+        except (ValueError, KeyError) as e:
+            print(f"WARNING: Ignoring unreadable embedding cache metadata: {e}")
+            self._disk_dim = None
+            return
+        if not os.path.exists(self._records_path):
+            return
+
+        itemsize = self._record_dtype().itemsize
+        size = os.path.getsize(self._records_path)
+        if size % itemsize:
+            # A write cut short by a crash; drop the partial record so the
+            # next append starts on a record boundary
+            os.truncate(self._records_path, size - size % itemsize)
+        records = self._map_records()
+        if records is not None:
+            self._disk_keys = {key.tobytes().hex(): row for row, key in enumerate(records["key"])}
+
+    def _disk_rows(self) -> int:
+        if self._disk_dim is None or not os.path.exists(self._records_path):
+            return 0
+        return os.path.getsize(self._records_path) // self._record_dtype().itemsize
+
+    def _map_records(self):
+        rows = self._disk_rows()
+        if rows == 0:
+            self._disk_map = None
+        else:
+            self._disk_map = np.memmap(self._records_path, dtype=self._record_dtype(), mode="r", shape=(rows,))
+        return self._disk_map
+
+    def _read_disk(self, key: str):
+        row = self._disk_keys.get(key)
+        if row is None:
+            return None
+        # Re-map only when the file has grown past the current view
+        if self._disk_map is None or self._disk_map.shape[0] <= row:
+            if self._map_records() is None or self._disk_map.shape[0] <= row:
+                return None
+        return np.array(self._disk_map[row]["vector"])
+
+    def _queue_disk(self, key: str, vector: np.ndarray) -> None:
+        if key in self._disk_keys or key in self._disk_pending:
+            return
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if self._disk_dim is None:
+            self._disk_dim = int(vector.shape[0])
+        elif vector.shape[0] != self._disk_dim:
+            print("WARNING: Embedding dimension changed; skipping on-disk cache write.")
+            return
+        self._disk_pending[key] = vector
+
+    def get(self, text: str, normalize: bool = False):
+        key = self._key(text, normalize)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return vector
+
+            if self._disk_dir:
+                vector = self._read_disk(key)
+                if vector is not None:
+                    self._remember(key, vector)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, text: str, normalize: bool, vector: np.ndarray) -> None:
+        key = self._key(text, normalize)
+        with self._lock:
+            self._remember(key, vector)
+            if self._disk_dir:
+                self._queue_disk(key, vector)
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def flush(self) -> None:
+        """Appends the records queued by a batch of `put` calls to the disk store."""
+        with self._lock:
+            if not self._disk_dir or not self._disk_pending:
+                return
+            if not os.path.exists(self._meta_path):
+                tmp_path = self._meta_path + ".tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump({"dim": self._disk_dim}, f)
+                os.replace(tmp_path, self._meta_path)
+
+            records = np.zeros(len(self._disk_pending), dtype=self._record_dtype())
+            for i, (key, vector) in enumerate(self._disk_pending.items()):
+                records[i]["key"] = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+                records[i]["vector"] = vector
+            # Rows are addressed by file position, and the keys travel with
+            # the vectors, so a crash can never pair a key with another vector
+            start = self._disk_rows()
+            with open(self._records_path, "ab") as f:
+                f.write(records.tobytes())
+            for i, key in enumerate(self._disk_pending):
+                self._disk_keys[key] = start + i
+            self._disk_pending.clear()
+
+            if len(self._disk_keys) > self.max_disk_entries:
+                self._compact()
+
+    def _compact(self) -> None:
+        """Rewrites the disk store with the most recently used, then newest, entries."""
+        keep_count = self.max_disk_entries * 3 // 4
+        recent = [key for key in reversed(self._memory) if key in self._disk_keys]
+        newest = sorted(self._disk_keys, key=self._disk_keys.get, reverse=True)
+        keep = list(dict.fromkeys(recent + newest))[:keep_count]
+        rows = sorted(self._disk_keys[key] for key in keep)
+
+        records = np.array(self._map_records()[rows])
+        self._disk_map = None
+        tmp_path = self._records_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(records.tobytes())
+        os.replace(tmp_path, self._records_path)
+
+        self._disk_keys = {key.tobytes().hex(): row for row, key in enumerate(records["key"])}
+        self.compactions += 1
+        print(f"♻️ Embedding cache compacted to {len(self._disk_keys)} entries")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": len(self._disk_keys),
+                "compactions": self.compactions,
+            }
@@ -1,10 +1,26 @@
-from sentence_transformers import SentenceTransformer
-import faiss
+import hashlib
 import json
 import os
+import threading
+import time
+import numpy as np
 
 from collections import defaultdict
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from utils.embedding_cache import embeddingCache
+from utils.metadata_store import compactMetadataStore
+from utils.lexical_index import bm25Index
+from utils.index_spec import (
+    parse_index_spec,
+    format_index_spec,
+    supports_remove,
+    build_faiss_index,
+    apply_search_params
+)
+
+# NOTE: sentence_transformers, faiss and langchain are imported inside the
+# methods that need them. Importing them here costs several seconds before
+# the agent can show its first prompt.
 
 
 # For Simplification of this parameter growth issue,
@@ -21,7 +37,20 @@ class vectorBuilder:
     """
     A Class to encapsulate the Ceph Command Vector Store & it's search logic
     """
-    def __init__(self, json_path, model_name, index_path, metadata_path) -> None:
+    def __init__(
+        self,
+        json_path,
+        model_name,
+        index_path,
+        metadata_path,
+        cache_size: int = 1024,
+        cache_dir: str = None,
+        lazy: bool = False,
+        index_spec="flat",
+        ef_search: int = None,
+        nprobe: int = None,
+        mmap_index: bool = True
+    ) -> None:
         # Here we need to declare them only once
         # Later function we can directly access them
         # without passing them in functions.
@@ -30,28 +59,373 @@ class vectorBuilder:
         self.index_path = index_path
         self.metadata_path = metadata_path
 
-        self.index, self.metadata, self.model = self._load_index()
+        # NEW: Which FAISS structure to build, see utils/index_spec.py
+        self.index_spec = parse_index_spec(index_spec)
+        self.ef_search = ef_search
+        self.nprobe = nprobe
+        # NEW: Map the index read-only so processes on a host share its pages
+        self.mmap_index = mmap_index
+
+        # NEW: Embeddings are looked up here before touching SentenceTransformer
+        self.embedding_cache = embeddingCache(
+            model_name=model_name,
+            max_entries=cache_size,
+            disk_path=cache_dir
+        )
+
+        # UPDATED: Model and index are loaded on first use when `lazy` is set
+        self._model = None
+        self._index = None
+        self._metadata = None
+        self._lexical_index = None
+        self._model_lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._lexical_lock = threading.Lock()
+        self.load_times = {}
+
+        # NEW: Filled in from the loaded index, see `search`
+        self.metric = None
+        self.normalized = True
+
+        if not lazy:
+            self.warm_up()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+                    self.load_times["model"] = time.perf_counter() - start
+        return self._model
+
+    @property
+    def index(self):
+        self._ensure_index()
+        return self._index
+
+    @property
+    def metadata(self):
+        self._ensure_index()
+        return self._metadata
+
+    # NEW: BM25 over the same metadata, built on first use (see utils/lexical_index.py)
+    @property
+    def lexical_index(self) -> bm25Index:
+        if self._lexical_index is None:
+            metadata = self.metadata
+            with self._lexical_lock:
+                if self._lexical_index is None:
+                    start = time.perf_counter()
+                    self._lexical_index = bm25Index((record_id, metadata[record_id]) for record_id in metadata.ids())
+                    self.load_times["lexical_index"] = time.perf_counter() - start
+        return self._lexical_index
+
+    def lexical_search(self, query: str, k: int) -> list:
+        """
+        Keyword search over the command metadata.
+
+        Returns:
+            list: Up to k (FAISS id, BM25 score) pairs, best first.
+        """
+        return self.lexical_index.search(query, k)
+
+    def _ensure_index(self) -> None:
+        if self._index is not None:
+            return
+        with self._index_lock:
+            if self._index is None:
+                start = time.perf_counter()
+                index, metadata = self._load_index()
+                self._metadata = metadata
+                self._index = index
+                self.load_times["index"] = time.perf_counter() - start
+
+    def _load_model(self) -> None:
+        # One throwaway encode also pays for tokenizer and kernel set-up,
+        # which SentenceTransformer otherwise defers to the first query
+        self.model.encode(["warm up"], convert_to_numpy=True, show_progress_bar=False)
+
+    def warm_up(self, background: bool = False):
+        """
+        Loads the embedding model and the FAISS index.
+
+        Args:
+            background (bool): If True, load in a daemon thread and return it
+                               immediately so the caller can keep going.
+                               Any first use blocks until loading finishes.
+
+        Returns:
+            threading.Thread or None: The warm-up thread when in background.
+        """
+        if not background:
+            self._load_model()
+            self._ensure_index()
+            return None
+
+        def _run():
+            start = time.perf_counter()
+            try:
+                self._load_model()
+                self._ensure_index()
+            except Exception as e:
+                # The next foreground access retries and raises the real error
+                print(f"WARNING: Background warm-up of the vector store failed: {e}")
+                return
+            print(f"\n✅ Vector store warm-up finished in {time.perf_counter() - start:.2f}s")
+
+        thread = threading.Thread(target=_run, name="vector-store-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def encode(self, texts: list, normalize_embeddings: bool = False, show_progress_bar: bool = False, use_cache: bool = True):
+        """
+        Encodes texts with the SentenceTransformer model, serving repeats
+        from the embedding cache and batching only the misses.
+
+        Args:
+            texts (list): The strings to embed.
+            normalize_embeddings (bool): Whether to L2-normalize the vectors.
+            show_progress_bar (bool): Forwarded to SentenceTransformer.
+            use_cache (bool): Set to False for one-off texts (e.g. command
+                              output) that should not evict cached queries.
+
+        Returns:
+            np.ndarray: A float32 matrix with one row per input text.
+        """
+        if not use_cache:
+            return self.model.encode(
+                texts,
+                convert_to_numpy=True,
+                normalize_embeddings=normalize_embeddings,
+                show_progress_bar=show_progress_bar
+            ).astype("float32")
+
+        vectors = [self.embedding_cache.get(text, normalize_embeddings) for text in texts]
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(texts[i], []).append(i)
+
+        if missing:
+            unique_texts = list(missing.keys())
+            fresh = self.model.encode(
+                unique_texts,
+                convert_to_numpy=True,
+                normalize_embeddings=normalize_embeddings,
+                show_progress_bar=show_progress_bar
+            )
+            for text, vector in zip(unique_texts, fresh):
+                self.embedding_cache.put(text, normalize_embeddings, vector)
+                for i in missing[text]:
+                    vectors[i] = vector
+            self.embedding_cache.flush()
+
+        return np.vstack(vectors).astype("float32")
+
+    def encode_queries(self, texts: list):
+        """Encodes queries the same way the indexed documents were encoded."""
+        return self.encode(texts, normalize_embeddings=self.normalized)
+
+    def search(self, query_embeddings, k: int):
+        """
+        Runs a FAISS search and reports every hit as a cosine similarity.
+
+        Both index types store unit-normalized vectors, so inner product
+        (IndexFlatIP) already is the cosine similarity and a squared L2
+        distance d (IndexFlatL2) maps to it as 1 - d / 2. Callers can
+        therefore always treat higher as better and apply thresholds with
+        `>=`, whichever metric the index was built with.
+
+        Args:
+            query_embeddings (np.ndarray): One query vector per row.
+            k (int): Number of neighbours per query.
+
+        Returns:
+            tuple: (similarities, ids), each of shape (n_queries, k).
+                   Missing neighbours have id -1.
+        """
+        import faiss
+
+        index = self.index
+        query_embeddings = np.ascontiguousarray(query_embeddings, dtype="float32")
+        if self.normalized:
+            # Guard against callers passing raw model output
+            query_embeddings = query_embeddings.copy()
+            faiss.normalize_L2(query_embeddings)
+
+        scores, ids = index.search(query_embeddings, k)
+        if self.metric == "l2":
+            scores = 1.0 - scores / 2.0
+        return scores, ids
+
+    def set_search_params(self, ef_search: int = None, nprobe: int = None) -> None:
+        """Changes the HNSW efSearch / IVF nprobe knobs on the loaded index."""
+        if ef_search is not None:
+            self.ef_search = ef_search
+        if nprobe is not None:
+            self.nprobe = nprobe
+        apply_search_params(self.index, self.ef_search, self.nprobe)
 
     # Loading the VectorDB, & if not created create ONE
     def _load_index(self):
+        import faiss
+
         print("Validating index existence...")
         print("--------------------------------")
-        if os.path.exists(self.index_path) and os.path.exists(self.metadata_path):
-            model = SentenceTransformer(self.model_name)
-            print("🔁 Loading existing FAISS index and query mapping...")
-            index = faiss.read_index(self.index_path)
-            with open(self.metadata_path, "rb") as f:
-                data = json.load(f)
+        manifest = self._read_manifest()
+        if (
+            os.path.exists(self.index_path)
+            and os.path.exists(self.metadata_path)
+            and manifest is not None
+        ):
+            if manifest.get("builder", "combined") != "combined":
+                print("🔁 Loading existing chunked FAISS index (no incremental updates)...")
+            elif os.path.exists(self.json_path):
+                grouped = self._group_commands()
+                added, changed, removed = self._diff_manifest(grouped, manifest)
+                if added or changed or removed:
+                    print(
+                        f"♻️ Index is stale: {len(added)} added, {len(changed)} changed, "
+                        f"{len(removed)} removed. Patching FAISS index..."
+                    )
+                    # Patching needs a private, writable copy; the result is
+                    # written back to disk and mapped again below.
+                    writable = faiss.read_index(self.index_path)
+                    self._patch_index_combined(writable, manifest, grouped, added, changed, removed)
+                    del writable
+                else:
+                    print("🔁 Loading existing FAISS index and query mapping...")
+            else:
+                print(f"WARNING: {self.json_path} not found, skipping staleness check.")
+                print("🔁 Loading existing FAISS index and query mapping...")
         else:
             print("⚙️ Building new FAISS index...")
-            model = self._build_index_combined()
-            index = faiss.read_index(self.index_path)
+            self._build_index_combined()
+
+        index = self._open_index()
+
+        # The index itself is authoritative for the metric; the manifest
+        # records it for tools that inspect the store without FAISS.
+        self.metric = "l2" if index.metric_type == faiss.METRIC_L2 else "ip"
+        manifest = self._read_manifest() or {}
+        self.normalized = manifest.get("normalized", True)
+        if manifest.get("metric", self.metric) != self.metric:
+            print(f"WARNING: Manifest metric '{manifest.get('metric')}' does not match the index ('{self.metric}').")
+        apply_search_params(index, self.ef_search, self.nprobe)
+
+        # Metadata is addressed by the stable FAISS id, not by list position,
+        # and only decoded for the ids a search actually returns.
+        metadata = self._open_metadata()
+        return index, metadata
+
+    def _open_index(self):
+        import faiss
+
+        if not self.mmap_index:
+            return faiss.read_index(self.index_path)
+        # IO_FLAG_MMAP_IFC (FAISS >= 1.8) maps flat codes and inverted lists
+        # zero-copy; older releases only map IVF lists with IO_FLAG_MMAP.
+        mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        flags = mmap_flag | faiss.IO_FLAG_READ_ONLY
+        try:
+            return faiss.read_index(self.index_path, flags)
+        except RuntimeError as e:
+            print(f"WARNING: Could not memory-map the FAISS index, reading it into memory. Error: {e}")
+            return faiss.read_index(self.index_path)
+
+    def _write_index(self, index) -> None:
+        """
+        Writes the index next to the live one and swaps it in, like
+        compactMetadataStore.write. Other processes may have the old file
+        mapped; rewriting it in place would change pages under them.
+        """
+        import faiss
+
+        tmp_path = self.index_path + ".tmp"
+        faiss.write_index(index, tmp_path)
+        os.replace(tmp_path, self.index_path)
+
+    @property
+    def metadata_store_path(self) -> str:
+        # e.g. ceph_faiss_metadata.json -> ceph_faiss_metadata.bin
+        return os.path.splitext(self.metadata_path)[0] + ".bin"
+
+    def _open_metadata(self) -> compactMetadataStore:
+        if not os.path.exists(self.metadata_store_path):
+            print("INFO: Converting metadata JSON to the compact metadata store...")
             with open(self.metadata_path, "rb") as f:
-                data = json.load(f)
-        return index, data, model
+                compactMetadataStore.write(self.metadata_store_path, json.load(f))
+        return compactMetadataStore(self.metadata_store_path)
 
-    # Build Vector DB Combined Intent & Description
-    def _build_index_combined(self):
+    @property
+    def manifest_path(self) -> str:
+        # Stored next to the index, e.g. ceph_faiss.index -> ceph_faiss_manifest.json
+        return os.path.splitext(self.index_path)[0] + "_manifest.json"
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        except ValueError as e:
+            print(f"WARNING: Could not parse index manifest, rebuilding. Error: {e}")
+            return None
+        if manifest.get("model_name") != self.model_name:
+            print(
+                f"INFO: Index was built with '{manifest.get('model_name')}', "
+                f"not '{self.model_name}'. Rebuilding."
+            )
+            return None
+        built_as = parse_index_spec(manifest.get("index_spec", "flat"))
+        if manifest.get("builder", "combined") == "combined" and built_as != self.index_spec:
+            print(
+                f"INFO: Index was built as '{format_index_spec(built_as)}', "
+                f"not '{format_index_spec(self.index_spec)}'. Rebuilding."
+            )
+            return None
+        return manifest
+
+    def _write_manifest(
+        self,
+        entries: dict,
+        next_id: int,
+        metric: str = "ip",
+        builder: str = "combined",
+        built_spec: dict = None
+    ) -> None:
+        manifest = {
+            "model_name": self.model_name,
+            "builder": builder,
+            # The requested spec decides staleness, the built one is what
+            # actually sits on disk after clamping or fallbacks.
+            "index_spec": self.index_spec,
+            "built_spec": built_spec or self.index_spec,
+            "metric": metric,
+            "normalized": True,
+            "next_id": next_id,
+            "entries": entries
+        }
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def _content_hash(group: dict) -> str:
+        return hashlib.sha256(group["text"].encode("utf-8")).hexdigest()
+
+    def _group_commands(self) -> dict:
+        """
+        Groups the raw catalog entries by command and joins their intents and
+        descriptions into the single text that gets embedded.
+
+        Returns:
+            dict: command -> {"command", "query_intent", "description", "text"}
+        """
         with open(self.json_path) as f:
             data = json.load(f)
 
@@ -68,25 +442,85 @@ class vectorBuilder:
             grouped[cmd]["query_intent"].append(entry["query_intent"])
             grouped[cmd]["description"].append(entry["description"])
 
-        # Prepare texts and metadata
-        combined_metadata = []
-        texts = []
-
         for group in grouped.values():
-            joined_intent = " | ".join(group["query_intent"])
-            joined_desc = " | ".join(group["description"])
-            combined_text = f"{joined_intent} | {joined_desc}"
-            texts.append(combined_text)
+            group["query_intent"] = " | ".join(group["query_intent"])
+            group["description"] = " | ".join(group["description"])
+            group["text"] = f"{group['query_intent']} | {group['description']}"
+        return grouped
 
-            combined_metadata.append({
+    def _diff_manifest(self, grouped: dict, manifest: dict):
+        known = manifest.get("entries", {})
+        added = [cmd for cmd in grouped if cmd not in known]
+        changed = [
+            cmd for cmd in grouped
+            if cmd in known and known[cmd]["hash"] != self._content_hash(grouped[cmd])
+        ]
+        removed = [cmd for cmd in known if cmd not in grouped]
+        return added, changed, removed
+
+    def _write_metadata(self, grouped: dict, ids: dict) -> None:
+        combined_metadata = [
+            {
+                "id": ids[cmd],
                 "command": group["command"],
-                "query_intent": joined_intent,
-                "description": joined_desc
-            })
+                "query_intent": group["query_intent"],
+                "description": group["description"]
+            }
+            for cmd, group in grouped.items()
+        ]
+        # The JSON copy is kept for inspection; the agent reads the compact store
+        with open(self.metadata_path, "w") as f:
+            json.dump(combined_metadata, f)
+        compactMetadataStore.write(self.metadata_store_path, combined_metadata)
+
+    # Re-embed only the commands whose content hash moved
+    def _patch_index_combined(self, index, manifest, grouped, added, changed, removed):
+        built_spec = parse_index_spec(manifest.get("built_spec", manifest.get("index_spec", "flat")))
+        if (changed or removed) and not supports_remove(built_spec):
+            print(f"INFO: A '{built_spec['type']}' index cannot remove entries. Rebuilding.")
+            self._build_index_combined(grouped)
+            return
+
+        entries = dict(manifest["entries"])
+        next_id = manifest.get("next_id", 0)
+
+        stale_ids = [entries[cmd]["id"] for cmd in changed + removed]
+        if stale_ids:
+            index.remove_ids(np.array(stale_ids, dtype=np.int64))
+        for cmd in removed:
+            del entries[cmd]
+
+        to_embed = changed + added
+        if to_embed:
+            for cmd in added:
+                entries[cmd] = {"id": next_id}
+                next_id += 1
+            embeddings = self.encode(
+                [grouped[cmd]["text"] for cmd in to_embed],
+                normalize_embeddings=True,
+                show_progress_bar=True
+            )
+            ids = np.array([entries[cmd]["id"] for cmd in to_embed], dtype=np.int64)
+            index.add_with_ids(embeddings, ids)
+            for cmd in to_embed:
+                entries[cmd]["hash"] = self._content_hash(grouped[cmd])
+
+        self._write_index(index)
+        self._write_metadata(grouped, {cmd: entry["id"] for cmd, entry in entries.items()})
+        self._write_manifest(entries, next_id, built_spec=built_spec)
+        print("✅ FAISS index, metadata and manifest patched.")
+
+    # Build Vector DB Combined Intent & Description
+    def _build_index_combined(self, grouped: dict = None):
+        if grouped is None:
+            grouped = self._group_commands()
+
+        commands = list(grouped.keys())
+        texts = [grouped[cmd]["text"] for cmd in commands]
+        ids = {cmd: i for i, cmd in enumerate(commands)}
 
         # Embedding & indexing
-        model = SentenceTransformer(self.model_name)
-        embeddings = model.encode(
+        embeddings = self.encode(
             texts,
             normalize_embeddings=True,
             show_progress_bar=True
@@ -96,16 +530,22 @@ class vectorBuilder:
         # Here we are using L2 FAISS embedding
         # index = faiss.IndexFlatL2(dimension)
 
-        # Here we are using Cosine Similarity
-        index = faiss.IndexFlatIP(dimension)
-        index.add(embeddings)
+        # Here we are using Cosine Similarity. Every spec yields an
+        # id-addressable index so single commands can be patched in place.
+        index, built_spec = build_faiss_index(self.index_spec, dimension, "ip", embeddings)
+        index.add_with_ids(embeddings, np.array([ids[cmd] for cmd in commands], dtype=np.int64))
+        print(f"INFO: Built a '{format_index_spec(built_spec)}' index over {len(commands)} commands.")
 
-        faiss.write_index(index, self.index_path)
-        with open(self.metadata_path, "w") as f:
-            json.dump(combined_metadata, f)
+        self._write_index(index)
+        self._write_metadata(grouped, ids)
+        self._write_manifest(
+            {cmd: {"id": ids[cmd], "hash": self._content_hash(grouped[cmd])} for cmd in commands},
+            len(commands),
+            built_spec=built_spec
+        )
 
         print("✅ FAISS index and grouped metadata saved.")
-        return model
+        return self.model
 
     # Building & loading Index with Chunky Vectorization
     def _build_index_chunky(
@@ -113,6 +553,9 @@ class vectorBuilder:
         chunk_size: int = 300,
         chunk_overlap: int = 50
     ):
+        import faiss
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+
         # Load data
         with open(self.json_path, "r") as f:
             data = json.load(f)
@@ -125,7 +568,7 @@ class vectorBuilder:
             )
 
         # Initialize model
-        model = SentenceTransformer(self.model)
+        model = self.model
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
@@ -134,7 +577,7 @@ class vectorBuilder:
 
         # Chunk and embed
         all_chunks = []
-        metadata = {}
+        metadata = []
         id_counter = 0
         for command, combined_entries in grouped.items():
             full_text = "\n".join(combined_entries)
@@ -142,13 +585,18 @@ class vectorBuilder:
 
             for chunk in chunks:
                 all_chunks.append(chunk)
-                metadata[id_counter] = {
+                metadata.append({
+                    "id": id_counter,
                     "command": command,
+                    "query_intent": chunk,
+                    "description": chunk,
                     "chunk": chunk,
-                }
+                })
                 id_counter += 1
 
-        embeddings = model.encode(all_chunks, show_progress_bar=True)
+        # UPDATED: Normalized like the combined index, so that search() can
+        # convert L2 distances into cosine similarities.
+        embeddings = self.encode(all_chunks, normalize_embeddings=True, show_progress_bar=True)
         dimension = embeddings[0].shape[0]
 
         # Build index
@@ -156,8 +604,10 @@ class vectorBuilder:
         index.add(embeddings)
 
         # Save index & metadata
-        faiss.write_index(index, self.index_path)
+        self._write_index(index)
         with open(self.metadata_path, "w") as f:
-            json.dump(data, f)
+            json.dump(metadata, f)
+        compactMetadataStore.write(self.metadata_store_path, metadata)
+        self._write_manifest({}, id_counter, metric="l2", builder="chunky", built_spec=parse_index_spec("flat"))
         print("✅ FAISS index and metadata saved.")
         return model
@@ -0,0 +1,145 @@
+# --------------------
+# FAISS Index Specs
+# --------------------
+#
+# An index spec names the FAISS structure behind vectorBuilder and its
+# build-time parameters. It is written as "type" or "type:key=value,...":
+#
+#   flat                                exact search (default)
+#   hnsw:M=32,efConstruction=200        graph based ANN
+#   ivfpq:nlist=1024,m=48,nbits=8       inverted lists + product quantization
+#
+# Search-time knobs (efSearch for HNSW, nprobe for IVF) are not part of the
+# spec and are applied with `apply_search_params` after loading.
+
+DEFAULT_PARAMS = {
+    "flat": {},
+    "hnsw": {"M": 32, "efConstruction": 200},
+    "ivfpq": {"nlist": 1024, "m": 48, "nbits": 8},
+}
+
+
+def parse_index_spec(spec) -> dict:
+    """
+    Normalizes an index spec given as a string or dict.
+
+    Args:
+        spec (str or dict): e.g. "hnsw:M=16" or {"type": "hnsw", "M": 16}.
+
+    Returns:
+        dict: {"type": ..., <params with defaults filled in>}
+
+    Raises:
+        ValueError: If the type or a parameter is unknown.
+    """
+    if spec is None:
+        spec = "flat"
+    if isinstance(spec, dict):
+        spec = dict(spec)
+        index_type = spec.pop("type", "flat")
+        params = spec
+    else:
+        index_type, _, raw_params = spec.strip().partition(":")
+        params = {}
+        for pair in filter(None, raw_params.split(",")):
+            key, sep, value = pair.partition("=")
+            if not sep:
+                raise ValueError(f"Malformed index spec parameter '{pair}' in '{spec}'")
+            params[key.strip()] = value.strip()
+
+    index_type = index_type.strip().lower()
+    if index_type not in DEFAULT_PARAMS:
+        raise ValueError(f"Unknown index type '{index_type}'. Expected one of {list(DEFAULT_PARAMS)}")
+
+    resolved = {"type": index_type}
+    for key, default in DEFAULT_PARAMS[index_type].items():
+        resolved[key] = int(params.pop(key, default))
+    if params:
+        raise ValueError(f"Unknown parameters for '{index_type}' index: {sorted(params)}")
+    return resolved
+
+
+def format_index_spec(spec: dict) -> str:
+    params = ",".join(f"{k}={v}" for k, v in spec.items() if k != "type")
+    return f"{spec['type']}:{params}" if params else spec["type"]
+
+
+def supports_remove(spec: dict) -> bool:
+    """HNSW graphs cannot drop vectors, so changed entries force a rebuild."""
+    return spec["type"] != "hnsw"
+
+
+def _faiss_metric(metric: str):
+    import faiss
+    return faiss.METRIC_L2 if metric == "l2" else faiss.METRIC_INNER_PRODUCT
+
+
+def build_faiss_index(spec: dict, dimension: int, metric: str, training_vectors=None):
+    """
+    Creates an empty, id-addressable FAISS index for the spec, training it
+    on `training_vectors` where the structure needs it.
+
+    IVF-PQ needs enough vectors to train its coarse quantizer and its
+    codebooks; on a corpus that is too small for that it falls back to a
+    flat index with a warning, and `nlist` is clamped to the corpus size.
+
+    Returns:
+        tuple: (faiss index, the spec that was actually built)
+    """
+    import faiss
+
+    faiss_metric = _faiss_metric(metric)
+
+    if spec["type"] == "hnsw":
+        base = faiss.IndexHNSWFlat(dimension, spec["M"], faiss_metric)
+        base.hnsw.efConstruction = spec["efConstruction"]
+        return faiss.IndexIDMap(base), spec
+
+    if spec["type"] == "ivfpq":
+        n_train = 0 if training_vectors is None else len(training_vectors)
+        if dimension % spec["m"] != 0:
+            raise ValueError(f"IVF-PQ 'm'={spec['m']} must divide the embedding dimension {dimension}")
+        if n_train < 2 ** spec["nbits"]:
+            print(
+                f"WARNING: {n_train} vectors are too few to train IVF-PQ codebooks "
+                f"(need {2 ** spec['nbits']}). Falling back to a flat index."
+            )
+            return build_faiss_index(parse_index_spec("flat"), dimension, metric)
+        built = dict(spec)
+        # Keep roughly 39 training points per list, as FAISS recommends
+        built["nlist"] = max(1, min(spec["nlist"], n_train // 39))
+        if built["nlist"] != spec["nlist"]:
+            print(f"INFO: Clamping IVF nlist from {spec['nlist']} to {built['nlist']} for {n_train} vectors.")
+        if faiss_metric == faiss.METRIC_L2:
+            quantizer = faiss.IndexFlatL2(dimension)
+        else:
+            quantizer = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFPQ(quantizer, dimension, built["nlist"], built["m"], built["nbits"], faiss_metric)
+        # The index keeps a reference to the quantizer, so it must outlive this scope
+        index.own_fields = True
+        quantizer.this.disown()
+        index.train(training_vectors)
+        return index, built
+
+    if faiss_metric == faiss.METRIC_L2:
+        return faiss.IndexIDMap(faiss.IndexFlatL2(dimension)), spec
+    return faiss.IndexIDMap(faiss.IndexFlatIP(dimension)), spec
+
+
+def _unwrap(index):
+    import faiss
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def apply_search_params(index, ef_search: int = None, nprobe: int = None) -> None:
+    """Sets efSearch on HNSW indexes and nprobe on IVF indexes; other knobs are ignored."""
+    import faiss
+
+    inner = _unwrap(index)
+    if ef_search is not None and isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = int(ef_search)
+    if nprobe is not None and isinstance(inner, faiss.IndexIVF):
+        inner.nprobe = int(nprobe)
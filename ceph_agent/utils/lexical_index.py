@@ -0,0 +1,112 @@
+# --------------------
+# BM25 Lexical Index
+# --------------------
+#
+# MiniLM embeddings blur the short, exact tokens operators type: "pg",
+# "rbd", "mds", "osd.12". This is a small in-memory inverted index over the
+# same metadata the FAISS index is built from (command, query intent,
+# description), scored with Okapi BM25, so those tokens can pull the right
+# commands into the candidate list next to the dense hits.
+
+import math
+import re
+from collections import Counter, defaultdict
+
+# Dotted or dashed names (osd.12, rbd-mirror, 1.2f) are kept whole and also
+# split into their parts, so "osd.12" matches both "osd.12" and "osd"
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._\-][a-z0-9]+)*")
+
+# "ceph" is in every command line, so it would match every record
+STOPWORDS = frozenset({
+    "ceph", "a", "an", "the", "is", "are", "was", "were", "be", "of", "in", "on", "to", "for",
+    "and", "or", "with", "by", "it", "its", "this", "that", "what", "which", "how",
+    "do", "does", "i", "me", "my", "all", "any", "show", "list", "get", "check",
+    "display", "give", "tell", "please", "can", "you",
+})
+
+# The command line itself is the most specific text a record has
+FIELD_WEIGHTS = {"command": 2, "query_intent": 1, "description": 1}
+
+
+def tokenize(text: str) -> list:
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group(0)
+        if token not in STOPWORDS:
+            tokens.append(token)
+        parts = re.split(r"[._\-]", token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part and part not in STOPWORDS)
+    return tokens
+
+
+class bm25Index:
+    """
+    Okapi BM25 over metadata records.
+
+    Args:
+        records (iterable): (record id, {"command", "query_intent", "description"}) pairs.
+        k1 (float): Term frequency saturation.
+        b (float): Document length normalization.
+    """
+    def __init__(self, records, k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.ids = []
+        self._lengths = []
+        self._postings = defaultdict(list)  # token -> [(row, term frequency)]
+
+        for record_id, record in records:
+            tokens = []
+            for field, weight in FIELD_WEIGHTS.items():
+                tokens.extend(tokenize(str(record.get(field) or "")) * weight)
+            row = len(self.ids)
+            self.ids.append(record_id)
+            self._lengths.append(len(tokens))
+            for token, tf in Counter(tokens).items():
+                self._postings[token].append((row, tf))
+
+        n = len(self.ids)
+        self._avg_length = (sum(self._lengths) / n) if n else 0.0
+        self._idf = {
+            token: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for token, postings in self._postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query: str, k: int) -> list:
+        """
+        Returns:
+            list: Up to k (record id, BM25 score) pairs, best first; only
+                  records sharing at least one token with the query.
+        """
+        scores = defaultdict(float)
+        for token in set(tokenize(query)):
+            idf = self._idf.get(token)
+            if idf is None:
+                continue
+            for row, tf in self._postings[token]:
+                norm = 1 - self.b + self.b * self._lengths[row] / (self._avg_length or 1.0)
+                scores[row] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.ids[row], score) for row, score in ranked]
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = 60) -> dict:
+    """
+    Fuses several best-first rankings of keys.
+
+    Args:
+        rankings (list): Lists of keys, best first; a key may be missing from some.
+        k (int): Damping constant; 60 is the value from the original RRF paper.
+
+    Returns:
+        dict: key -> sum over rankings of 1 / (k + rank), rank starting at 1.
+    """
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            fused[key] += 1.0 / (k + rank)
+    return dict(fused)
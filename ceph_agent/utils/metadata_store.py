@@ -0,0 +1,150 @@
+# --------------------
+# Compact Metadata Store
+# --------------------
+#
+# A read-only, memory-mapped replacement for holding the whole metadata JSON
+# as Python dicts. Every agent process on a host maps the same file, so the
+# pages are shared, and a record is only decoded when a search hits its id.
+#
+# File layout (little endian):
+#   magic "CMDS" | version u16 | n_fields u16 | n_records u32
+#   n_fields x (name length u16 | utf-8 name)
+#   ids:      n_records x i64, sorted ascending
+#   offsets:  n_fields x (n_records + 1) x u64, positions inside the blob
+#   blob:     the utf-8 values, stored column by column
+
+import bisect
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b"CMDS"
+VERSION = 1
+_HEADER = struct.Struct("<4sHHI")
+_NAME_LEN = struct.Struct("<H")
+DEFAULT_FIELDS = ("command", "query_intent", "description")
+
+
+class compactMetadataStore:
+    """
+    Offset-indexed, columnar metadata keyed by FAISS id.
+
+    Behaves like a read-only mapping of id -> dict, so it can stand in for
+    the {id: entry} dict that vectorBuilder used to build from JSON.
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, n_fields, n_records = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"{path} is not a version {VERSION} compact metadata file")
+
+        pos = _HEADER.size
+        fields = []
+        for _ in range(n_fields):
+            (length,) = _NAME_LEN.unpack_from(self._mm, pos)
+            pos += _NAME_LEN.size
+            fields.append(bytes(self._mm[pos:pos + length]).decode("utf-8"))
+            pos += length
+        self.fields = tuple(fields)
+        self._n = n_records
+
+        # Typed, zero-copy views into the mapped file
+        self._view = memoryview(self._mm)
+        view = self._view
+        self._ids = view[pos:pos + 8 * n_records].cast("q")
+        pos += 8 * n_records
+        offsets_size = 8 * n_fields * (n_records + 1)
+        self._offsets = view[pos:pos + offsets_size].cast("Q")
+        self._blob_start = pos + offsets_size
+
+    @staticmethod
+    def write(path: str, records: list, fields: tuple = DEFAULT_FIELDS) -> None:
+        """
+        Writes records (dicts carrying an integer "id") to `path`.
+
+        The file is written next to the target and renamed into place, so
+        processes that already map the old file keep a consistent view.
+        """
+        if sys.byteorder != "little":
+            raise RuntimeError("compactMetadataStore only supports little-endian hosts")
+        records = sorted(records, key=lambda r: int(r["id"]))
+
+        columns = []
+        for field in fields:
+            columns.append([str(r.get(field, "")).encode("utf-8") for r in records])
+
+        offsets = []
+        position = 0
+        for column in columns:
+            for value in column:
+                offsets.append(position)
+                position += len(value)
+            offsets.append(position)
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(fields), len(records)))
+            for field in fields:
+                name = field.encode("utf-8")
+                f.write(_NAME_LEN.pack(len(name)))
+                f.write(name)
+            f.write(struct.pack(f"<{len(records)}q", *[int(r["id"]) for r in records]))
+            f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+            for column in columns:
+                for value in column:
+                    f.write(value)
+        os.replace(tmp_path, path)
+
+    def _row(self, record_id: int):
+        row = bisect.bisect_left(self._ids, record_id)
+        if row < self._n and self._ids[row] == record_id:
+            return row
+        return None
+
+    def _value(self, field_no: int, row: int) -> str:
+        base = field_no * (self._n + 1)
+        start = self._blob_start + self._offsets[base + row]
+        end = self._blob_start + self._offsets[base + row + 1]
+        return self._mm[start:end].decode("utf-8")
+
+    def _record(self, row: int) -> dict:
+        record = {"id": self._ids[row]}
+        for field_no, field in enumerate(self.fields):
+            record[field] = self._value(field_no, row)
+        return record
+
+    def get(self, record_id: int, default=None):
+        row = self._row(int(record_id))
+        if row is None:
+            return default
+        return self._record(row)
+
+    def __getitem__(self, record_id: int) -> dict:
+        row = self._row(int(record_id))
+        if row is None:
+            raise KeyError(record_id)
+        return self._record(row)
+
+    def __contains__(self, record_id) -> bool:
+        return self._row(int(record_id)) is not None
+
+    def __len__(self) -> int:
+        return self._n
+
+    def ids(self) -> list:
+        return self._ids.tolist()
+
+    def values(self):
+        for row in range(self._n):
+            yield self._record(row)
+
+    def close(self) -> None:
+        self._ids.release()
+        self._offsets.release()
+        self._view.release()
+        self._mm.close()
@@ -0,0 +1,183 @@
+# --------------------
+# Pipeline Tracing
+# --------------------
+#
+# Lightweight spans for the agent's hot path: classifier, encode, FAISS
+# search, judge/selector, SSH, command and analyzer. Each span records its
+# start and end, its parent (tracked with contextvars, so it also follows
+# asyncio tasks) and free-form attributes such as prompt tokens or output
+# bytes. When a top-level span ends, a waterfall of its trace is printed
+# and the spans are appended to a JSON lines file if one is configured.
+#
+# Enable with CEPH_AGENT_TRACE=1 (and CEPH_AGENT_TRACE_FILE=<path>.jsonl to
+# export). When disabled, `trace_span` hands back one shared no-op object,
+# so instrumented code pays a function call and nothing else.
+
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+
+_current_span = contextvars.ContextVar("ceph_agent_current_span", default=None)
+
+
+class _noopSpan:
+    """Returned when tracing is off; every operation does nothing."""
+    __slots__ = ()
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NOOP_SPAN = _noopSpan()
+
+
+class traceSpan:
+    """A timed pipeline stage. Use as a context manager."""
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "attributes",
+                 "start", "end", "start_wall", "_token")
+
+    def __init__(self, tracer, name: str, parent, attributes: dict) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.start = None
+        self.end = None
+        self.start_wall = None
+        self._token = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    @property
+    def duration(self) -> float:
+        if self.start is None:
+            return 0.0
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def __enter__(self):
+        self.start_wall = time.time()
+        self.start = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.end = time.perf_counter()
+        if exc_type is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self.tracer._finish(self)
+        return False
+
+    def as_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_wall,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+        }
+
+
+class pipelineTracer:
+    """
+    Collects spans per trace and reports each trace when its root span ends.
+
+    Args:
+        enabled (bool): When False, `span` returns a no-op.
+        export_path (str): JSON lines file the finished spans are appended to.
+        print_waterfall (bool): Print a waterfall when a root span ends.
+    """
+    def __init__(self, enabled: bool = False, export_path: str = None, print_waterfall: bool = True) -> None:
+        self.enabled = enabled
+        self.export_path = export_path
+        self.print_waterfall = print_waterfall
+        self._traces = {}  # trace_id -> [spans]
+        self._lock = threading.Lock()
+
+    def span(self, name: str, **attributes):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return traceSpan(self, name, _current_span.get(), attributes)
+
+    def _finish(self, span: traceSpan) -> None:
+        with self._lock:
+            self._traces.setdefault(span.trace_id, []).append(span)
+            if span.parent_id is not None:
+                return
+            spans = self._traces.pop(span.trace_id)
+
+        if self.export_path:
+            self.export(spans)
+        if self.print_waterfall:
+            print(self.waterfall(spans))
+
+    def export(self, spans: list) -> None:
+        directory = os.path.dirname(self.export_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.export_path, "a", encoding="utf-8") as f:
+            for span in sorted(spans, key=lambda s: s.start):
+                f.write(json.dumps(span.as_dict(), default=str) + "\n")
+
+    @staticmethod
+    def waterfall(spans: list, width: int = 40) -> str:
+        """Renders one trace as an indented timeline, children under their parents."""
+        if not spans:
+            return ""
+        children = {}
+        roots = []
+        ids = {s.span_id for s in spans}
+        for span in sorted(spans, key=lambda s: s.start):
+            if span.parent_id in ids:
+                children.setdefault(span.parent_id, []).append(span)
+            else:
+                roots.append(span)
+
+        origin = min(s.start for s in spans)
+        total = max(s.start + s.duration for s in spans) - origin or 1e-9
+        lines = [f"--- Trace {spans[0].trace_id} ({total * 1000:.1f} ms) ---"]
+
+        def render(span, depth):
+            offset = int((span.start - origin) / total * width)
+            length = max(1, int(span.duration / total * width))
+            bar = " " * offset + "█" * min(length, width - offset)
+            label = ("  " * depth + span.name)[:32]
+            attrs = ", ".join(f"{k}={v}" for k, v in span.attributes.items() if k not in ("query", "command"))
+            lines.append(f"{label:<32} |{bar:<{width}}| {span.duration * 1000:9.1f} ms  {attrs}")
+            for child in children.get(span.span_id, []):
+                render(child, depth + 1)
+
+        for root in roots:
+            render(root, 0)
+        return "\n".join(lines)
+
+
+_tracer = pipelineTracer(
+    enabled=os.environ.get("CEPH_AGENT_TRACE", "").lower() in ("1", "true", "yes"),
+    export_path=os.environ.get("CEPH_AGENT_TRACE_FILE") or None
+)
+
+
+def get_tracer() -> pipelineTracer:
+    return _tracer
+
+
+def trace_span(name: str, **attributes):
+    """Opens a span under the current one (or a new trace). Near free when tracing is off."""
+    if not _tracer.enabled:
+        return _NOOP_SPAN
+    return traceSpan(_tracer, name, _current_span.get(), attributes)
@@ -1,44 +1,14 @@
 # --- Utility Functions ---
+import json
+import re
+import time
+
+from llm.prompts import PLANNER_INSTRUCTIONS
+
 
 def userSystemPrompt() -> str:
-    prompt = """
-    You are an expert assistant for a Ceph Command AI agent. You are a high-level PLANNER. Your job is to analyze a user's goal and create a plan. Another agent will be responsible for finding the specific commands later.
-
-    1.  **Classify the user query into one of two modes:**
-        -   **Direct Mode:** The query can be answered with a **single command**. This includes most "check," "get," "list," or "show" requests.
-            -   *Example Direct Queries:* "check cluster health", "what is the status of the OSDs?", "list all the pools".
-        -   **Planning Mode:** The query requires **multiple, sequential commands** to achieve a final goal. This is for complex workflows, troubleshooting, or tasks with dependencies.
-            -   *Example Planning Queries:* "Create a new RBD image and map it to a host", "Find all inactive PGs and attempt to repair them".
-
-    2.  **Detect Destructive Actions:**
-        -   If the query involves high-risk actions (delete, remove, purge, shutdown), mark it as `"safety": "unsafe"`.
-        -   Otherwise, mark it as `"safety": "safe"`.
-
-    3.  **CRITICAL RULE for Planning Mode Steps:**
-        -   Steps **MUST** be high-level goals described in natural language.
-        -   Under NO circumstances should you ever include a raw command (like "ceph osd tree" or "rbd create") in the "steps" array. Your role is to define WHAT to do, not HOW to do it.
-
-    4.  **Good vs. Bad Step Examples:**
-        -   **BAD Step (Vague/GUI-based):** "Navigate to the Ceph cluster management interface."
-        -   **BAD Step (Contains a command):** "Run 'ceph health' to see the status."
-        -   **GOOD Step (Clear CLI Goal):** "Check the overall health of the cluster."
-        -   **GOOD Step (Clear CLI Goal):** "Identify all unhealthy OSDs."
-
-    5.  **Respond in STRICT JSON only.** The response must match this schema exactly:
-        ```json
-        {
-          "mode": "planning" | "direct",
-          "safety": "safe" | "unsafe",
-          "reasoning": "Short explanation of your classification and plan.",
-          "steps": [
-            "If planning: natural language goals only. NO COMMANDS.",
-            "If direct: leave empty."
-          ],
-          "warning": "Only if unsafe, else empty."
-        }
-        ```
-    """
-    return prompt
+    # The planner instructions live with the other prompts in llm/prompts.py
+    return PLANNER_INSTRUCTIONS
 
 
 def extract_json(text):
@@ -46,4 +16,36 @@ def extract_json(text):
     match = re.search(r"\{.*\}", text, re.DOTALL)
     if match:
         return json.loads(match.group(0))
-    raise ValueError("No valid JSON found in response")
\ No newline at end of file
+    raise ValueError("No valid JSON found in response")
+
+
+class startupTimer:
+    """Records named checkpoints since process start and prints a report."""
+    def __init__(self, start: float = None) -> None:
+        self.start = start if start is not None else time.perf_counter()
+        self.marks = []
+
+    def mark(self, label: str) -> None:
+        self.marks.append((label, time.perf_counter()))
+
+    def report(self, extra: dict = None) -> None:
+        print("Startup timing:")
+        previous = self.start
+        for label, at in self.marks:
+            print(f"  {label:<28} +{at - previous:6.2f}s  (total {at - self.start:6.2f}s)")
+            previous = at
+        for label, seconds in (extra or {}).items():
+            print(f"  {label:<28} {seconds:7.2f}s")
+
+
+class consoleTokenPrinter:
+    """Token callback that writes a streamed answer to the console, prefix first."""
+    def __init__(self, prefix: str = "") -> None:
+        self.prefix = prefix
+        self.started = False
+
+    def __call__(self, token: str) -> None:
+        if not self.started:
+            print(self.prefix, end="", flush=True)
+            self.started = True
+        print(token, end="", flush=True)